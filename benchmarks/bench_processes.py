@@ -0,0 +1,47 @@
+"""
+Benchmark the top-N process collector on a host with 5,000 processes.
+
+A fake ``/proc`` tree with 5,000 processes is written to a temporary
+directory, and a share of them "run" between samples. The live ``/proc``
+of this host is timed too. Run with ``python benchmarks/bench_processes.py``.
+"""
+import os
+import random
+import tempfile
+import time
+
+from fixtures import write_process
+from infrahealth.processes import ProcessSampler
+
+PROCESSES = 5000
+BUSY_SHARE = 0.05
+ROUNDS = 20
+TOP = 10
+
+
+def timed(sampler):
+    sampler.sample(TOP)  # Baseline
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        sampler.sample(TOP)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as root:
+        for pid in range(1, PROCESSES + 1):
+            write_process(root, pid, 100, 0)
+        sampler = ProcessSampler(min_interval=0, proc_root=root, use_procfs=True)
+        sampler.sample(TOP)
+        for pid in rng.sample(range(1, PROCESSES + 1), int(PROCESSES * BUSY_SHARE)):
+            write_process(root, pid, 100 + rng.randrange(1, 50), rng.randrange(1, 10 ** 7))
+        fake = timed(sampler)
+    live = timed(ProcessSampler(min_interval=0))
+
+    print(f"fake /proc, {PROCESSES} processes ({BUSY_SHARE:.0%} busy): {fake * 1000:8.2f} ms/sample")
+    print(f"live /proc, {len(os.listdir('/proc'))} entries:        {live * 1000:8.2f} ms/sample")
+
+
+if __name__ == "__main__":
+    main()
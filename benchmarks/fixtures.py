@@ -0,0 +1,180 @@
+"""
+Fake hosts for the benchmarks: a Docker Engine API server and synthetic
+``/proc`` and cgroup v2 trees.
+"""
+import hashlib
+import json
+import os
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+NET_DEV_HEADER = (
+    "Inter-|   Receive                                                |  Transmit\n"
+    " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n"
+    "    lo:       0       0    0    0    0     0          0         0        0       0    0    0    0     0       0          0\n")
+
+
+def container_id(index):
+    """Return a stable 64-character container ID for a container index."""
+    return hashlib.sha256(f"bench-{index}".encode()).hexdigest()
+
+
+def container_stats(index):
+    """Return one-shot stats for a container, in the Engine API's shape."""
+    return {
+        "read": "2024-01-01T00:00:01Z",
+        "preread": "2024-01-01T00:00:00Z",
+        "cpu_stats": {"cpu_usage": {"total_usage": 2000000 + index * 1000}, "system_cpu_usage": 100000000,
+                      "online_cpus": 4},
+        "precpu_stats": {"cpu_usage": {"total_usage": 1000000}, "system_cpu_usage": 90000000},
+        "memory_stats": {"usage": 50000000 + index * 4096, "limit": 1000000000, "stats": {"cache": 1000000}},
+        "networks": {"eth0": {"rx_bytes": 1000 * index, "tx_bytes": 2000 * index},
+                     "eth1": {"rx_bytes": 10, "tx_bytes": 20}},
+        "blkio_stats": {"io_service_bytes_recursive": [{"major": 8, "minor": 0, "op": "read", "value": 4096},
+                                                       {"major": 8, "minor": 0, "op": "write", "value": 8192}],
+                        "io_serviced_recursive": [{"major": 8, "minor": 0, "op": "read", "value": 1},
+                                                  {"major": 8, "minor": 0, "op": "write", "value": 2}]}
+    }
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # Benchmarks open one connection per pool slot at once.
+    request_queue_size = 256
+
+
+class FakeDockerDaemon:
+    """
+    Local Docker Engine API serving ``containers`` running containers.
+
+    Each stats call waits ``stats_latency`` seconds before answering, like a
+    daemon taking its CPU samples. Containers are named ``bench-<index>``
+    and their inspected ``State.Pid`` is ``pid_base + index``, matching the
+    trees written by ``write_cgroup_tree``. Use as a context manager, and
+    point clients at ``url``.
+    """
+
+    def __init__(self, containers, stats_latency=0.0, pid_base=100000):
+        self.stats_latency = stats_latency
+        self.requests = 0
+        self._ids = [container_id(i) for i in range(containers)]
+        self._index = {cid: i for i, cid in enumerate(self._ids)}
+        self._pid_base = pid_base
+        self._lock = threading.Lock()
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                # Headers and body are separate writes; do not wait for delayed ACKs.
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_GET(self):
+                with daemon._lock:
+                    daemon.requests += 1
+                path = re.sub(r"^/v[\d.]+", "", self.path.split("?")[0])
+                if path == "/version":
+                    return self._json({"ApiVersion": "1.41", "Version": "24.0.0"})
+                if path == "/_ping":
+                    return self._json("OK")
+                if path == "/containers/json":
+                    return self._json([daemon._summary(cid) for cid in daemon._ids])
+                match = re.fullmatch(r"/containers/([0-9a-f]+)/(json|stats)", path)
+                if match and match.group(1) in daemon._index:
+                    index = daemon._index[match.group(1)]
+                    if match.group(2) == "stats":
+                        time.sleep(daemon.stats_latency)
+                        return self._json(container_stats(index))
+                    return self._json(daemon._inspect(match.group(1)))
+                self._json({"message": "not found"}, status=404)
+
+            def _json(self, body, status=200):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"tcp://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _summary(self, cid):
+        index = self._index[cid]
+        return {"Id": cid, "Names": [f"/bench-{index}"], "State": "running", "Status": "Up 1 hour"}
+
+    def _inspect(self, cid):
+        index = self._index[cid]
+        return {"Id": cid, "Name": f"/bench-{index}", "RestartCount": index % 3,
+                "State": {"Status": "running", "Running": True, "Pid": self._pid_base + index},
+                "Config": {"Labels": {}}}
+
+
+def write_process(root, pid, ticks, io_bytes):
+    """Write ``/proc/<pid>/stat`` and ``/proc/<pid>/io`` for one process."""
+    directory = os.path.join(root, str(pid))
+    os.makedirs(directory, exist_ok=True)
+    fields = ["S", "1", str(pid), str(pid), "0", "-1", "4194560", "0", "0", "0", "0",
+              str(ticks), "0", "0", "0", "20", "0", "1", "0", "12345", "1000000", "250"]
+    with open(os.path.join(directory, "stat"), "w") as f:
+        f.write(f"{pid} (worker-{pid}) " + " ".join(fields + ["0"] * 30) + "\n")
+    with open(os.path.join(directory, "io"), "w") as f:
+        f.write(f"rchar: 0\nwchar: 0\nread_bytes: {io_bytes}\nwrite_bytes: 0\n")
+
+
+def write_proc_tree(root, processes):
+    """Write a ``/proc`` tree of ``processes`` idle processes, with ``meminfo``."""
+    os.makedirs(root, exist_ok=True)
+    for pid in range(1, processes + 1):
+        write_process(root, pid, 100, 0)
+    with open(os.path.join(root, "meminfo"), "w") as f:
+        f.write("MemTotal:       16384000 kB\n")
+
+
+def write_cgroup_tree(root, proc_root, containers, pid_base=100000):
+    """
+    Write a cgroup v2 tree for ``containers`` containers (systemd driver layout).
+
+    Each container also gets ``<proc_root>/<pid>/net/dev`` with two
+    interfaces, with pids as served by ``FakeDockerDaemon``.
+    """
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "cgroup.controllers"), "w") as f:
+        f.write("cpu io memory pids\n")
+    for index in range(containers):
+        directory = os.path.join(root, "system.slice", f"docker-{container_id(index)}.scope")
+        os.makedirs(directory, exist_ok=True)
+        files = {
+            "cpu.stat": f"usage_usec {1000000 + index * 1000}\nuser_usec 600000\nsystem_usec 400000\n",
+            "memory.current": f"{50000000 + index * 4096}\n",
+            "memory.stat": "anon 40000000\nfile 10000000\ninactive_file 1000000\n",
+            "memory.max": "max\n" if index % 2 else "1000000000\n",
+            "io.stat": "8:0 rbytes=4096 wbytes=8192 rios=1 wios=2 dbytes=0 dios=0\n",
+        }
+        for name, text in files.items():
+            with open(os.path.join(directory, name), "w") as f:
+                f.write(text)
+        net = os.path.join(proc_root, str(pid_base + index), "net")
+        os.makedirs(net, exist_ok=True)
+        with open(os.path.join(net, "dev"), "w") as f:
+            f.write(NET_DEV_HEADER)
+            for nic, scale in (("eth0", 1), ("eth1", 10)):
+                f.write(f"  {nic}: {1000 * index * scale} 10 0 0 0 0 0 0 {2000 * index * scale} 20 0 0 0 0 0 0\n")
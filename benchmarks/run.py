@@ -0,0 +1,332 @@
+"""
+Benchmark suite: collection latency, throughput and peak memory.
+
+Every scenario runs against fakes from ``fixtures.py``: a local Docker
+Engine API server with N containers and a configurable stats latency, and
+synthetic ``/proc`` and cgroup v2 trees. The CLI is timed end to end in a
+subprocess, so its numbers include interpreter start-up.
+
+Results are written as JSON, to stdout or ``--output``. Pass a previous
+result file to ``--compare`` to exit non-zero when a scenario got slower or
+used more memory than ``--tolerance`` allows::
+
+    python benchmarks/run.py --output baseline.json
+    python benchmarks/run.py --compare baseline.json
+"""
+import argparse
+import contextlib
+import functools
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import docker
+
+from fixtures import FakeDockerDaemon, container_stats, write_cgroup_tree, write_proc_tree
+from infrahealth.alert import AlertEngine
+from infrahealth.anomaly import AnomalyDetector
+from infrahealth.cgroup import CgroupCollector
+from infrahealth.devices import container_blkio
+from infrahealth.docker_health import (DEFAULT_CONCURRENCY, calculate_cpu_percent, calculate_memory_percent,
+                                       collect_container_health, container_network_totals, get_docker_health)
+from infrahealth.health import get_server_health
+from infrahealth.processes import ProcessSampler
+from infrahealth.prometheus_exporter import InfrahealthCollector
+from infrahealth.rules import RuleSet
+from infrahealth.scheduler import ContainerSampler
+from infrahealth.snapshot import ContainerSnapshot, write_ndjson
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {}
+
+ALERT_CONFIG = {"cpu_threshold": 80, "memory_threshold": 80, "restart_threshold": 5}
+TOP = 10
+
+
+def scenario(name, in_process=True):
+    """
+    Register a scenario.
+
+    The decorated function is a context manager that sets up its fakes and
+    yields ``(callable, items)``. ``items`` is how many containers or
+    processes one call covers. Peak memory of in-process scenarios is
+    traced with tracemalloc; for subprocess scenarios it is the children's
+    peak RSS.
+    """
+    def register(fn):
+        SCENARIOS[name] = (contextlib.contextmanager(fn), in_process)
+        return fn
+    return register
+
+
+@scenario("docker_api")
+def docker_api(args, workdir):
+    with FakeDockerDaemon(args.containers, args.stats_latency) as daemon:
+        client = docker.DockerClient(base_url=daemon.url, max_pool_size=DEFAULT_CONCURRENCY)
+        try:
+            yield functools.partial(get_docker_health, detailed=True, client=client), args.containers
+        finally:
+            client.close()
+
+
+@scenario("docker_cgroup")
+def docker_cgroup(args, workdir):
+    root, proc = os.path.join(workdir, "cgroup"), os.path.join(workdir, "proc-cgroup")
+    write_cgroup_tree(root, proc, args.containers)
+    write_proc_tree(proc, 0)
+    with FakeDockerDaemon(args.containers) as daemon:
+        client = docker.DockerClient(base_url=daemon.url)
+        with CgroupCollector(client=client, root=root, proc_root=proc, min_interval=0) as collector:
+            yield functools.partial(collector.collect, detailed=True), args.containers
+        client.close()
+
+
+@scenario("processes")
+def processes(args, workdir):
+    root = os.path.join(workdir, "proc")
+    write_proc_tree(root, args.processes)
+    sampler = ProcessSampler(min_interval=0, proc_root=root, use_procfs=True)
+    yield functools.partial(sampler.sample, TOP), args.processes
+
+
+@scenario("docker_adaptive")
+def docker_adaptive(args, workdir):
+    # One scheduler tick, with a simulated clock advanced by a tick per call:
+    # only the containers due are sampled.
+    with FakeDockerDaemon(args.containers, args.stats_latency) as daemon:
+        client = docker.DockerClient(base_url=daemon.url, max_pool_size=DEFAULT_CONCURRENCY)
+        containers = client.containers.list()
+        clock = [0.0]
+        sampler = ContainerSampler(lambda: containers, collect_container_health, clock=lambda: clock[0])
+
+        def tick():
+            sampler()
+            clock[0] += sampler.tick
+        try:
+            yield tick, args.containers
+        finally:
+            client.close()
+
+
+@scenario("server_health")
+def server_health(args, workdir):
+    yield functools.partial(get_server_health, detailed=True), 1
+
+
+@scenario("exporter_scrape")
+def exporter_scrape(args, workdir):
+    with FakeDockerDaemon(args.containers, args.stats_latency) as daemon:
+        client = docker.DockerClient(base_url=daemon.url, max_pool_size=DEFAULT_CONCURRENCY)
+        collector = InfrahealthCollector(ttl=0, server_source=get_server_health,
+                                         docker_source=functools.partial(get_docker_health, client=client))
+
+        def scrape():
+            for family in collector.collect():
+                list(family.samples)
+        try:
+            yield scrape, args.containers
+        finally:
+            client.close()
+
+
+class _NullNotifier:
+    def notify(self, line):
+        pass
+
+    def close(self):
+        pass
+
+
+@scenario("alert_rules")
+def alert_rules(args, workdir):
+    health = []
+    for index in range(args.containers):
+        stats = container_stats(index)
+        health.append(dict({"name": f"bench-{index}", "status": "running", "restart_count": index % 3,
+                            "cpu_percent": calculate_cpu_percent(stats) * (index % 50),
+                            "memory_percent": calculate_memory_percent(stats)},
+                           **container_network_totals(stats)))
+    rules = RuleSet.from_spec([
+        {"name": "cpu", "metric": "cpu_percent", "threshold": 80},
+        {"name": "memory", "metric": "memory_percent", "threshold": 90},
+        {"name": "tens", "metric": "cpu_percent", "threshold": 50, "container": "bench-1?"},
+        {"name": "restarts", "metric": "restart_count", "threshold": 1, "container": "bench-*"},
+    ])
+    engine = AlertEngine(ALERT_CONFIG, notifier=_NullNotifier(), rules=rules)
+    yield functools.partial(engine.evaluate_health, health), args.containers
+
+
+def _container_records(count):
+    records = []
+    for index in range(count):
+        stats = container_stats(index)
+        records.append(dict({"name": f"bench-{index}", "status": "running", "restart_count": index % 3,
+                             "cpu_percent": calculate_cpu_percent(stats),
+                             "memory_percent": calculate_memory_percent(stats)},
+                            **container_network_totals(stats), **container_blkio(stats)))
+    return records
+
+
+@scenario("anomaly_update")
+def anomaly_update(args, workdir):
+    records = _container_records(args.containers)
+    detector = AnomalyDetector()
+    clock = iter(range(1, 1 << 62))
+    detector.update(records, now=0)
+    yield (lambda: detector.update(records, now=next(clock))), args.containers
+
+
+@scenario("encode_json")
+def encode_json(args, workdir):
+    records = _container_records(args.containers)
+    yield functools.partial(json.dumps, records, indent=2), args.containers
+
+
+@scenario("encode_ndjson")
+def encode_ndjson(args, workdir):
+    records = _container_records(args.containers)
+    yield (lambda: write_ndjson(records, io.BytesIO())), args.containers
+
+
+@scenario("encode_binary")
+def encode_binary(args, workdir):
+    records = _container_records(args.containers)
+    yield (lambda: ContainerSnapshot.from_records(records).to_bytes()), args.containers
+
+
+def _cli(args, workdir, *command):
+    with FakeDockerDaemon(args.containers, args.stats_latency) as daemon:
+        # The subprocess runs in workdir; keep this checkout importable from there.
+        path = os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")]))
+        env = dict(os.environ, DOCKER_HOST=daemon.url, PYTHONPATH=path)
+        argv = [sys.executable, "-m", "infrahealth.cli", *command, "--no-agent", "--format", "json"]
+        yield functools.partial(subprocess.run, argv, env=env, cwd=workdir, check=True,
+                                stdout=subprocess.DEVNULL)
+
+
+@scenario("cli_check_docker", in_process=False)
+def cli_check_docker(args, workdir):
+    for run in _cli(args, workdir, "check", "docker", "--detailed"):
+        yield run, args.containers
+
+
+@scenario("cli_check_server", in_process=False)
+def cli_check_server(args, workdir):
+    for run in _cli(args, workdir, "check", "server", "--detailed"):
+        yield run, 1
+
+
+def measure(name, args):
+    """Run one scenario and return its result record."""
+    factory, in_process = SCENARIOS[name]
+    with tempfile.TemporaryDirectory() as workdir, factory(args, workdir) as (run, items):
+        run()  # Warm-up: connections, caches and first-sample baselines.
+        durations = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            run()
+            durations.append(time.perf_counter() - start)
+        if in_process:
+            tracemalloc.start()
+            run()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            import resource
+            # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+            scale = 1 if sys.platform == "darwin" else 1024
+            peak_memory = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    ordered = sorted(durations)
+    return {
+        "rounds": args.rounds,
+        "items": items,
+        "mean_ms": statistics.mean(durations) * 1000,
+        "p50_ms": statistics.median(durations) * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "throughput_per_sec": items * len(durations) / sum(durations),
+        "peak_memory_bytes": peak_memory,
+        "memory_source": "tracemalloc" if in_process else "child_maxrss",
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return regressions of mean latency and peak memory against a baseline run."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        for key in ("mean_ms", "peak_memory_bytes"):
+            if previous[key] > 0 and result[key] > previous[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {previous[key]:,.2f} -> {result[key]:,.2f} "
+                                   f"(+{(result[key] / previous[key] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def _version():
+    try:
+        from importlib.metadata import version
+        return version("infrahealth")
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--containers", type=int, default=100, help="Containers served by the fake daemon")
+    parser.add_argument("--stats-latency", type=float, default=0.05, help="Seconds each stats call takes")
+    parser.add_argument("--processes", type=int, default=2000, help="Processes in the synthetic /proc")
+    parser.add_argument("--rounds", type=int, default=10, help="Timed calls per scenario")
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="Scenarios to run")
+    parser.add_argument("--output", help="Write results to this file instead of stdout")
+    parser.add_argument("--compare", help="Previous result file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown or growth, as a fraction")
+    args = parser.parse_args(argv)
+    # docker-py's TCP pool is smaller than the default concurrency; the
+    # discarded-connection warnings would drown the report.
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+
+    results = {}
+    for name in args.only or SCENARIOS:
+        results[name] = measure(name, args)
+        print(f"{name:<18} {results[name]['mean_ms']:10.2f} ms  {results[name]['p95_ms']:10.2f} ms p95  "
+              f"{results[name]['throughput_per_sec']:12,.0f}/s  {results[name]['peak_memory_bytes'] / 1048576:8.1f} MB",
+              file=sys.stderr)
+    report = {
+        "infrahealth_version": _version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "parameters": {"containers": args.containers, "stats_latency": args.stats_latency,
+                       "processes": args.processes, "rounds": args.rounds},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+import logging
+
+from .snapshot import ContainerSnapshot, dumps_compact
+
+DEFAULT_AGENT_SOCKET = os.path.join(os.path.expanduser("~"), ".infrahealth", "agent.sock")
+DEFAULT_AGENT_INTERVAL = 5.0
+DEFAULT_AGENT_HISTORY = 120
+
+# How long a client waits for the agent before collecting directly.
+AGENT_TIMEOUT = 0.5
+
+SOURCES = ("server", "docker")
+
+# Fields a non-detailed check reports; the agent always collects detailed samples.
+BASIC_FIELDS = {
+    "server": ("cpu_percent", "memory_percent", "disk_percent"),
+    "docker": ("name", "status", "cpu_percent", "memory_percent"),
+}
+
+
+class Agent:
+    """
+    Collect server and Docker health on a schedule and serve it locally.
+
+    Each source is sampled on its own thread at a fixed interval. The latest
+    sample and a short history of each are kept in memory and answered over
+    a Unix socket, one JSON object per line in each direction, so checks can
+    return without collecting anything themselves.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_AGENT_SOCKET, interval: float = DEFAULT_AGENT_INTERVAL,
+                 docker_interval: Optional[float] = None, history_size: int = DEFAULT_AGENT_HISTORY,
+                 server_source: Optional[Callable[[], Dict]] = None,
+                 docker_source: Optional[Callable[[], List[Dict]]] = None):
+        self.socket_path = socket_path
+        self.intervals = {"server": interval, "docker": docker_interval or interval}
+        self._sources = {"server": server_source, "docker": docker_source}
+        self._latest: Dict[str, Dict] = {}
+        self._history = {source: deque(maxlen=history_size) for source in SOURCES}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server: Optional[socketserver.BaseServer] = None
+        self._inventory = None
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """
+        Start the collectors and begin serving on the socket.
+
+        Raises:
+            RuntimeError: If another agent is already serving on the socket.
+        """
+        self._prepare_socket()
+        self._start_default_sources()
+        for source in SOURCES:
+            if self._sources[source] is None:
+                continue
+            thread = threading.Thread(target=self._collect_loop, args=(source,),
+                                      name=f"infrahealth-agent-{source}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._server = _AgentServer(self.socket_path, _AgentHandler, self)
+        os.chmod(self.socket_path, 0o600)
+        thread = threading.Thread(target=self._server.serve_forever, name="infrahealth-agent-socket", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        logging.info("Agent serving on %s", self.socket_path)
+
+    def wait(self) -> None:
+        """Block until the agent is stopped."""
+        self._stopped.wait()
+
+    def stop(self) -> None:
+        """Stop collecting, close the socket and remove it."""
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        if self._inventory is not None:
+            self._inventory.stop()
+            self._inventory = None
+
+    def _prepare_socket(self) -> None:
+        directory = os.path.dirname(self.socket_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.socket_path):
+            return
+        if query_agent("ping", socket_path=self.socket_path) is not None:
+            raise RuntimeError(f"An agent is already running on {self.socket_path}")
+        # Left behind by an agent that did not shut down cleanly.
+        os.unlink(self.socket_path)
+
+    def _start_default_sources(self) -> None:
+        from .health import get_server_health
+        from .docker_health import get_docker_health
+        from .inventory import ContainerInventory
+        if self._sources["server"] is None:
+            self._sources["server"] = lambda: get_server_health(detailed=True)
+        if self._sources["docker"] is None:
+            inventory = ContainerInventory()
+            try:
+                inventory.start()
+            except RuntimeError as e:
+                # Serve server metrics alone; docker queries report the error.
+                logging.error("Agent running without Docker: %s", str(e))
+                self._latest["docker"] = {"collected_at": time.time(), "interval": self.intervals["docker"],
+                                          "data": None, "error": str(e)}
+                return
+            self._inventory = inventory
+            self._sources["docker"] = lambda: get_docker_health(detailed=True, inventory=inventory)
+
+    def _collect_loop(self, source: str) -> None:
+        from .watch import watch
+
+        def sample():
+            try:
+                return self._sources[source](), None
+            except Exception as e:
+                logging.error("Agent failed to collect %s health: %s", source, str(e))
+                return None, str(e)
+        for (data, error), _, _ in watch(sample, self.intervals[source], sleep=self._stopped.wait):
+            if self._stopped.is_set():
+                return
+            entry = {"collected_at": time.time(), "interval": self.intervals[source], "data": data, "error": error}
+            with self._lock:
+                self._latest[source] = entry
+                if error is None:
+                    if source == "docker":
+                        # Columnar history is several times smaller than the record dicts.
+                        entry = dict(entry, data=ContainerSnapshot.from_records(data))
+                    self._history[source].append(entry)
+
+    def handle(self, request: Dict) -> Dict:
+        """Answer one protocol request."""
+        query = request.get("query")
+        if query == "ping":
+            return {"ok": True, "pid": os.getpid()}
+        source = request.get("source")
+        if source not in SOURCES:
+            return {"ok": False, "error": f"Unknown source: {source}"}
+        with self._lock:
+            if query == "latest":
+                entry = self._latest.get(source)
+                if entry is None:
+                    return {"ok": False, "error": "No sample collected yet"}
+                if entry["error"] is not None:
+                    return {"ok": False, "error": entry["error"]}
+                return dict(entry, ok=True)
+            if query == "history":
+                limit = max(0, int(request.get("limit", len(self._history[source]))))
+                entries = list(self._history[source])[-limit:] if limit else []
+        if query == "history":
+            if source == "docker":
+                entries = [dict(entry, data=list(entry["data"].records())) for entry in entries]
+            return {"ok": True, "history": entries}
+        return {"ok": False, "error": f"Unknown query: {query}"}
+
+
+class _AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, handler, agent: Agent):
+        self.agent = agent
+        super().__init__(path, handler)
+
+
+class _AgentHandler(socketserver.StreamRequestHandler):
+    """Answer newline-delimited JSON requests until the client disconnects."""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.agent.handle(json.loads(line))
+            except (ValueError, TypeError, AttributeError) as e:
+                response = {"ok": False, "error": f"Bad request: {str(e)}"}
+            self.wfile.write(dumps_compact(response) + b"\n")
+            self.wfile.flush()
+
+
+def query_agent(query: str, socket_path: str = DEFAULT_AGENT_SOCKET, timeout: float = AGENT_TIMEOUT,
+                **params) -> Optional[Dict]:
+    """
+    Send one request to a running agent.
+
+    Returns:
+        The agent's response, or None if no agent answered in time or the
+        request failed.
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    request = dict(params, query=query)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(request, separators=(",", ":")).encode() + b"\n")
+            with sock.makefile("rb") as reader:
+                line = reader.readline()
+        response = json.loads(line)
+    except (OSError, ValueError) as e:
+        logging.info("Agent on %s unavailable: %s", socket_path, str(e))
+        return None
+    return response if response.get("ok") else None
+
+
+def agent_snapshot(source: str, detailed: bool, socket_path: str = DEFAULT_AGENT_SOCKET,
+                   max_age: Optional[float] = None) -> Optional[object]:
+    """
+    Return the agent's latest sample of a source, if one is fresh enough.
+
+    Non-detailed samples are cut down to the fields a direct non-detailed
+    check would report.
+
+    Returns:
+        The server health dict or list of container dicts, or None if no
+        agent answered or its sample is older than ``max_age`` seconds
+        (default: two of the agent's collection intervals).
+    """
+    response = query_agent("latest", socket_path=socket_path, source=source)
+    if response is None:
+        return None
+    if time.time() - response["collected_at"] > (max_age or 2 * response["interval"]):
+        # The agent is running but its collector is stuck.
+        return None
+    data = response["data"]
+    if detailed:
+        return data
+    fields = BASIC_FIELDS[source]
+    if source == "server":
+        return {key: data[key] for key in fields if key in data}
+    return [{key: container[key] for key in fields if key in container} for container in data]
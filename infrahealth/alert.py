@@ -1,53 +1,271 @@
 import logging
+import queue
 import smtplib
+import threading
+import time
+from collections import namedtuple
 from email.message import EmailMessage
-from typing import List, Dict
+from typing import Iterable, List, Dict, Optional
 
-logging.basicConfig(
-    filename="infrahealth.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+from .instrumentation import instrumented, recorder
 
+# One metric compared against its threshold. ``key`` identifies the series
+# across samples; ``for_seconds`` and ``hysteresis`` are used by AlertEngine.
+Check = namedtuple("Check", ["key", "subject", "label", "value", "unit", "threshold",
+                             "for_seconds", "hysteresis"])
 
-def send_alert(health_data: Dict, alert_config: Dict) -> None:
+PENDING = "pending"
+FIRING = "firing"
+RESOLVED = "resolved"
+
+DEFAULT_BATCH_WINDOW = 30.0
+
+
+def format_issue(check: Check) -> str:
+    """Format a threshold breach as a single alert line."""
+    return f"{check.subject}: {check.label} {check.value}{check.unit}"
+
+
+def threshold_checks(health_data, alert_config: Dict) -> List[Check]:
+    """
+    Build threshold checks for server or Docker health metrics.
+
+    Args:
+        health_data: Server health dict or list of container health dicts.
+        alert_config: Thresholds, plus optional ``for_seconds`` and ``hysteresis``.
+
+    Returns:
+        List of checks, whether or not they breach their thresholds.
+    """
+    for_seconds = alert_config.get("for_seconds", 0)
+    hysteresis = alert_config.get("hysteresis", 0)
+    cpu_threshold = alert_config.get("cpu_threshold", 80)
+    memory_threshold = alert_config.get("memory_threshold", 80)
+    checks = []
+    if isinstance(health_data, list):  # Docker metrics
+        for container in health_data:
+            subject = f"Container {container['name']}"
+            checks.append(Check(f"{subject}/cpu_percent", subject, "CPU", container["cpu_percent"],
+                                "%", cpu_threshold, for_seconds, hysteresis))
+            checks.append(Check(f"{subject}/memory_percent", subject, "Memory", container["memory_percent"],
+                                "%", memory_threshold, for_seconds, hysteresis))
+            checks.append(Check(f"{subject}/restart_count", subject, "Restarts", container.get("restart_count", 0),
+                                "", alert_config.get("restart_threshold", 5), 0, 0))
+    else:  # Server metrics
+        checks.append(Check("Server/cpu_percent", "Server", "CPU", health_data["cpu_percent"],
+                            "%", cpu_threshold, for_seconds, hysteresis))
+        checks.append(Check("Server/memory_percent", "Server", "Memory", health_data["memory_percent"],
+                            "%", memory_threshold, for_seconds, hysteresis))
+    return checks
+
+
+@instrumented("send_alert")
+def send_alert(health_data: Dict, alert_config: Dict, rules=None) -> None:
     """
     Send email alert if metrics exceed thresholds.
 
     Args:
         health_data: Server or Docker health metrics.
         alert_config: Thresholds and email settings.
+        rules: Compiled ``RuleSet`` used instead of the configured thresholds.
     """
     try:
-        issues = []
-        if isinstance(health_data, list):  # Docker metrics
-            for container in health_data:
-                if container["cpu_percent"] > alert_config.get("cpu_threshold", 80):
-                    issues.append(
-                        f"Container {container['name']}: CPU {container['cpu_percent']}%")
-                if container["memory_percent"] > alert_config.get("memory_threshold", 80):
-                    issues.append(
-                        f"Container {container['name']}: Memory {container['memory_percent']}%")
-                if container.get("restart_count", 0) > alert_config.get("restart_threshold", 5):
-                    issues.append(
-                        f"Container {container['name']}: Restarts {container['restart_count']}")
-        else:  # Server metrics
-            if health_data["cpu_percent"] > alert_config.get("cpu_threshold", 80):
-                issues.append(f"Server: CPU {health_data['cpu_percent']}%")
-            if health_data["memory_percent"] > alert_config.get("memory_threshold", 80):
-                issues.append(
-                    f"Server: Memory {health_data['memory_percent']}%")
+        checks = rules.checks(health_data) if rules is not None else threshold_checks(health_data, alert_config)
+        issues = [format_issue(check) for check in checks if check.value > check.threshold]
 
         if issues:
-            msg = EmailMessage()
-            msg.set_content("\n".join(issues))
-            msg["Subject"] = "Infrahealth Alert"
-            msg["From"] = alert_config["email_from"]
-            msg["To"] = alert_config["email_to"]
+            msg = _build_message(issues, alert_config)
             with smtplib.SMTP(alert_config["smtp_host"], alert_config["smtp_port"]) as server:
                 server.login(alert_config["email_user"],
                              alert_config["email_password"])
                 server.send_message(msg)
             logging.info("Sent alert: %s", issues)
     except Exception as e:
+        recorder.error("send_alert")
         logging.error("Failed to send alert: %s", str(e))
+
+
+def _build_message(lines: List[str], alert_config: Dict) -> EmailMessage:
+    msg = EmailMessage()
+    msg.set_content("\n".join(lines))
+    msg["Subject"] = "Infrahealth Alert"
+    msg["From"] = alert_config["email_from"]
+    msg["To"] = alert_config["email_to"]
+    return msg
+
+
+class SmtpNotifier:
+    """
+    Deliver alert notifications in batches from a background thread.
+
+    Notifications queued within ``batch_window`` seconds of the first one are
+    sent as a single email. One SMTP connection is kept open and reused
+    across batches, and reopened if the server has dropped it.
+    """
+
+    _STOP = object()
+
+    def __init__(self, alert_config: Dict, batch_window: float = DEFAULT_BATCH_WINDOW):
+        self.alert_config = alert_config
+        self.batch_window = batch_window
+        self._queue: queue.Queue = queue.Queue()
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._thread = threading.Thread(target=self._run, name="infrahealth-alerts", daemon=True)
+        self._thread.start()
+
+    def notify(self, line: str) -> None:
+        """Queue a notification line without blocking."""
+        self._queue.put(line)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush queued notifications and close the SMTP connection."""
+        self._queue.put(self._STOP)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is self._STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    line = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if line is self._STOP:
+                    stopping = True
+                    break
+                batch.append(line)
+            self._deliver(batch)
+        self._disconnect()
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except smtplib.SMTPException:
+                pass
+            self._disconnect()
+        self._smtp = smtplib.SMTP(self.alert_config["smtp_host"], self.alert_config["smtp_port"])
+        self._smtp.login(self.alert_config["email_user"], self.alert_config["email_password"])
+        return self._smtp
+
+    def _disconnect(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except smtplib.SMTPException:
+            pass
+        self._smtp = None
+
+    @instrumented("send_alert")
+    def _deliver(self, batch: List[str]) -> None:
+        msg = _build_message(batch, self.alert_config)
+        for attempt in range(2):
+            try:
+                self._connection().send_message(msg)
+                logging.info("Sent alert batch: %s", batch)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._smtp = None
+            except Exception as e:
+                recorder.error("send_alert")
+                logging.error("Failed to send alert batch: %s", str(e))
+                self._disconnect()
+                return
+        recorder.error("send_alert")
+        logging.error("Failed to send alert batch: SMTP server disconnected")
+
+
+class AlertEngine:
+    """
+    Track alert state per metric across samples.
+
+    A check that breaches its threshold goes pending, and fires once it has
+    stayed in breach for ``for_seconds``. A firing check only resolves when
+    the value falls ``hysteresis`` below the threshold. Notifications are
+    sent on firing and on resolution only, so a sustained breach produces a
+    single alert. A firing check whose series is no longer reported, such
+    as a removed container, resolves; state is only kept for active checks.
+
+    Checks come from the thresholds in ``alert_config``, or from ``rules``
+    (a compiled ``RuleSet``) when one is given. A ``detector``
+    (``AnomalyDetector``) adds anomaly and forecast checks from each
+    sample's rolling statistics.
+    """
+
+    def __init__(self, alert_config: Dict, notifier=None, batch_window: float = DEFAULT_BATCH_WINDOW,
+                 rules=None, detector=None):
+        self.alert_config = alert_config
+        self.rules = rules
+        self.detector = detector
+        self.notifier = notifier or SmtpNotifier(alert_config, batch_window=batch_window)
+        # key -> [state, time it was entered, latest check]
+        self._states: Dict[str, List] = {}
+
+    def state(self, key: str) -> Optional[str]:
+        """Return the current state of a check key, or None if inactive."""
+        entry = self._states.get(key)
+        return entry[0] if entry else None
+
+    def evaluate_health(self, health_data, now: Optional[float] = None) -> List[str]:
+        """Evaluate the configured thresholds or rules, and any detector, against a health sample."""
+        now = time.monotonic() if now is None else now
+        if self.rules is not None:
+            checks = self.rules.checks(health_data)
+        else:
+            checks = threshold_checks(health_data, self.alert_config)
+        if self.detector is not None:
+            checks.extend(self.detector.update(health_data, now))
+        return self.evaluate(checks, now=now)
+
+    def evaluate(self, checks: Iterable[Check], now: Optional[float] = None) -> List[str]:
+        """
+        Advance alert state for each check.
+
+        Returns:
+            Notification lines queued for delivery by this evaluation.
+        """
+        now = time.monotonic() if now is None else now
+        notifications = []
+        seen = set()
+        for check in checks:
+            seen.add(check.key)
+            entry = self._states.get(check.key)
+            state = entry[0] if entry else None
+            breaching = check.value > check.threshold
+            if state == FIRING:
+                if check.value <= check.threshold - check.hysteresis:
+                    self._states[check.key] = [RESOLVED, now, check]
+                    notifications.append(f"RESOLVED {format_issue(check)}")
+                else:
+                    entry[2] = check
+            elif breaching:
+                if state != PENDING:
+                    entry = self._states[check.key] = [PENDING, now, check]
+                if now - entry[1] >= check.for_seconds:
+                    self._states[check.key] = [FIRING, now, check]
+                    notifications.append(f"FIRING {format_issue(check)}")
+            elif state is not None:
+                # A short spike that never fired, or an alert resolved by an earlier sample.
+                del self._states[check.key]
+        # Series that are no longer reported, such as removed containers, resolve and are forgotten.
+        for key in [key for key in self._states if key not in seen]:
+            state, _, check = self._states.pop(key)
+            if state == FIRING:
+                notifications.append(f"RESOLVED {check.subject}: {check.label} no longer reported")
+        for line in notifications:
+            self.notifier.notify(line)
+        return notifications
+
+    def close(self) -> None:
+        """Flush pending notifications."""
+        self.notifier.close()
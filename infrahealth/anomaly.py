@@ -0,0 +1,468 @@
+import math
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from .alert import Check
+from .rules import METRIC_LABELS
+
+# Metrics tracked per server and per container.
+DEFAULT_METRICS = ("cpu_percent", "memory_percent", "disk_percent")
+
+# Seconds after which a sample's weight in the rolling statistics has halved.
+DEFAULT_HALF_LIFE = 3600.0
+
+# Metric -> (limit, horizon in seconds). A forecast alert fires when the
+# trend reaches the limit within the horizon: a full disk within a day, or
+# memory running out within an hour.
+DEFAULT_FORECASTS = {"disk_percent": (100.0, 86400.0), "memory_percent": (100.0, 3600.0)}
+
+DEFAULT_Z_THRESHOLD = 4.0
+DEFAULT_MIN_SAMPLES = 10
+# Floor on the standard deviation, in metric units, so a flat series does
+# not turn a small wobble into a huge z-score.
+DEFAULT_MIN_STDDEV = 1.0
+DEFAULT_QUANTILE = 0.95
+# Points below a threshold a firing anomaly or forecast alert must drop to
+# resolve, in metric units as for threshold alerts.
+DEFAULT_HYSTERESIS = 5.0
+
+# A trend is only projected once the series covers this fraction of the
+# forecast horizon, and only if the slope is this many standard errors away
+# from flat. Otherwise a noisy but flat series would forecast a breach.
+FORECAST_MIN_SPAN = 0.25
+FORECAST_MIN_T = 3.0
+
+DEFAULT_MAX_SERIES = 50000
+# Series not updated for this long are dropped first once the cap is reached.
+SERIES_TTL = 600.0
+
+
+class P2Quantile:
+    """
+    Streaming quantile estimate in constant memory (Jain and Chlamtac's P²).
+
+    Five markers track the minimum, the maximum, the quantile and the two
+    points halfway to it, and are nudged towards their ideal positions as
+    values arrive. Covers every value seen, not a rolling window.
+    """
+
+    __slots__ = ("p", "count", "heights", "positions")
+
+    def __init__(self, p: float = DEFAULT_QUANTILE):
+        self.p = p
+        self.count = 0
+        self.heights = array("d")
+        self.positions = array("d", (1.0, 2.0, 3.0, 4.0, 5.0))
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(value)
+            if self.count == 5:
+                self.heights = array("d", sorted(heights))
+            return
+        if value < heights[0]:
+            heights[0] = value
+            k = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= heights[k + 1]:
+                k += 1
+        positions, p, extra = self.positions, self.p, self.count - 5
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        # Ideal marker positions after ``extra`` values beyond the first five.
+        desired = (1.0, 1.0 + 2 * p + extra * p / 2, 1.0 + 4 * p + extra * p,
+                   3.0 + 2 * p + extra * (1 + p) / 2, 5.0 + extra)
+        for i in (1, 2, 3):
+            d = desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                n0, n1, n2 = positions[i - 1], positions[i], positions[i + 1]
+                h0, h1, h2 = heights[i - 1], heights[i], heights[i + 1]
+                parabolic = h1 + d / (n2 - n0) * ((n1 - n0 + d) * (h2 - h1) / (n2 - n1)
+                                                  + (n2 - n1 - d) * (h1 - h0) / (n1 - n0))
+                if h0 < parabolic < h2:
+                    heights[i] = parabolic
+                else:
+                    heights[i] = h1 + d * (heights[i + d] - h1) / (positions[i + d] - n1)
+                positions[i] += d
+
+    def value(self) -> Optional[float]:
+        """Return the current estimate, or None before any value."""
+        if not self.count:
+            return None
+        if self.count < 5:
+            ordered = sorted(self.heights)
+            return ordered[max(1, math.ceil(self.p * len(ordered))) - 1]
+        return self.heights[2]
+
+
+class SeriesStats:
+    """
+    Rolling statistics of one metric series, updated in O(1) per sample.
+
+    Samples are weighted by age, halving every ``half_life`` seconds, so
+    irregular sampling intervals are handled. Six weighted sums give the
+    mean, the variance and a weighted least-squares trend line, and the sum
+    of squared weights gives the slope's standard error. Times are kept
+    relative to the latest sample and values relative to the mean, so the
+    sums stay small however long the series runs.
+    """
+
+    __slots__ = ("half_life", "count", "first", "time", "shift", "s0", "s1", "s2", "st", "stt", "stx", "sww",
+                 "last", "zscore", "scale", "quantile")
+
+    def __init__(self, half_life: float = DEFAULT_HALF_LIFE, quantile: float = DEFAULT_QUANTILE):
+        self.half_life = half_life
+        self.count = 0
+        self.first = 0.0
+        self.time = 0.0
+        self.shift = 0.0
+        self.s0 = self.s1 = self.s2 = self.st = self.stt = self.stx = self.sww = 0.0
+        self.last: Optional[float] = None
+        self.zscore: Optional[float] = None
+        # Standard deviation the latest z-score was divided by.
+        self.scale = DEFAULT_MIN_STDDEV
+        self.quantile = P2Quantile(quantile)
+
+    def update(self, value: float, now: float, min_samples: int = DEFAULT_MIN_SAMPLES,
+               min_stddev: float = DEFAULT_MIN_STDDEV) -> None:
+        """Add a sample taken at ``now``, scoring it against the samples before it."""
+        if self.count >= min_samples:
+            self.scale = max(self.stddev, min_stddev)
+            self.zscore = (value - self.mean) / self.scale
+        if self.count:
+            dt = max(0.0, now - self.time)
+            decay = 0.5 ** (dt / self.half_life)
+            s0, s1, st = self.s0 * decay, self.s1 * decay, self.st * decay
+            # Move the time origin to ``now``: every earlier t becomes t - dt.
+            self.stt = (self.stt * decay) - 2 * dt * st + dt * dt * s0
+            self.stx = (self.stx * decay) - dt * s1
+            self.st = st - dt * s0
+            self.s0, self.s1, self.s2 = s0, s1, self.s2 * decay
+            self.sww *= decay * decay
+        else:
+            self.shift = value
+            self.first = now
+        x = value - self.shift
+        self.s0 += 1.0
+        self.sww += 1.0
+        self.s1 += x
+        self.s2 += x * x
+        # Move the value origin to the mean: every x becomes x - d.
+        d = self.s1 / self.s0
+        self.s2 -= 2 * d * self.s1 - d * d * self.s0
+        self.stx -= d * self.st
+        self.s1 = 0.0
+        self.shift += d
+        self.time = now
+        self.count += 1
+        self.last = value
+        self.quantile.add(value)
+
+    @property
+    def mean(self) -> float:
+        return self.shift + (self.s1 / self.s0 if self.s0 else 0.0)
+
+    @property
+    def stddev(self) -> float:
+        if not self.s0:
+            return 0.0
+        mean = self.s1 / self.s0
+        return math.sqrt(max(0.0, self.s2 / self.s0 - mean * mean))
+
+    @property
+    def slope(self) -> float:
+        """Trend in metric units per second."""
+        denominator = self.s0 * self.stt - self.st * self.st
+        if denominator <= 1e-9 * max(1.0, self.s0 * self.stt):
+            return 0.0
+        return (self.s0 * self.stx - self.st * self.s1) / denominator
+
+    @property
+    def slope_stderr(self) -> float:
+        """Standard error of ``slope``, infinite until there are enough samples to tell."""
+        if not self.s0:
+            return math.inf
+        return _slope_stderr(self.s0, self.s1, self.s2, self.st, self.stt, self.stx, self.sww)
+
+    def significant_slope(self, horizon: float) -> float:
+        """
+        Return the slope to project ``horizon`` seconds ahead: zero unless the
+        series spans ``FORECAST_MIN_SPAN`` of the horizon and the slope is at
+        least ``FORECAST_MIN_T`` standard errors from flat.
+        """
+        if self.time - self.first < FORECAST_MIN_SPAN * horizon:
+            return 0.0
+        slope = self.slope
+        return slope if abs(slope) >= FORECAST_MIN_T * self.slope_stderr else 0.0
+
+    def level(self) -> float:
+        """Value of the trend line at the latest sample."""
+        if not self.s0:
+            return self.shift
+        return self.shift + (self.s1 - self.slope * self.st) / self.s0
+
+    def forecast(self, horizon: float) -> float:
+        """Value the trend line reaches ``horizon`` seconds ahead, holding it flat unless its slope is significant."""
+        return self.level() + self.significant_slope(horizon) * horizon
+
+    def seconds_to(self, limit: float, slope: Optional[float] = None) -> Optional[float]:
+        """Seconds until the trend line reaches ``limit``, or None if it is not heading there."""
+        level = self.level()
+        slope = self.slope if slope is None else slope
+        if level >= limit:
+            return 0.0
+        if slope <= 0:
+            return None
+        return (limit - level) / slope
+
+
+class AnomalyDetector:
+    """
+    Keep rolling statistics per metric and container, and alert on them.
+
+    Fixed thresholds miss slow leaks and keep flagging containers that
+    always run hot. Each server metric and container metric in ``metrics``
+    gets a ``SeriesStats``. A sample more than ``z_threshold`` standard
+    deviations above its series' rolling mean is an anomaly, and a series
+    whose trend reaches its ``forecasts`` limit within the horizon gets a
+    forecast alert, once the trend is significant (see
+    ``SeriesStats.significant_slope``). Both become ``Check``s for
+    ``AlertEngine`` with ``for_seconds`` and ``hysteresis``; hysteresis is in
+    metric units and is converted to standard deviations for anomalies.
+
+    At most ``max_series`` series are kept. When a new series would exceed
+    it, series idle for ``SERIES_TTL`` seconds are dropped, or else the
+    longest idle one.
+    """
+
+    def __init__(self, metrics: Tuple[str, ...] = DEFAULT_METRICS, half_life: float = DEFAULT_HALF_LIFE,
+                 z_threshold: float = DEFAULT_Z_THRESHOLD, min_samples: int = DEFAULT_MIN_SAMPLES,
+                 min_stddev: float = DEFAULT_MIN_STDDEV, forecasts: Optional[Dict] = None,
+                 max_series: int = DEFAULT_MAX_SERIES, for_seconds: float = 0.0,
+                 hysteresis: float = DEFAULT_HYSTERESIS):
+        self.metrics = tuple(metrics)
+        self.half_life = half_life
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.min_stddev = min_stddev
+        self.forecasts = DEFAULT_FORECASTS if forecasts is None else forecasts
+        self.max_series = max_series
+        self.for_seconds = for_seconds
+        self.hysteresis = hysteresis
+        self._series: Dict[Tuple[str, str], SeriesStats] = {}
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def update(self, health_data, now: Optional[float] = None) -> List[Check]:
+        """
+        Add a health sample to the rolling statistics.
+
+        Args:
+            health_data: Server health dict or list of container health dicts.
+            now: Sample time in seconds. Defaults to ``time.monotonic()``.
+
+        Returns:
+            Anomaly and forecast checks for the sample, whether or not they
+            breach. Series still warming up produce none.
+        """
+        now = time.monotonic() if now is None else now
+        checks = []
+        if isinstance(health_data, list):  # Docker metrics
+            for container in health_data:
+                self._update(checks, container["name"], f"Container {container['name']}", container, now)
+        else:  # Server metrics
+            self._update(checks, "", "Server", health_data, now)
+        return checks
+
+    def _update(self, checks: List[Check], name: str, subject: str, sample: Dict, now: float) -> None:
+        for metric in self.metrics:
+            value = sample.get(metric)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            stats = self._series.get((name, metric))
+            if stats is None:
+                if len(self._series) >= self.max_series:
+                    self._evict(now)
+                stats = self._series[(name, metric)] = SeriesStats(self.half_life)
+            stats.update(value, now, self.min_samples, self.min_stddev)
+            if stats.count <= self.min_samples:
+                continue
+            label, unit = METRIC_LABELS.get(metric, (metric, ""))
+            checks.append(Check(f"{subject}/{metric}:anomaly", subject, f"{label} anomaly",
+                                round(stats.zscore, 2), "σ", self.z_threshold, self.for_seconds,
+                                self.hysteresis / stats.scale))
+            if metric in self.forecasts:
+                limit, horizon = self.forecasts[metric]
+                if now - stats.first < FORECAST_MIN_SPAN * horizon:
+                    continue
+                checks.append(Check(f"{subject}/{metric}:forecast", subject,
+                                    f"{label} forecast ({_duration(horizon)})",
+                                    round(stats.forecast(horizon), 1), unit, limit, self.for_seconds,
+                                    self.hysteresis))
+
+    def _evict(self, now: float) -> None:
+        idle = [key for key, stats in self._series.items() if now - stats.time > SERIES_TTL]
+        if not idle:
+            idle = [min(self._series, key=lambda key: self._series[key].time)]
+        for key in idle:
+            del self._series[key]
+        logging.info("Dropped %d idle anomaly series", len(idle))
+
+    def series(self) -> List[Dict]:
+        """
+        Return the rolling statistics of every series.
+
+        Returns:
+            List of dicts with container ("" for the server), metric, mean,
+            stddev, zscore, p95, trend_per_second and, for metrics with a
+            forecast, seconds_to_limit (None if the trend is falling or not
+            yet significant).
+        """
+        results = []
+        for (name, metric), stats in self._series.items():
+            row = {
+                "container": name,
+                "metric": metric,
+                "mean": stats.mean,
+                "stddev": stats.stddev,
+                "zscore": stats.zscore,
+                "p95": stats.quantile.value(),
+                "trend_per_second": stats.slope,
+                "count": stats.count,
+            }
+            if metric in self.forecasts:
+                limit, horizon = self.forecasts[metric]
+                row["seconds_to_limit"] = stats.seconds_to(limit, stats.significant_slope(horizon))
+            results.append(row)
+        return results
+
+
+def _slope_stderr(s0, s1, s2, st, stt, stx, sww):
+    """Standard error of a weighted least-squares slope from its weighted sums (floats or arrays)."""
+    mean_t, mean_x = st / s0, s1 / s0
+    var_t = stt / s0 - mean_t * mean_t
+    covariance = stx / s0 - mean_t * mean_x
+    var_x = s2 / s0 - mean_x * mean_x
+    # Effective number of samples under the decaying weights.
+    n = s0 * s0 / sww
+    if isinstance(s0, float):
+        if var_t <= 0 or n <= 2:
+            return math.inf
+        return math.sqrt(max(0.0, var_x - covariance * covariance / var_t) / (var_t * (n - 2)))
+    import numpy as np
+    valid = (var_t > 0) & (n > 2)
+    safe_var_t, safe_n = np.where(valid, var_t, 1.0), np.where(valid, n, 3.0)
+    residual = np.maximum(0.0, var_x - covariance * covariance / safe_var_t)
+    return np.where(valid, np.sqrt(residual / (safe_var_t * (safe_n - 2))), np.inf)
+
+
+def _duration(seconds: float) -> str:
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size and seconds % size == 0:
+            return f"{int(seconds // size)}{unit}"
+    return f"{seconds:g}s"
+
+
+def history_stats(points: Dict[Tuple[str, str], Tuple[List[float], List[float]]],
+                  half_life: float = DEFAULT_HALF_LIFE, forecasts: Optional[Dict] = None,
+                  min_samples: int = DEFAULT_MIN_SAMPLES, min_stddev: float = DEFAULT_MIN_STDDEV,
+                  quantile: float = DEFAULT_QUANTILE) -> List[Dict]:
+    """
+    Recompute the rolling statistics over recorded history with NumPy.
+
+    All series are processed together as flat arrays. Mean, stddev, trend
+    and z-score match what ``SeriesStats`` reaches after the same samples.
+    The quantile is the exact nearest-rank value over the points rather
+    than a P² estimate.
+
+    Args:
+        points: ``(timestamps, values)`` per ``(container, metric)``, oldest
+            first, as returned by ``HistoryStore.points``.
+
+    Returns:
+        Dicts shaped like ``AnomalyDetector.series()``.
+
+    Raises:
+        RuntimeError: If NumPy is not installed.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise RuntimeError("NumPy is required to analyze history. Install it with: pip install numpy")
+    forecasts = DEFAULT_FORECASTS if forecasts is None else forecasts
+    keys = [key for key, (times, _) in points.items() if times]
+    if not keys:
+        return []
+    counts = np.array([len(points[key][0]) for key in keys])
+    t = np.concatenate([np.asarray(points[key][0], dtype=float) for key in keys])
+    x = np.concatenate([np.asarray(points[key][1], dtype=float) for key in keys])
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ends = starts + counts - 1
+    segment = np.repeat(np.arange(len(keys)), counts)
+
+    def total(values):
+        return np.add.reduceat(values, starts)
+
+    # Time relative to each series' latest sample, as SeriesStats keeps it.
+    tt = t - t[ends][segment]
+    w = 0.5 ** (-tt / half_life)
+    s0 = total(w)
+    mean = total(w * x) / s0
+    xc = x - mean[segment]
+    s1, s2 = total(w * xc), total(w * xc * xc)
+    st, stt, stx = total(w * tt), total(w * tt * tt), total(w * tt * xc)
+    sww = total(w * w)
+    stderr = _slope_stderr(s0, s1, s2, st, stt, stx, sww)
+    span = t[ends] - t[starts]
+    stddev = np.sqrt(np.maximum(0.0, s2 / s0 - (s1 / s0) ** 2))
+    denominator = s0 * stt - st * st
+    flat = denominator <= 1e-9 * np.maximum(1.0, s0 * stt)
+    slope = np.where(flat, 0.0, (s0 * stx - st * s1) / np.where(flat, 1.0, denominator))
+    level = mean + (s1 - slope * st) / s0
+
+    # The latest sample scored against the ones before it.
+    w_last, xc_last = w[ends], xc[ends]
+    p0 = s0 - w_last
+    safe_p0 = np.where(p0 > 0, p0, 1.0)
+    p_mean = (s1 - w_last * xc_last) / safe_p0
+    p_var = (s2 - w_last * xc_last * xc_last) / safe_p0 - p_mean * p_mean
+    p_stddev = np.maximum(np.sqrt(np.maximum(0.0, p_var)), min_stddev)
+    zscore = (xc_last - p_mean) / p_stddev
+
+    # Nearest-rank quantile: sort by series, then value.
+    ordered = x[np.lexsort((x, segment))]
+    ranks = np.maximum(1, np.ceil(quantile * counts).astype(int))
+    quantiles = ordered[starts + ranks - 1]
+
+    results = []
+    for i, (name, metric) in enumerate(keys):
+        row = {
+            "container": name,
+            "metric": metric,
+            "mean": float(mean[i]),
+            "stddev": float(stddev[i]),
+            "zscore": float(zscore[i]) if counts[i] > min_samples else None,
+            "p95": float(quantiles[i]),
+            "trend_per_second": float(slope[i]),
+            "count": int(counts[i]),
+        }
+        if metric in forecasts:
+            limit, horizon = forecasts[metric]
+            significant = span[i] >= FORECAST_MIN_SPAN * horizon and abs(slope[i]) >= FORECAST_MIN_T * stderr[i]
+            trend = slope[i] if significant else 0.0
+            if level[i] >= limit:
+                row["seconds_to_limit"] = 0.0
+            else:
+                row["seconds_to_limit"] = float((limit - level[i]) / trend) if trend > 0 else None
+        results.append(row)
+    return results
@@ -1,14 +1,26 @@
 import click
 import json
-from .health import get_server_health
-from .docker_health import get_docker_health
-from .alert import send_alert
+import signal
+import time
+from typing import TYPE_CHECKING
+from .history import HistoryStore, DEFAULT_HISTORY_PATH, parse_duration
+from .agent import Agent, agent_snapshot, DEFAULT_AGENT_SOCKET, DEFAULT_AGENT_INTERVAL, DEFAULT_AGENT_HISTORY
+from .logs import configure_logging
+from .snapshot import write_ndjson
+from . import instrumentation
+
+# Collectors pull in psutil, docker, requests and smtplib. They are imported
+# by the commands that use them, so --help and checks answered by the agent
+# start quickly.
+if TYPE_CHECKING:
+    from .alert import AlertEngine
+    from .rules import RuleSet
 
 
 @click.group()
 def cli():
     """infrahealth: A CLI for infrastructure health monitoring."""
-    pass
+    configure_logging()
 
 
 @click.group(name="check")
@@ -17,109 +29,683 @@ def check():
     pass
 
 
+SERVER_ALERT_CONFIG = {
+    "cpu_threshold": 80, "memory_threshold": 80,
+    "email_from": "alert@infrahealth.com", "email_to": "admin@infrahealth.com",
+    "smtp_host": "smtp.example.com", "smtp_port": 587,
+    "email_user": "user", "email_password": "pass"
+}
+
+DOCKER_ALERT_CONFIG = dict(SERVER_ALERT_CONFIG, restart_threshold=5)
+
+
 @check.command(name="server")
-@click.option("--format", default="text", help="Output format (text/json)", type=click.Choice(["text", "json"]))
+@click.option("--format", default="text", help="Output format (text/json/ndjson)",
+              type=click.Choice(["text", "json", "ndjson"]))
 @click.option("--detailed", is_flag=True, help="Show detailed metrics (network, uptime, processes, load)")
 @click.option("--alert", is_flag=True, help="Send email alert if metrics exceed thresholds")
-def server(format: str, detailed: bool, alert: bool):
+@click.option("--watch", is_flag=True, help="Keep sampling and print per-interval rates")
+@click.option("--interval", default=5.0, help="Seconds between samples in watch mode", type=click.FloatRange(min=0.1))
+@click.option("--count", default=None, help="Stop watch mode after this many samples", type=click.IntRange(min=1))
+@click.option("--alert-for", default=0.0, help="Seconds a threshold must stay exceeded before alerting in watch mode",
+              type=click.FloatRange(min=0))
+@click.option("--alert-hysteresis", default=5.0, help="Points below the threshold a firing alert must drop to resolve",
+              type=click.FloatRange(min=0))
+@click.option("--record", is_flag=True, help="Append samples to the local history store")
+@click.option("--history-file", default=DEFAULT_HISTORY_PATH, help="History store path", type=click.Path(dir_okay=False))
+@click.option("--rules", "rules_file", default=None, help="Alert rule file (YAML/JSON) used instead of the default thresholds",
+              type=click.Path(exists=True, dir_okay=False))
+@click.option("--anomalies", is_flag=True,
+              help="In watch mode, also alert on values far above their rolling mean and on disk or memory trending to full")
+@click.option("--top", default=None, help="Show the top N processes by CPU, memory and disk I/O",
+              type=click.IntRange(min=1))
+@click.option("--devices", is_flag=True, help="Show every filesystem (with inodes), network interface and disk")
+@click.option("--agent-socket", default=DEFAULT_AGENT_SOCKET, envvar="INFRAHEALTH_AGENT_SOCKET",
+              help="Socket of a running agent to answer from", type=click.Path(dir_okay=False))
+@click.option("--no-agent", is_flag=True, help="Always collect directly, even if an agent is running")
+@click.option("--profile", is_flag=True, help="Print where collection time went to stderr (skips the agent)")
+def server(format: str, detailed: bool, alert: bool, watch: bool, interval: float, count: int,
+           alert_for: float, alert_hysteresis: float, record: bool, history_file: str, rules_file: str,
+           anomalies: bool, top: int, devices: bool, agent_socket: str, no_agent: bool, profile: bool):
     """Check server health (CPU, memory, disk, and optional detailed metrics)."""
+    rules = _load_rules(rules_file, alert_for, alert_hysteresis)
+    _check_anomalies(anomalies, watch, alert)
+    if profile:
+        _start_profile()
     try:
-        health = get_server_health(detailed=detailed)
-        if alert:
-            alert_config = {
-                "cpu_threshold": 80, "memory_threshold": 80,
-                "email_from": "alert@infrahealth.com", "email_to": "admin@infrahealth.com",
-                "smtp_host": "smtp.example.com", "smtp_port": 587,
-                "email_user": "user", "email_password": "pass"
-            }
-            send_alert(health, alert_config)
-        if format == "json":
-            click.echo(json.dumps(health, indent=2))
-        else:
-            output = [
-                f"CPU: {health['cpu_percent']:.1f}%",
-                f"Memory: {health['memory_percent']:.1f}%",
-                f"Disk: {health['disk_percent']:.1f}%"
-            ]
-            if detailed:
-                output.extend([
-                    f"Network Sent: {health['network_bytes_sent']:,} bytes",
-                    f"Network Received: {health['network_bytes_received']:,} bytes",
-                    f"Uptime: {health['uptime_seconds'] / 3600:.1f} hours",
-                    f"Processes: {health['process_count']:,}"
-                ])
-                if "load_avg_1min" in health:
-                    output.extend([
-                        f"Load Average (1min): {health['load_avg_1min']:.2f}",
-                        f"Load Average (5min): {health['load_avg_5min']:.2f}",
-                        f"Load Average (15min): {health['load_avg_15min']:.2f}"
-                    ])
-            click.echo("\n".join(output))
+        store = HistoryStore(history_file) if record else None
+        try:
+            if watch:
+                engine = (_alert_engine(SERVER_ALERT_CONFIG, alert_for, alert_hysteresis, rules, anomalies)
+                          if alert else None)
+                _watch_server(format, detailed, engine, interval, count, store, top, devices)
+                return
+            _check_server(format, detailed, alert, store, rules, top, devices,
+                          None if no_agent or profile else agent_socket)
+        finally:
+            if store is not None:
+                store.close()
     except RuntimeError as e:
         click.echo(f"Error: {str(e)}", err=True)
         exit(1)
 
 
+def _check_server(format: str, detailed: bool, alert: bool, store: HistoryStore, rules: "RuleSet", top: int,
+                  devices: bool, agent_socket: str = None):
+    """Take and print a single server health sample, from the agent if one is running."""
+    health = None
+    if agent_socket is not None and not devices:
+        health = agent_snapshot("server", detailed, socket_path=agent_socket)
+    if health is None:
+        from .health import get_server_health
+        health = get_server_health(detailed=detailed, devices=devices)
+    if top:
+        from .processes import get_top_processes
+        health["top_processes"] = get_top_processes(top)
+    if store is not None:
+        store.append(health)
+    if alert:
+        from .alert import send_alert
+        send_alert(health, SERVER_ALERT_CONFIG, rules=rules)
+    if format == "json":
+        click.echo(json.dumps(health, indent=2))
+    elif format == "ndjson":
+        write_ndjson([health])
+    else:
+        click.echo("\n".join(_server_lines(health, detailed)))
+
+
+def _watch_server(format: str, detailed: bool, engine: "AlertEngine", interval: float, count: int,
+                  store: HistoryStore, top: int, devices: bool):
+    """Sample server health on a fixed schedule until interrupted."""
+    from .watch import watch as watch_samples, compute_rates, sample_server
+    from .processes import get_top_processes
+
+    def sample():
+        health = sample_server(detailed=detailed, devices=devices)
+        if top:
+            health["top_processes"] = get_top_processes(top)
+        return health
+    samples = watch_samples(sample, interval, count)
+    try:
+        for health, previous, elapsed in samples:
+            rates = compute_rates(previous, health, elapsed)
+            if store is not None:
+                store.append(health)
+            if engine is not None:
+                engine.evaluate_health(health)
+            if format != "text":
+                click.echo(json.dumps(dict(health, **rates)))
+            else:
+                click.echo(time.strftime("[%H:%M:%S]"))
+                click.echo("\n".join(_server_lines(health, detailed) + _rate_lines(rates)))
+                click.echo("-" * 40)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if engine is not None:
+            engine.close()
+
+
+def _start_profile():
+    """Record collection costs and print them to stderr once the command finishes."""
+    instrumentation.enable()
+    click.get_current_context().call_on_close(_print_profile)
+
+
+def _print_profile():
+    click.echo("\n".join(instrumentation.profile_lines(instrumentation.recorder.snapshot())), err=True)
+
+
+def _alert_engine(alert_config: dict, alert_for: float, alert_hysteresis: float,
+                  rules: "RuleSet" = None, anomalies: bool = False) -> "AlertEngine":
+    """Create an alert engine that batches notifications from watch mode."""
+    from .alert import AlertEngine
+    detector = None
+    if anomalies:
+        from .anomaly import AnomalyDetector
+        detector = AnomalyDetector(for_seconds=alert_for, hysteresis=alert_hysteresis)
+    return AlertEngine(dict(alert_config, for_seconds=alert_for, hysteresis=alert_hysteresis), rules=rules,
+                       detector=detector)
+
+
+def _check_anomalies(anomalies: bool, watch: bool, alert: bool) -> None:
+    """Reject --anomalies outside watch-mode alerting, where there is no history to compare against."""
+    if anomalies and not (watch and alert):
+        raise click.UsageError("--anomalies needs --watch and --alert")
+
+
+def _load_rules(rules_file: str, alert_for: float, alert_hysteresis: float) -> "RuleSet":
+    """Compile the rule file, if any, with the command line durations as defaults."""
+    if rules_file is None:
+        return None
+    from .rules import load_rules
+    try:
+        return load_rules(rules_file, defaults={"for_seconds": alert_for, "hysteresis": alert_hysteresis})
+    except (ValueError, RuntimeError) as e:
+        raise click.BadParameter(str(e), param_hint="--rules")
+
+
+def _server_lines(health: dict, detailed: bool) -> list:
+    output = [
+        f"CPU: {health['cpu_percent']:.1f}%",
+        f"Memory: {health['memory_percent']:.1f}%",
+        f"Disk: {health['disk_percent']:.1f}%"
+    ]
+    if detailed:
+        output.extend([
+            f"CPU User/System/IOWait/Steal: {health['cpu_user_percent']:.1f}% / "
+            f"{health['cpu_system_percent']:.1f}% / {health['cpu_iowait_percent']:.1f}% / "
+            f"{health['cpu_steal_percent']:.1f}%",
+            f"Network Sent: {health['network_bytes_sent']:,} bytes",
+            f"Network Received: {health['network_bytes_received']:,} bytes",
+            f"Uptime: {health['uptime_seconds'] / 3600:.1f} hours",
+            f"Processes: {health['process_count']:,}"
+        ])
+        if "load_avg_1min" in health:
+            output.extend([
+                f"Load Average (1min): {health['load_avg_1min']:.2f}",
+                f"Load Average (5min): {health['load_avg_5min']:.2f}",
+                f"Load Average (15min): {health['load_avg_15min']:.2f}"
+            ])
+    if "filesystems" in health:
+        output.extend(_device_lines(health))
+    if "top_processes" in health:
+        output.extend(_process_lines(health["top_processes"]))
+    return output
+
+
+def _device_lines(health: dict) -> list:
+    output = ["Filesystems:"]
+    for fs in health["filesystems"]:
+        if "error" in fs:
+            output.append(f"  {fs['mountpoint']} ({fs['fstype']}): {fs['error']}")
+        else:
+            output.append(f"  {fs['mountpoint']} ({fs['fstype']}): {fs['percent']:.1f}% of "
+                          f"{fs['total_bytes'] / 1073741824:,.1f} GB, inodes {fs['inodes_percent']:.1f}%")
+    output.append("Network Interfaces:")
+    for nic, counters in health["network_interfaces"].items():
+        output.append(f"  {nic}: sent {counters['bytes_sent']:,} bytes, received {counters['bytes_received']:,} bytes, "
+                      f"errors {counters['errors_in'] + counters['errors_out']:,}, "
+                      f"drops {counters['drops_in'] + counters['drops_out']:,}")
+    output.append("Disks:")
+    for disk, counters in health["disk_io"].items():
+        output.append(f"  {disk}: read {counters['read_bytes']:,} bytes ({counters['read_count']:,} ops), "
+                      f"written {counters['write_bytes']:,} bytes ({counters['write_count']:,} ops)")
+    return output
+
+
+def _process_lines(top_processes: dict) -> list:
+    output = []
+    for ranking, title in (("cpu", "CPU"), ("memory", "Memory"), ("io", "Disk I/O")):
+        output.append(f"Top Processes by {title}:")
+        output.append(f"  {'PID':>7} {'Name':<20} {'CPU':>7} {'RSS':>12} {'I/O':>14}")
+        for process in top_processes[ranking]:
+            output.append(f"  {process['pid']:>7} {process['name'][:20]:<20} {process['cpu_percent']:>6.1f}% "
+                          f"{process['rss_bytes'] / 1048576:>9.1f} MB {process['io_bytes_per_sec'] / 1024:>9.1f} KB/s")
+    return output
+
+
+def _rate_lines(rates: dict) -> list:
+    output = []
+    if "cpu_percent_delta" in rates:
+        output.append(f"CPU Change: {rates['cpu_percent_delta']:+.1f} pts")
+    if "network_bytes_sent_per_sec" in rates:
+        output.extend([
+            f"Network Sent Rate: {rates['network_bytes_sent_per_sec']:,.0f} bytes/s",
+            f"Network Received Rate: {rates['network_bytes_received_per_sec']:,.0f} bytes/s"
+        ])
+    if "disk_read_bytes_per_sec" in rates:
+        output.extend([
+            f"Disk Read Rate: {rates['disk_read_bytes_per_sec']:,.0f} bytes/s "
+            f"({rates['disk_reads_per_sec']:,.1f} ops/s)",
+            f"Disk Write Rate: {rates['disk_write_bytes_per_sec']:,.0f} bytes/s "
+            f"({rates['disk_writes_per_sec']:,.1f} ops/s)"
+        ])
+    return output
+
+
 @check.command(name="docker")
-@click.option("--format", default="text", help="Output format (text/json)", type=click.Choice(["text", "json"]))
+@click.option("--format", default="text", help="Output format (text/json/ndjson)",
+              type=click.Choice(["text", "json", "ndjson"]))
 @click.option("--detailed", is_flag=True, help="Show detailed metrics (network, restart count)")
 @click.option("--alert", is_flag=True, help="Send email alert if metrics exceed thresholds")
 @click.option("--app-check", is_flag=True, help="Check application health via HTTP endpoint")
-def docker(format: str, detailed: bool, alert: bool, app_check: bool):
+@click.option("--concurrency", default=16, help="Maximum containers queried in parallel", type=click.IntRange(min=1))
+@click.option("--timeout", default=10.0, help="Per-container stats timeout in seconds", type=float)
+@click.option("--watch", is_flag=True, help="Keep sampling and print per-interval rates")
+@click.option("--interval", default=5.0, help="Seconds between samples in watch mode", type=click.FloatRange(min=0.1))
+@click.option("--count", default=None, help="Stop watch mode after this many samples", type=click.IntRange(min=1))
+@click.option("--alert-for", default=0.0, help="Seconds a threshold must stay exceeded before alerting in watch mode",
+              type=click.FloatRange(min=0))
+@click.option("--alert-hysteresis", default=5.0, help="Points below the threshold a firing alert must drop to resolve",
+              type=click.FloatRange(min=0))
+@click.option("--record", is_flag=True, help="Append samples to the local history store")
+@click.option("--history-file", default=DEFAULT_HISTORY_PATH, help="History store path", type=click.Path(dir_okay=False))
+@click.option("--rules", "rules_file", default=None, help="Alert rule file (YAML/JSON) used instead of the default thresholds",
+              type=click.Path(exists=True, dir_okay=False))
+@click.option("--anomalies", is_flag=True,
+              help="In watch mode, also alert on values far above their rolling mean and on disk or memory trending to full")
+@click.option("--backend", default="api", help="Read stats through the Docker API or straight from cgroup v2 files",
+              type=click.Choice(["api", "cgroup"]))
+@click.option("--hosts", "hosts_file", default=None, help="File of Docker host URLs (tcp:// or unix://) to check in parallel",
+              type=click.Path(exists=True, dir_okay=False))
+@click.option("--host-timeout", default=30.0, help="Seconds allowed for checking one host with --hosts",
+              type=click.FloatRange(min=0.1))
+@click.option("--agent-socket", default=DEFAULT_AGENT_SOCKET, envvar="INFRAHEALTH_AGENT_SOCKET",
+              help="Socket of a running agent to answer from", type=click.Path(dir_okay=False))
+@click.option("--no-agent", is_flag=True, help="Always collect directly, even if an agent is running")
+@click.option("--profile", is_flag=True, help="Print where collection time went to stderr (skips the agent)")
+def docker(format: str, detailed: bool, alert: bool, app_check: bool, concurrency: int, timeout: float,
+           watch: bool, interval: float, count: int, alert_for: float, alert_hysteresis: float,
+           record: bool, history_file: str, rules_file: str, anomalies: bool, backend: str, hosts_file: str,
+           host_timeout: float, agent_socket: str, no_agent: bool, profile: bool):
     """Check health of running Docker containers."""
+    rules = _load_rules(rules_file, alert_for, alert_hysteresis)
+    _check_anomalies(anomalies, watch, alert)
+    if profile:
+        _start_profile()
+    if hosts_file is not None:
+        if watch or record or backend != "api":
+            raise click.UsageError("--hosts cannot be combined with --watch, --record or --backend cgroup")
+        from .fleet import read_hosts
+        try:
+            hosts = read_hosts(hosts_file)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--hosts")
+        failed = _check_fleet(format, detailed, alert, app_check, concurrency, timeout, host_timeout, hosts, rules)
+        if failed:
+            click.echo(f"Error: {failed} of {len(hosts)} hosts failed", err=True)
+            exit(1)
+        return
     try:
-        health = get_docker_health(detailed=detailed, app_check=app_check)
-        if not health:
+        store = HistoryStore(history_file) if record else None
+        try:
+            if watch:
+                engine = (_alert_engine(DOCKER_ALERT_CONFIG, alert_for, alert_hysteresis, rules, anomalies)
+                          if alert else None)
+                _watch_docker(format, detailed, engine, app_check, concurrency, timeout, interval, count, store,
+                              backend)
+                return
+            _check_docker(format, detailed, alert, app_check, concurrency, timeout, store, rules, backend,
+                          None if no_agent or profile else agent_socket)
+        finally:
+            if store is not None:
+                store.close()
+    except RuntimeError as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        exit(1)
+
+
+def _check_docker(format: str, detailed: bool, alert: bool, app_check: bool, concurrency: int,
+                  timeout: float, store: HistoryStore, rules: "RuleSet", backend: str, agent_socket: str = None):
+    """Take and print a single container health sample, from the agent if one is running."""
+    health, streamed = None, False
+    if agent_socket is not None and backend == "api" and not app_check:
+        health = agent_snapshot("docker", detailed, socket_path=agent_socket)
+    if health is None and backend == "api" and format == "ndjson":
+        # Print each container as its stats arrive; store and alert afterwards.
+        from .docker_health import stream_docker_health
+        health, streamed = [], True
+        write_ndjson(_gathered(stream_docker_health(detailed=detailed, app_check=app_check,
+                                                    concurrency=concurrency, timeout=timeout), health))
+    elif health is None and backend == "cgroup":
+        from .cgroup import CgroupCollector
+        with CgroupCollector() as collector:
+            health = collector.collect(detailed=detailed, app_check=app_check)
+    elif health is None:
+        from .docker_health import get_docker_health
+        health = get_docker_health(detailed=detailed, app_check=app_check,
+                                   concurrency=concurrency, timeout=timeout)
+    if store is not None:
+        store.append(health)
+    if not health:
+        if format != "ndjson":
             click.echo("No running Docker containers found.")
-            return
-        if alert:
-            alert_config = {
-                "cpu_threshold": 80, "memory_threshold": 80, "restart_threshold": 5,
-                "email_from": "alert@infrahealth.com", "email_to": "admin@infrahealth.com",
-                "smtp_host": "smtp.example.com", "smtp_port": 587,
-                "email_user": "user", "email_password": "pass"
-            }
-            send_alert(health, alert_config)
-        if format == "json":
-            click.echo(json.dumps(health, indent=2))
-        else:
+        return
+    if alert:
+        from .alert import send_alert
+        send_alert(health, DOCKER_ALERT_CONFIG, rules=rules)
+    if format == "json":
+        click.echo(json.dumps(health, indent=2))
+    elif format == "ndjson":
+        if not streamed:
+            write_ndjson(health)
+    else:
+        for container in health:
+            click.echo("\n".join(_container_lines(container, detailed, app_check)))
+            click.echo("-" * 40)
+
+
+def _gathered(records, into: list):
+    """Pass records through while also collecting them into a list."""
+    for record in records:
+        into.append(record)
+        yield record
+
+
+def _check_fleet(format: str, detailed: bool, alert: bool, app_check: bool, concurrency: int, timeout: float,
+                 host_timeout: float, hosts: list, rules: "RuleSet") -> int:
+    """Check every host, printing each one as it finishes. Returns the number of failed hosts."""
+    from .fleet import Fleet
+    failed = 0
+    all_containers = []
+    with Fleet(hosts, concurrency=concurrency, host_timeout=host_timeout) as fleet:
+        for result in fleet.check(detailed=detailed, app_check=app_check, timeout=timeout):
+            if result["error"] is not None:
+                failed += 1
+            all_containers.extend(dict(container, name=f"{result['host']}/{container['name']}")
+                                  for container in result["containers"])
+            if format != "text":
+                click.echo(json.dumps(result))
+                continue
+            click.echo(f"Host: {result['host']} ({len(result['containers'])} containers, "
+                       f"{result['duration']:.1f}s)")
+            if result["error"] is not None:
+                click.echo(f"Error: {result['error']}")
+            for container in result["containers"]:
+                click.echo("\n".join(_container_lines(container, detailed, app_check)))
+                click.echo("-" * 40)
+    if alert and all_containers:
+        from .alert import send_alert
+        send_alert(all_containers, DOCKER_ALERT_CONFIG, rules=rules)
+    return failed
+
+
+def _watch_docker(format: str, detailed: bool, engine: "AlertEngine", app_check: bool, concurrency: int,
+                  timeout: float, interval: float, count: int, store: HistoryStore, backend: str):
+    """Sample container health on a fixed schedule over one Docker client."""
+    from .cgroup import CgroupCollector
+    from .docker_health import get_docker_health, connect
+    from .inventory import ContainerInventory
+    from .watch import watch as watch_samples, compute_rates
+    client = connect(concurrency=concurrency, timeout=timeout)
+    # Containers are listed once and then tracked through Docker events.
+    inventory = ContainerInventory(client)
+    collector = None
+    try:
+        inventory.start()
+        if backend == "cgroup":
+            collector = CgroupCollector(inventory=inventory)
+
+        def sample():
+            # Counters are always collected so rates can be reported.
+            if collector is not None:
+                return collector.collect(detailed=True, app_check=app_check)
+            return get_docker_health(detailed=True, app_check=app_check, concurrency=concurrency,
+                                     timeout=timeout, inventory=inventory)
+        for health, previous, elapsed in watch_samples(sample, interval, count):
+            previous_by_name = {c["name"]: c for c in previous or []}
+            if store is not None:
+                store.append(health)
+            if engine is not None:
+                engine.evaluate_health(health)
+            if format != "text":
+                for container in health:
+                    rates = compute_rates(previous_by_name.get(container["name"]), container, elapsed)
+                    click.echo(json.dumps(dict(container, **rates)))
+                continue
+            click.echo(time.strftime("[%H:%M:%S]"))
+            if not health:
+                click.echo("No running Docker containers found.")
             for container in health:
-                output = [
-                    f"Container: {container['name']}",
-                    f"Status: {container['status']}",
-                    f"CPU: {container['cpu_percent']:.1f}%",
-                    f"Memory: {container['memory_percent']:.1f}%"
-                ]
-                if detailed:
-                    output.extend([
-                        f"Network Sent: {container['network_bytes_sent']:,} bytes",
-                        f"Network Received: {container['network_bytes_received']:,} bytes",
-                        f"Restarts: {container['restart_count']}"
-                    ])
-                if app_check:
-                    output.append(f"App Health: {container['app_health']}")
-                click.echo("\n".join(output))
+                rates = compute_rates(previous_by_name.get(container["name"]), container, elapsed)
+                click.echo("\n".join(_container_lines(container, detailed, app_check) + _rate_lines(rates)))
                 click.echo("-" * 40)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if collector is not None:
+            collector.close()
+        inventory.stop()
+        client.close()
+        if engine is not None:
+            engine.close()
+
+
+def _container_lines(container: dict, detailed: bool, app_check: bool) -> list:
+    output = [
+        f"Container: {container['name']}",
+        f"Status: {container['status']}",
+        f"CPU: {container['cpu_percent']:.1f}%",
+        f"Memory: {container['memory_percent']:.1f}%"
+    ]
+    if detailed:
+        output.extend([
+            f"Network Sent: {container['network_bytes_sent']:,} bytes",
+            f"Network Received: {container['network_bytes_received']:,} bytes",
+            f"Restarts: {container['restart_count']}"
+        ])
+        if len(container.get("networks", {})) > 1:
+            for nic, counters in container["networks"].items():
+                output.append(f"  {nic}: sent {counters['bytes_sent']:,} bytes, "
+                              f"received {counters['bytes_received']:,} bytes")
+        if "disk_read_bytes" in container:
+            output.extend([
+                f"Disk Read: {container['disk_read_bytes']:,} bytes",
+                f"Disk Written: {container['disk_write_bytes']:,} bytes"
+            ])
+    if app_check:
+        if "app_latency_ms" in container:
+            output.append(f"App Health: {container['app_health']} ({container['app_latency_ms']:.1f} ms via "
+                          f"{container['app_probe']})")
+        else:
+            output.append(f"App Health: {container['app_health']}")
+    return output
+
+
+cli.add_command(check)
+
+
+@cli.command(name="history")
+@click.option("--since", default="1h", help="Start of the range, as a duration ago (e.g. 90s, 15m, 2h, 7d)")
+@click.option("--until", default="0", help="End of the range, as a duration ago")
+@click.option("--metric", default=None, help="Only show this metric (e.g. cpu_percent)")
+@click.option("--container", default=None, help="Only show this container (use '' for server metrics)")
+@click.option("--format", default="text", help="Output format (text/json)", type=click.Choice(["text", "json"]))
+@click.option("--history-file", default=DEFAULT_HISTORY_PATH, help="History store path", type=click.Path(dir_okay=False))
+@click.option("--trend", is_flag=True, help="Show rolling mean, deviation, trend and time to full instead (needs numpy)")
+def history(since: str, until: str, metric: str, container: str, format: str, history_file: str, trend: bool):
+    """Summarize recorded metrics (min/max/avg/p95) over a time range."""
+    try:
+        now = time.time()
+        start, end = now - parse_duration(since), now - parse_duration(until)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    try:
+        with HistoryStore(history_file, readonly=True) as store:
+            if trend:
+                from .anomaly import history_stats
+                results = history_stats(store.points(start, end, metric=metric, container=container))
+            else:
+                results = store.query(start, end, metric=metric, container=container)
     except RuntimeError as e:
         click.echo(f"Error: {str(e)}", err=True)
         exit(1)
+    if format == "json":
+        click.echo(json.dumps(results, indent=2))
+        return
+    if not results:
+        click.echo("No samples recorded in this range.")
+        return
+    if trend:
+        click.echo("\n".join(_trend_lines(results)))
+        return
+    click.echo(f"{'Source':<24} {'Metric':<28} {'Min':>12} {'Max':>12} {'Avg':>12} {'P95':>12} {'Count':>8}")
+    for row in results:
+        source = row["container"] or "server"
+        click.echo(f"{source:<24} {row['metric']:<28} {row['min']:>12.2f} {row['max']:>12.2f} "
+                   f"{row['avg']:>12.2f} {row['p95']:>12.2f} {row['count']:>8}")
 
 
-cli.add_command(check)
+def _trend_lines(results: list) -> list:
+    output = [f"{'Source':<24} {'Metric':<28} {'Mean':>12} {'Stddev':>12} {'P95':>12} {'Trend/h':>12} {'Full in':>10}"]
+    for row in results:
+        source = row["container"] or "server"
+        remaining = row.get("seconds_to_limit")
+        full_in = "-" if remaining is None else f"{remaining / 3600:.1f}h"
+        output.append(f"{source:<24} {row['metric']:<28} {row['mean']:>12.2f} {row['stddev']:>12.2f} "
+                      f"{row['p95']:>12.2f} {row['trend_per_second'] * 3600:>+12.2f} {full_in:>10}")
+    return output
 
 
 @cli.command(name="start-prometheus")
 @click.option("--port", default=8000, help="Port for Prometheus exporter", type=int)
-def start_prometheus(port: int):
+@click.option("--stream", is_flag=True, help="Keep streaming stats subscriptions instead of polling containers")
+@click.option("--cache-ttl", default=10.0, help="Seconds a collected snapshot is reused across scrapes", type=float)
+@click.option("--backend", default="api", help="Read stats through the Docker API or straight from cgroup v2 files",
+              type=click.Choice(["api", "cgroup"]))
+@click.option("--app-check", is_flag=True, help="Export application health probe results")
+@click.option("--top", default=0, help="Export the top N processes by CPU, memory and disk I/O",
+              type=click.IntRange(min=0))
+@click.option("--self-metrics/--no-self-metrics", default=True,
+              help="Export infrahealth_self_* metrics on the exporter's own collection costs")
+@click.option("--anomalies", is_flag=True, help="Export rolling mean, deviation, z-score, trend and time to full")
+@click.option("--adaptive", is_flag=True,
+              help="Sample each collector on its own interval, faster near thresholds and slower when idle")
+@click.option("--sample-interval", "sample_intervals", multiple=True,
+              help="Base interval of one collector with --adaptive, as NAME=SECONDS (repeatable; "
+                   "cpu, memory, disk, network, processes, docker, probes)")
+@click.option("--cpu-budget", default=2.0, help="Percent of one CPU adaptive sampling may use",
+              type=click.FloatRange(min=0.1, max=100))
+def start_prometheus(port: int, stream: bool, cache_ttl: float, backend: str, app_check: bool, top: int,
+                     self_metrics: bool, anomalies: bool, adaptive: bool, sample_intervals: tuple, cpu_budget: float):
     """Start Prometheus exporter for server and Docker metrics."""
     from .prometheus_exporter import export_metrics
+    if stream and (backend == "cgroup" or app_check):
+        raise click.UsageError("--stream cannot be combined with --backend cgroup or --app-check")
+    intervals = _check_intervals(adaptive, sample_intervals)
     try:
-        export_metrics(port)
+        export_metrics(port, stream=stream, ttl=cache_ttl, backend=backend, app_check=app_check, top=top,
+                       self_metrics=self_metrics, anomalies=anomalies, adaptive=adaptive, intervals=intervals,
+                       cpu_budget=cpu_budget / 100.0)
     except Exception as e:
         click.echo(f"Error: {str(e)}", err=True)
         exit(1)
 
 
+@cli.command(name="push")
+@click.option("--url", required=True, help="Remote-write endpoint, or Pushgateway base URL")
+@click.option("--protocol", default="remote-write", help="How to send samples",
+              type=click.Choice(["remote-write", "pushgateway"]))
+@click.option("--interval", default=15.0, help="Seconds between collections", type=click.FloatRange(min=0.1))
+@click.option("--job", default="infrahealth", help="job label (and Pushgateway group) for pushed samples")
+@click.option("--header", "headers", multiple=True, help="Extra request header, as 'Name: value' (repeatable)")
+@click.option("--spool-dir", default=None, help="Directory holding samples not delivered yet",
+              type=click.Path(file_okay=False))
+@click.option("--spool-size", default=64, help="Megabytes of undelivered samples kept before dropping the oldest",
+              type=click.IntRange(min=1))
+@click.option("--once", is_flag=True, help="Collect once, deliver everything spooled, and exit (for CI runners)")
+@click.option("--backend", default="api", help="Read stats through the Docker API or straight from cgroup v2 files",
+              type=click.Choice(["api", "cgroup"]))
+@click.option("--app-check", is_flag=True, help="Push application health probe results")
+@click.option("--top", default=0, help="Push the top N processes by CPU, memory and disk I/O",
+              type=click.IntRange(min=0))
+@click.option("--self-metrics/--no-self-metrics", default=True,
+              help="Push infrahealth_self_* metrics on infrahealth's own collection costs")
+@click.option("--adaptive", is_flag=True,
+              help="Sample each collector on its own interval, faster near thresholds and slower when idle")
+@click.option("--sample-interval", "sample_intervals", multiple=True,
+              help="Base interval of one collector with --adaptive, as NAME=SECONDS (repeatable; "
+                   "cpu, memory, disk, network, processes, docker, probes)")
+@click.option("--cpu-budget", default=2.0, help="Percent of one CPU adaptive sampling may use",
+              type=click.FloatRange(min=0.1, max=100))
+def push(url: str, protocol: str, interval: float, job: str, headers: tuple, spool_dir: str, spool_size: int,
+         once: bool, backend: str, app_check: bool, top: int, self_metrics: bool, adaptive: bool,
+         sample_intervals: tuple, cpu_budget: float):
+    """Push metrics to a Prometheus remote-write endpoint or a Pushgateway."""
+    from .push import Pusher, Spool, DEFAULT_SPOOL_DIR
+    from .prometheus_exporter import create_collector
+    try:
+        extra_headers = dict(_parse_header(header) for header in headers)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--header")
+    if adaptive and once:
+        raise click.UsageError("--adaptive samples in the background and cannot be combined with --once")
+    intervals = _check_intervals(adaptive, sample_intervals)
+    if self_metrics:
+        instrumentation.enable()
+    try:
+        spool = Spool(spool_dir or DEFAULT_SPOOL_DIR, budget_bytes=spool_size * 1024 * 1024)
+        collector = create_collector(ttl=0, backend=backend, app_check=app_check, top=top, adaptive=adaptive,
+                                     intervals=intervals, cpu_budget=cpu_budget / 100.0)
+        pusher = Pusher(url, collector, protocol=protocol, spool=spool, interval=interval, job=job,
+                        headers=extra_headers)
+    except (RuntimeError, OSError) as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        exit(1)
+    if once:
+        pusher.collect()
+        delivered = pusher.flush(timeout=30.0)
+        if not delivered:
+            click.echo(f"Error: {len(spool)} collections left in {spool.directory} for the next run", err=True)
+            exit(1)
+        return
+    pusher.start()
+    click.echo(f"Pushing to {url} every {interval:g}s")
+    signal.signal(signal.SIGTERM, lambda signum, frame: pusher.stop())
+    try:
+        pusher.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pusher.stop()
+
+
+def _check_intervals(adaptive: bool, sample_intervals: tuple) -> dict:
+    """Parse --sample-interval values, which only apply with --adaptive."""
+    if sample_intervals and not adaptive:
+        raise click.UsageError("--sample-interval requires --adaptive")
+    from .scheduler import COLLECTORS
+    intervals = {}
+    for value in sample_intervals:
+        name, _, seconds = value.partition("=")
+        try:
+            seconds = float(seconds)
+        except ValueError:
+            seconds = 0.0
+        if name.strip() not in COLLECTORS or seconds <= 0:
+            raise click.BadParameter(f"Expected NAME=SECONDS with NAME one of {', '.join(COLLECTORS)}, got {value!r}",
+                                     param_hint="--sample-interval")
+        intervals[name.strip()] = seconds
+    return intervals
+
+
+def _parse_header(header: str) -> tuple:
+    name, separator, value = header.partition(":")
+    if not separator or not name.strip():
+        raise ValueError(f"Expected 'Name: value', got {header!r}")
+    return name.strip(), value.strip()
+
+
+@cli.command(name="agent")
+@click.option("--socket", "socket_path", default=DEFAULT_AGENT_SOCKET, envvar="INFRAHEALTH_AGENT_SOCKET",
+              help="Unix socket to serve on", type=click.Path(dir_okay=False))
+@click.option("--interval", default=DEFAULT_AGENT_INTERVAL, help="Seconds between server samples",
+              type=click.FloatRange(min=0.1))
+@click.option("--docker-interval", default=None, help="Seconds between container samples (default: --interval)",
+              type=click.FloatRange(min=0.1))
+@click.option("--history-size", default=DEFAULT_AGENT_HISTORY, help="Samples of each kind kept in memory",
+              type=click.IntRange(min=1))
+def agent(socket_path: str, interval: float, docker_interval: float, history_size: int):
+    """Run collectors in the background and answer checks from memory."""
+    daemon = Agent(socket_path, interval=interval, docker_interval=docker_interval, history_size=history_size)
+    try:
+        daemon.start()
+    except (RuntimeError, OSError) as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        exit(1)
+    click.echo(f"Agent serving on {socket_path}")
+    # Remove the socket when stopped by a service manager, too.
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    try:
+        daemon.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+
+
 def main():
     """Entry point for the CLI."""
     cli()
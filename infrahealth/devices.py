@@ -0,0 +1,241 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional
+import logging
+
+import psutil
+
+from .instrumentation import instrumented, recorder
+
+DEFAULT_MOUNT_TIMEOUT = 2.0
+DEFAULT_MOUNT_TTL = 60.0
+DEFAULT_MOUNT_WORKERS = 8
+
+# Kernel and in-memory filesystems left out of the mount table. Everything
+# else, including network filesystems such as nfs, cifs and fuse mounts, is
+# reported.
+PSEUDO_FSTYPES = {
+    "autofs", "binfmt_misc", "bpf", "cgroup", "cgroup2", "configfs", "debugfs", "devpts", "devtmpfs",
+    "efivarfs", "fusectl", "hugetlbfs", "mqueue", "nsfs", "overlay", "proc", "pstore", "ramfs",
+    "rpc_pipefs", "securityfs", "selinuxfs", "squashfs", "sysfs", "tmpfs", "tracefs",
+}
+
+
+class FilesystemCollector:
+    """
+    Report space and inode usage for every mounted filesystem.
+
+    The mount table is cached for ``mount_ttl`` seconds. Each mount is
+    queried on a worker pool, and the whole sample waits at most
+    ``timeout`` seconds, so a hung network mount is reported as an error
+    instead of stalling the check. A mount whose previous query is still
+    stuck is not queried again until that query returns, and the worker
+    pool is replaced after a timeout so stuck workers cannot starve the
+    other mounts. Queries run on daemon threads, so one stuck on a hung
+    mount does not hold up interpreter exit.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_MOUNT_TIMEOUT, mount_ttl: float = DEFAULT_MOUNT_TTL,
+                 workers: int = DEFAULT_MOUNT_WORKERS,
+                 partitions: Optional[Callable[[], List]] = None,
+                 usage: Optional[Callable[[str], Dict]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.timeout = timeout
+        self.mount_ttl = mount_ttl
+        self._partitions = partitions or mounted_filesystems
+        self._usage = usage or filesystem_usage
+        self._clock = clock
+        self._workers = max(1, workers)
+        self._pool = self._new_pool()
+        self._lock = threading.Lock()
+        self._mounts: List = []
+        self._mounts_at: Optional[float] = None
+        self._stuck: Dict[str, object] = {}
+
+    def close(self) -> None:
+        """Stop the worker pool without waiting for stuck mounts."""
+        self._pool.shutdown()
+
+    def _new_pool(self) -> "_DaemonPool":
+        return _DaemonPool(self._workers, "infrahealth-statvfs")
+
+    @instrumented("filesystems")
+    def sample(self) -> List[Dict]:
+        """
+        Return usage for every mounted filesystem, in mount table order.
+
+        Returns:
+            List of dicts with ``mountpoint``, ``device`` and ``fstype``, plus
+            either ``total_bytes``, ``used_bytes``, ``free_bytes``,
+            ``percent``, ``inodes_total``, ``inodes_used`` and
+            ``inodes_percent``, or an ``error`` for mounts that failed or
+            did not answer in time.
+        """
+        with self._lock:
+            mounts = self._mount_table()
+            futures = {}
+            for mount in mounts:
+                stuck = self._stuck.get(mount.mountpoint)
+                if stuck is not None and not stuck.done():
+                    continue
+                self._stuck.pop(mount.mountpoint, None)
+                futures[mount.mountpoint] = self._pool.submit(self._usage, mount.mountpoint)
+            deadline = self._clock() + self.timeout
+            results = []
+            timed_out = False
+            for mount in mounts:
+                entry = {"mountpoint": mount.mountpoint, "device": mount.device, "fstype": mount.fstype}
+                future = futures.get(mount.mountpoint)
+                if future is None:
+                    entry["error"] = "not responding"
+                    results.append(entry)
+                    continue
+                try:
+                    entry.update(future.result(timeout=max(0.0, deadline - self._clock())))
+                except FutureTimeoutError:
+                    self._stuck[mount.mountpoint] = future
+                    timed_out = True
+                    recorder.error("filesystems")
+                    logging.error("Timed out reading %s after %.1fs", mount.mountpoint, self.timeout)
+                    entry["error"] = f"timed out after {self.timeout:.1f}s"
+                except OSError as e:
+                    logging.error("Failed to read %s: %s", mount.mountpoint, str(e))
+                    entry["error"] = str(e)
+                results.append(entry)
+            if timed_out:
+                # Leave the stuck workers behind; queued and running queries
+                # on the old pool still finish.
+                self._pool.shutdown()
+                self._pool = self._new_pool()
+            return results
+
+    def _mount_table(self) -> List:
+        now = self._clock()
+        if self._mounts_at is None or now - self._mounts_at >= self.mount_ttl:
+            self._mounts = self._partitions()
+            self._mounts_at = now
+        return self._mounts
+
+
+class _DaemonPool:
+    """
+    Bounded worker pool on daemon threads.
+
+    ``ThreadPoolExecutor`` joins its workers when the interpreter exits,
+    which never happens while one is blocked in ``statvfs`` on a hard-hung
+    mount. Workers are started as work is submitted, up to ``workers``.
+    """
+
+    _STOP = object()
+
+    def __init__(self, workers: int, name: str):
+        self._workers = workers
+        self._name = name
+        self._queue: queue.Queue = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        future = Future()
+        with self._lock:
+            if len(self._threads) < self._workers:
+                thread = threading.Thread(target=self._run, name=f"{self._name}-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        self._queue.put((future, fn, args))
+        return future
+
+    def shutdown(self) -> None:
+        """Stop the workers once queued work is done, without waiting for them."""
+        with self._lock:
+            for _ in self._threads:
+                self._queue.put(self._STOP)
+
+    def _run(self) -> None:
+        while True:
+            work = self._queue.get()
+            if work is self._STOP:
+                return
+            future, fn, args = work
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+
+
+def mounted_filesystems() -> List:
+    """Return every mounted block device and network filesystem, leaving out ``PSEUDO_FSTYPES``."""
+    return [partition for partition in psutil.disk_partitions(all=True)
+            if partition.fstype and partition.fstype not in PSEUDO_FSTYPES]
+
+
+def filesystem_usage(path: str) -> Dict:
+    """Return space and inode usage of the filesystem mounted at ``path``."""
+    if not hasattr(os, "statvfs"):
+        # No inode counts on this platform.
+        usage = psutil.disk_usage(path)
+        return {"total_bytes": usage.total, "used_bytes": usage.used, "free_bytes": usage.free,
+                "percent": usage.percent, "inodes_total": 0, "inodes_used": 0, "inodes_percent": 0.0}
+    stat = os.statvfs(path)
+    total = stat.f_blocks * stat.f_frsize
+    used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+    available = stat.f_bavail * stat.f_frsize
+    inodes_used = stat.f_files - stat.f_ffree
+    return {
+        "total_bytes": total,
+        "used_bytes": used,
+        "free_bytes": available,
+        # Same as df and psutil: space reserved for root does not count as free.
+        "percent": round(used / (used + available) * 100.0, 1) if used + available > 0 else 0.0,
+        "inodes_total": stat.f_files,
+        "inodes_used": inodes_used,
+        "inodes_percent": round(inodes_used / stat.f_files * 100.0, 1) if stat.f_files > 0 else 0.0
+    }
+
+
+def network_interfaces() -> Dict[str, Dict]:
+    """Return traffic, error and drop counters for every network interface."""
+    return {nic: {
+        "bytes_sent": counters.bytes_sent,
+        "bytes_received": counters.bytes_recv,
+        "packets_sent": counters.packets_sent,
+        "packets_received": counters.packets_recv,
+        "errors_in": counters.errin,
+        "errors_out": counters.errout,
+        "drops_in": counters.dropin,
+        "drops_out": counters.dropout
+    } for nic, counters in psutil.net_io_counters(pernic=True).items()}
+
+
+def disk_io() -> Dict[str, Dict]:
+    """Return read and write counters for every block device."""
+    return {disk: {
+        "read_bytes": counters.read_bytes,
+        "write_bytes": counters.write_bytes,
+        "read_count": counters.read_count,
+        "write_count": counters.write_count,
+        "read_time_ms": counters.read_time,
+        "write_time_ms": counters.write_time
+    } for disk, counters in (psutil.disk_io_counters(perdisk=True) or {}).items()}
+
+
+def container_networks(stats: Dict) -> Dict[str, Dict]:
+    """Return transmit and receive bytes for every network of a container."""
+    return {nic: {"bytes_sent": counters.get("tx_bytes", 0), "bytes_received": counters.get("rx_bytes", 0)}
+            for nic, counters in (stats.get("networks") or {}).items()}
+
+
+def container_blkio(stats: Dict) -> Dict[str, int]:
+    """Return bytes and operations a container read and wrote, summed over devices."""
+    blkio = stats.get("blkio_stats") or {}
+    totals = {"disk_read_bytes": 0, "disk_write_bytes": 0, "disk_read_count": 0, "disk_write_count": 0}
+    for key, prefix in (("io_service_bytes_recursive", "bytes"), ("io_serviced_recursive", "count")):
+        for entry in blkio.get(key) or []:
+            op = entry.get("op", "").lower()
+            if op in ("read", "write"):
+                totals[f"disk_{op}_{prefix}"] += entry.get("value", 0)
+    return totals
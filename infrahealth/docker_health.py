@@ -1,36 +1,60 @@
 import docker
-from typing import List, Dict
+import math
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from typing import Iterator, List, Dict, Optional, Tuple
 import logging
 
-logging.basicConfig(
-    filename="infrahealth.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+from .probes import AppProber, default_prober
+from .devices import container_networks, container_blkio
+from .instrumentation import instrumented, instrument_client, recorder, timed
 
 
-def get_docker_health(detailed: bool = False, app_check: bool = False) -> List[Dict]:
+DEFAULT_CONCURRENCY = 16
+DEFAULT_STATS_TIMEOUT = 10.0
+
+
+@instrumented("docker_health")
+def get_docker_health(detailed: bool = False, app_check: bool = False,
+                      concurrency: int = DEFAULT_CONCURRENCY,
+                      timeout: float = DEFAULT_STATS_TIMEOUT,
+                      client: Optional[docker.DockerClient] = None,
+                      inventory=None) -> List[Dict]:
+    """
+    Fetch health metrics for all running Docker containers.
+
+    Stats are collected concurrently because each one-shot ``stats`` call
+    blocks while the daemon takes two samples.
+
+    Args:
+        detailed (bool): If True, include network counters and restart count.
+        app_check (bool): If True, probe each container's health endpoint.
+        concurrency (int): Maximum number of containers queried at once.
+        timeout (float): Seconds to wait for a single container's stats. It
+            is also the request timeout of a client created here.
+        client (DockerClient): Existing client to reuse. If omitted, a client
+            is created from the environment and closed afterwards.
+        inventory (ContainerInventory): Started inventory to take the
+            container list from instead of listing containers on the daemon.
+
+    Returns:
+        List of per-container metric dicts, in the order the daemon lists them.
+
+    Raises:
+        RuntimeError: If the Docker daemon cannot be reached.
+    """
+    if inventory is not None:
+        client = client or inventory.client
+    owns_client = client is None
     try:
-        client = docker.from_env()
-        containers = client.containers.list()
-        health_data = []
-        for container in containers:
-            stats = container.stats(stream=False)
-            data = {
-                "name": container.name,
-                "status": container.status,
-                "cpu_percent": calculate_cpu_percent(stats),
-                "memory_percent": calculate_memory_percent(stats)
-            }
-            if detailed:
-                data.update({
-                    "network_bytes_sent": stats["networks"].get("eth0", {}).get("tx_bytes", 0),
-                    "network_bytes_received": stats["networks"].get("eth0", {}).get("rx_bytes", 0),
-                    "restart_count": container.attrs["RestartCount"]
-                })
-            if app_check:
-                data.update(check_app_health(container))
-            health_data.append(data)
+        workers = max(1, concurrency)
+        if owns_client:
+            client = connect(concurrency=workers, timeout=timeout)
+        containers = inventory.containers() if inventory is not None else client.containers.list()
+        health_data = collect_container_health(
+            containers, detailed=detailed, app_check=app_check,
+            concurrency=workers, timeout=timeout)
         logging.info("Fetched Docker health: %s", health_data)
         return health_data
     except docker.errors.DockerException as e:
@@ -38,21 +62,179 @@ def get_docker_health(detailed: bool = False, app_check: bool = False) -> List[D
         raise RuntimeError(
             f"Failed to fetch Docker health: {str(e)}. Ensure Docker is running and you have permissions.")
     finally:
-        if 'client' in locals():
+        if owns_client and client is not None:
+            client.close()
+
+
+@instrumented("docker_health")
+def stream_docker_health(detailed: bool = False, app_check: bool = False,
+                         concurrency: int = DEFAULT_CONCURRENCY,
+                         timeout: float = DEFAULT_STATS_TIMEOUT,
+                         client: Optional[docker.DockerClient] = None) -> Iterator[Dict]:
+    """
+    Yield each container's health metrics as soon as they are collected.
+
+    Takes the same arguments as ``get_docker_health``, but nothing is
+    buffered: a slow container does not hold back the ones after it, and
+    records arrive in the order their stats complete.
+
+    Raises:
+        RuntimeError: If the Docker daemon cannot be reached.
+    """
+    owns_client = client is None
+    try:
+        workers = max(1, concurrency)
+        if owns_client:
+            client = connect(concurrency=workers, timeout=timeout)
+        containers = client.containers.list()
+        yield from iter_container_health(containers, detailed=detailed, app_check=app_check,
+                                         concurrency=workers, timeout=timeout)
+    except docker.errors.DockerException as e:
+        logging.error("Failed to fetch Docker health: %s", str(e))
+        raise RuntimeError(
+            f"Failed to fetch Docker health: {str(e)}. Ensure Docker is running and you have permissions.")
+    finally:
+        if owns_client and client is not None:
             client.close()
 
 
-def check_app_health(container: docker.models.containers.Container) -> Dict:
-    """Check application health via HTTP endpoint."""
+def connect(concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_STATS_TIMEOUT) -> docker.DockerClient:
+    """
+    Create a Docker client from the environment.
+
+    Args:
+        concurrency (int): Number of parallel requests the client's
+            connection pool should hold.
+        timeout (float): Seconds before a request to the daemon is abandoned.
+            The event stream is not subject to it.
+
+    Raises:
+        RuntimeError: If the Docker daemon cannot be reached.
+    """
     try:
-        # Example: Check if container exposes a health endpoint
-        exec_result = container.exec_run(
-            "curl --fail http://localhost/health || exit 1")
-        return {"app_health": "healthy" if exec_result.exit_code == 0 else "unhealthy"}
-    except docker.errors.APIError as e:
-        logging.error("Failed to check app health for %s: %s",
-                      container.name, str(e))
-        return {"app_health": "unhealthy"}
+        return instrument_client(docker.from_env(max_pool_size=max(1, concurrency), timeout=timeout))
+    except docker.errors.DockerException as e:
+        logging.error("Failed to connect to Docker: %s", str(e))
+        raise RuntimeError(
+            f"Failed to fetch Docker health: {str(e)}. Ensure Docker is running and you have permissions.")
+
+
+def collect_container_health(containers: List, detailed: bool = False, app_check: bool = False,
+                             concurrency: int = DEFAULT_CONCURRENCY,
+                             timeout: float = DEFAULT_STATS_TIMEOUT,
+                             executor: Optional[ThreadPoolExecutor] = None,
+                             deadline: Optional[float] = None) -> List[Dict]:
+    """
+    Collect metrics for the given containers on a bounded thread pool.
+
+    Containers whose stats fail or do not arrive within ``timeout`` seconds
+    are logged and left out of the result. The timeout of each stats call
+    is enforced by the client's request timeout; results are waited for
+    until every wave of ``concurrency`` containers has had ``timeout``
+    seconds, so containers queued behind slow ones keep their share.
+
+    Args:
+        executor: Shared pool to run stats calls on instead of a private one
+            sized by ``concurrency``. It is left running afterwards.
+        deadline: ``time.monotonic()`` value after which no more results
+            are waited for.
+
+    Returns:
+        List of per-container metric dicts, in the order of ``containers``.
+    """
+    results = dict(_completed_health(containers, detailed, app_check, concurrency, timeout, executor, deadline))
+    return [results[index] for index in sorted(results)]
+
+
+def iter_container_health(containers: List, detailed: bool = False, app_check: bool = False,
+                          concurrency: int = DEFAULT_CONCURRENCY,
+                          timeout: float = DEFAULT_STATS_TIMEOUT) -> Iterator[Dict]:
+    """
+    Collect metrics for the given containers, yielding them in completion order.
+
+    Containers are skipped under the same rules as ``collect_container_health``.
+    """
+    for _, data in _completed_health(containers, detailed, app_check, concurrency, timeout):
+        yield data
+
+
+def _completed_health(containers: List, detailed: bool, app_check: bool, concurrency: int, timeout: float,
+                      executor: Optional[ThreadPoolExecutor] = None,
+                      deadline: Optional[float] = None) -> Iterator[Tuple[int, Dict]]:
+    """Yield ``(position, metrics)`` for each container as its stats complete."""
+    if not containers:
+        return
+    workers = max(1, min(concurrency, len(containers)))
+    owns_executor = executor is None
+    if owns_executor:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {executor.submit(_container_health, container, detailed, app_check): index
+               for index, container in enumerate(containers)}
+    limit = time.monotonic() + timeout * math.ceil(len(containers) / workers)
+    if deadline is not None:
+        limit = min(limit, deadline)
+    try:
+        for future in as_completed(futures, timeout=max(0.0, limit - time.monotonic())):
+            index = futures[future]
+            try:
+                yield index, future.result()
+            except (docker.errors.DockerException, requests.RequestException, KeyError) as e:
+                logging.error("Failed to fetch stats for %s: %s", containers[index].name, str(e))
+    except FutureTimeoutError:
+        for future, index in futures.items():
+            if not future.done():
+                recorder.error("container_stats")
+                logging.error("Timed out fetching stats for %s", containers[index].name)
+    finally:
+        # Also reached when the consumer stops early: drop queued calls and
+        # do not wait for stuck ones.
+        for future in futures:
+            future.cancel()
+        if owns_executor:
+            executor.shutdown(wait=False)
+
+
+def _container_health(container: docker.models.containers.Container,
+                      detailed: bool, app_check: bool) -> Dict:
+    """Build the metrics dict for a single container."""
+    with timed("container_stats", container.name):
+        stats = container.stats(stream=False)
+    data = {
+        "name": container.name,
+        "status": container.status,
+        "cpu_percent": calculate_cpu_percent(stats),
+        "memory_percent": calculate_memory_percent(stats)
+    }
+    if detailed:
+        data.update(container_network_totals(stats))
+        data.update(container_blkio(stats))
+        data["restart_count"] = container.attrs["RestartCount"]
+    if app_check:
+        data.update(check_app_health(container))
+    return data
+
+
+def check_app_health(container: docker.models.containers.Container,
+                     prober: Optional[AppProber] = None) -> Dict:
+    """
+    Check application health via the container's health endpoint.
+
+    Args:
+        container: Container to probe.
+        prober (AppProber): Prober to use. Defaults to a process-wide prober,
+            so repeated checks within its TTL reuse the cached result.
+    """
+    return (prober or default_prober()).probe(container)
+
+
+def container_network_totals(stats: Dict) -> Dict:
+    """Return traffic summed over all of a container's networks, plus each network's counters."""
+    networks = container_networks(stats)
+    return {
+        "network_bytes_sent": sum(nic["bytes_sent"] for nic in networks.values()),
+        "network_bytes_received": sum(nic["bytes_received"] for nic in networks.values()),
+        "networks": networks
+    }
 
 
 def calculate_cpu_percent(stats: Dict) -> float:
@@ -70,7 +252,25 @@ def calculate_cpu_percent(stats: Dict) -> float:
 def calculate_memory_percent(stats: Dict) -> float:
     """Calculate memory usage percentage from container stats."""
     memory_stats = stats["memory_stats"]
-    used = memory_stats["usage"] - \
-        memory_stats.get("stats", {}).get("cache", 0)
-    limit = memory_stats["limit"]
-    return (used / limit * 100.0) if limit > 0 else 0.0
+    return memory_percent(memory_stats["usage"], memory_stats.get("stats", {}), memory_stats["limit"])
+
+
+def memory_percent(usage: int, stat: Dict, limit: int) -> float:
+    """
+    Return memory in use as a percentage of ``limit``, as ``docker stats`` does.
+
+    Reclaimable page cache is not counted as used: inactive file pages
+    (``inactive_file`` on cgroup v2, ``total_inactive_file`` on v1) are
+    subtracted when reported, and ``cache`` on daemons that report neither.
+
+    Args:
+        usage (int): Memory charged to the cgroup, in bytes.
+        stat (dict): The cgroup's memory statistics.
+        limit (int): Memory limit in bytes.
+    """
+    for key in ("inactive_file", "total_inactive_file", "cache"):
+        if key in stat:
+            if stat[key] < usage:
+                usage -= stat[key]
+            break
+    return (usage / limit * 100.0) if limit > 0 else 0.0
@@ -0,0 +1,165 @@
+import docker
+import threading
+from typing import List, Dict, Optional
+import logging
+
+from .docker_health import calculate_cpu_percent, calculate_memory_percent, connect, container_network_totals
+from .devices import container_blkio
+from .inventory import ContainerInventory
+
+# Connections the client's pool keeps: one per stats stream, plus the event
+# stream and inspect calls. Connections are only opened as needed.
+DEFAULT_MAX_STREAMS = 512
+
+# Seconds before a broken stats stream is reopened, doubling up to the maximum.
+STREAM_RETRY_BASE = 1.0
+STREAM_RETRY_MAX = 30.0
+
+
+class StatsStreamManager:
+    """
+    Keep one streaming stats subscription per running container.
+
+    Each subscription updates an in-memory table with the latest sample, so
+    readers get current metrics without waiting on the daemon. Subscriptions
+    follow the container list of a ``ContainerInventory``, which tracks
+    Docker events and recovers from a broken event stream. A stats stream
+    that breaks is reopened with backoff while its container runs.
+    """
+
+    def __init__(self, client: Optional[docker.DockerClient] = None, detailed: bool = False,
+                 inventory: Optional[ContainerInventory] = None, max_streams: int = DEFAULT_MAX_STREAMS):
+        """
+        Args:
+            client: Client to stream over. If omitted, one is created with a
+                connection pool of ``max_streams``.
+            detailed: If True, include network, block I/O and restart counts.
+            inventory: Started inventory to follow instead of a private one.
+        """
+        self.client = client if client is not None or inventory is None else inventory.client
+        self.detailed = detailed
+        self.inventory = inventory
+        self.max_streams = max_streams
+        self._owns_client = self.client is None
+        self._owns_inventory = inventory is None
+        self._latest: Dict[str, Dict] = {}
+        self._subscriptions: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """
+        Subscribe to all running containers and start following the inventory.
+
+        Raises:
+            RuntimeError: If the Docker daemon cannot be reached.
+        """
+        if self.client is None:
+            # Each stream holds a connection for as long as it runs.
+            self.client = connect(concurrency=self.max_streams)
+        if self.inventory is None:
+            self.inventory = ContainerInventory(self.client)
+            self.inventory.start()
+        self.inventory.add_listener(self._reconcile)
+        self._reconcile()
+        logging.info("Started stats streams for %d containers", len(self._subscriptions))
+
+    def stop(self) -> None:
+        """Stop all subscriptions and release the inventory and client this manager created."""
+        self._stopped.set()
+        if self.inventory is not None:
+            self.inventory.remove_listener(self._reconcile)
+            if self._owns_inventory:
+                self.inventory.stop()
+        with self._lock:
+            for stop_event in self._subscriptions.values():
+                stop_event.set()
+            self._subscriptions.clear()
+            self._latest.clear()
+        if self._owns_client and self.client is not None:
+            self.client.close()
+
+    def snapshot(self) -> List[Dict]:
+        """Return the latest sample of every subscribed container."""
+        with self._lock:
+            return [dict(data) for data in self._latest.values()]
+
+    def _subscribe(self, container: docker.models.containers.Container) -> None:
+        with self._lock:
+            if container.id in self._subscriptions or self._stopped.is_set():
+                return
+            stop_event = threading.Event()
+            self._subscriptions[container.id] = stop_event
+        thread = threading.Thread(
+            target=self._stream, args=(container, stop_event),
+            name=f"infrahealth-stats-{container.name}", daemon=True)
+        thread.start()
+
+    def _unsubscribe(self, container_id: str) -> None:
+        with self._lock:
+            stop_event = self._subscriptions.pop(container_id, None)
+            self._latest.pop(container_id, None)
+        if stop_event is not None:
+            stop_event.set()
+
+    def _stream(self, container: docker.models.containers.Container,
+                stop_event: threading.Event) -> None:
+        backoff = STREAM_RETRY_BASE
+        try:
+            while not stop_event.is_set():
+                try:
+                    for stats in container.stats(stream=True, decode=True):
+                        if stop_event.is_set():
+                            break
+                        data = self._sample(container, stats)
+                        if data is None:
+                            continue
+                        backoff = STREAM_RETRY_BASE
+                        with self._lock:
+                            if not stop_event.is_set():
+                                self._latest[container.id] = data
+                except Exception as e:
+                    if stop_event.is_set():
+                        break
+                    logging.error("Stats stream for %s failed: %s", container.name, str(e))
+                # A container that stopped leaves the inventory, which ends its subscription.
+                if stop_event.is_set() or self.inventory.get(container.id) is None:
+                    break
+                if stop_event.wait(backoff):
+                    break
+                backoff = min(STREAM_RETRY_MAX, backoff * 2)
+        finally:
+            with self._lock:
+                if self._subscriptions.get(container.id) is stop_event:
+                    del self._subscriptions[container.id]
+                    self._latest.pop(container.id, None)
+
+    def _sample(self, container: docker.models.containers.Container, stats: Dict) -> Optional[Dict]:
+        """Convert one streamed stats frame into a metrics dict."""
+        try:
+            data = {
+                "name": container.name,
+                "status": container.status,
+                "cpu_percent": calculate_cpu_percent(stats),
+                "memory_percent": calculate_memory_percent(stats)
+            }
+            if self.detailed:
+                data.update(container_network_totals(stats))
+                data.update(container_blkio(stats))
+                data["restart_count"] = container.attrs.get("RestartCount", 0)
+            return data
+        except KeyError:
+            # The first frame of a stream has no previous CPU sample.
+            return None
+
+    def _reconcile(self) -> None:
+        """Subscribe to every container in the inventory and drop subscriptions to the rest."""
+        if self._stopped.is_set():
+            return
+        running = {container.id: container for container in self.inventory.containers()}
+        with self._lock:
+            gone = [container_id for container_id in self._subscriptions if container_id not in running]
+        for container_id in gone:
+            self._unsubscribe(container_id)
+        for container in running.values():
+            self._subscribe(container)
@@ -0,0 +1,144 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+import logging
+
+import docker
+
+from .docker_health import collect_container_health, DEFAULT_CONCURRENCY, DEFAULT_STATS_TIMEOUT
+from .instrumentation import instrument_client
+
+DEFAULT_HOST_TIMEOUT = 30.0
+
+HOST_SCHEMES = ("tcp://", "unix://")
+
+
+def read_hosts(path: str) -> List[str]:
+    """
+    Read Docker host URLs from a file, one per line.
+
+    Blank lines and lines starting with ``#`` are ignored.
+
+    Raises:
+        ValueError: If a line is not a ``tcp://`` or ``unix://`` URL.
+    """
+    hosts = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            host = line.strip()
+            if not host or host.startswith("#"):
+                continue
+            if not host.startswith(HOST_SCHEMES):
+                raise ValueError(f"{path}:{number}: expected a tcp:// or unix:// URL, got {host!r}")
+            if host not in hosts:
+                hosts.append(host)
+    return hosts
+
+
+class Fleet:
+    """
+    Check the containers of many Docker hosts in parallel.
+
+    Each host gets its own client with a connection pool that is reused
+    across checks, whose requests time out after the per-container stats
+    ``timeout``; ``host_timeout`` bounds a whole host. Container stats calls from all hosts share one thread
+    pool, so ``concurrency`` caps the requests in flight across the whole
+    fleet. A host that fails or overruns ``host_timeout``, counted from
+    when its check starts rather than while it waits for a worker, is
+    reported as an error without holding up the others.
+    """
+
+    def __init__(self, hosts: List[str], concurrency: int = DEFAULT_CONCURRENCY,
+                 host_timeout: float = DEFAULT_HOST_TIMEOUT):
+        self.hosts = list(hosts)
+        self.concurrency = max(1, concurrency)
+        self.host_timeout = host_timeout
+        self._clients: Dict[str, docker.DockerClient] = {}
+        self._stats_pool = ThreadPoolExecutor(max_workers=self.concurrency,
+                                              thread_name_prefix="infrahealth-stats")
+        self._host_pool = ThreadPoolExecutor(max_workers=max(1, min(len(self.hosts), self.concurrency)),
+                                             thread_name_prefix="infrahealth-hosts")
+
+    def close(self) -> None:
+        """Close every host client and stop the worker pools."""
+        self._host_pool.shutdown(wait=False)
+        self._stats_pool.shutdown(wait=False)
+        for client in self._clients.values():
+            client.close()
+        self._clients.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def check(self, detailed: bool = False, app_check: bool = False,
+              timeout: float = DEFAULT_STATS_TIMEOUT) -> Iterator[Dict]:
+        """
+        Check every host, yielding each host's result as soon as it is ready.
+
+        Args:
+            detailed (bool): If True, include network counters and restart count.
+            app_check (bool): If True, probe each container's health endpoint.
+            timeout (float): Seconds to wait for a single container's stats,
+                and the timeout of each request to a host.
+
+        Yields:
+            Dicts with ``host``, ``containers`` (list of container health
+            dicts), ``error`` (None on success) and ``duration`` in seconds.
+        """
+        started: Dict[str, float] = {}
+
+        def check_host(host):
+            started[host] = time.monotonic()
+            return self._check_host(host, detailed, app_check, timeout)
+        futures = {self._host_pool.submit(check_host, host): host for host in self.hosts}
+        # Hosts get a little slack past their own deadline to report back.
+        limit = self.host_timeout + timeout
+        pending = set(futures)
+        try:
+            while pending:
+                deadlines = [started[futures[future]] + limit for future in pending if futures[future] in started]
+                wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else limit
+                done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    yield future.result()
+                now = time.monotonic()
+                for future in [f for f in pending if futures[f] in started and now >= started[futures[f]] + limit]:
+                    pending.discard(future)
+                    host = futures[future]
+                    logging.error("Timed out checking %s after %.1fs", host, self.host_timeout)
+                    yield _result(host, error=f"Timed out after {self.host_timeout:.1f}s",
+                                  duration=self.host_timeout)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _client(self, host: str, timeout: float) -> docker.DockerClient:
+        client = self._clients.get(host)
+        if client is None:
+            client = self._clients[host] = instrument_client(docker.DockerClient(
+                base_url=host, timeout=timeout, max_pool_size=self.concurrency))
+        # Clients are reused across checks, which may ask for another timeout.
+        client.api.timeout = timeout
+        return client
+
+    def _check_host(self, host: str, detailed: bool, app_check: bool, timeout: float) -> Dict:
+        start = time.monotonic()
+        try:
+            containers = self._client(host, timeout).containers.list()
+            health = collect_container_health(
+                containers, detailed=detailed, app_check=app_check, timeout=timeout,
+                executor=self._stats_pool, deadline=start + self.host_timeout)
+            logging.info("Fetched Docker health for %s: %d containers", host, len(health))
+            return _result(host, containers=health, duration=time.monotonic() - start)
+        except Exception as e:
+            logging.error("Failed to fetch Docker health for %s: %s", host, str(e))
+            return _result(host, error=str(e), duration=time.monotonic() - start)
+
+
+def _result(host: str, containers: Optional[List[Dict]] = None, error: Optional[str] = None,
+            duration: float = 0.0) -> Dict:
+    return {"host": host, "containers": containers or [], "error": error, "duration": duration}
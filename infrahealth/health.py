@@ -1,22 +1,96 @@
 import psutil
 import time
 import platform
-from typing import Dict
+import threading
+from typing import Dict, List, Optional
 import logging
 
-logging.basicConfig(
-    filename="infrahealth.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+from .devices import FilesystemCollector, network_interfaces, disk_io
+from .instrumentation import instrumented
 
+# CPU modes reported individually in detailed output.
+CPU_MODES = ("user", "system", "iowait", "steal")
 
-def get_server_health(detailed: bool = False) -> Dict[str, float]:
+# Shortest window a first, one-shot CPU sample waits for.
+MIN_SAMPLE_INTERVAL = 0.1
+
+
+class CpuSampler:
+    """
+    Compute CPU usage from deltas between successive ``cpu_times`` snapshots.
+
+    Only the first sample blocks, for ``min_interval`` seconds. Later samples
+    measure the time elapsed since the previous call, so long-running callers
+    such as the exporter never sleep to measure CPU.
+    """
+
+    def __init__(self, min_interval: float = MIN_SAMPLE_INTERVAL):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_total = None
+        self._last_percpu = None
+        self._last_result: Optional[Dict] = None
+
+    def sample(self) -> Dict:
+        """
+        Return CPU usage since the previous sample.
+
+        Returns:
+            Dict with ``cpu_percent`` (overall busy percentage), ``per_cpu``
+            (busy percentage per logical CPU) and ``modes`` (percentage of
+            time spent in each of ``CPU_MODES``).
+        """
+        with self._lock:
+            if self._last_total is None:
+                self._last_total = psutil.cpu_times()
+                self._last_percpu = psutil.cpu_times(percpu=True)
+                time.sleep(self.min_interval)
+            total = psutil.cpu_times()
+            percpu = psutil.cpu_times(percpu=True)
+            busy, modes = _cpu_percentages(self._last_total, total)
+            if busy is None:
+                # No clock tick elapsed since the last call; reuse its result.
+                if self._last_result is not None:
+                    return self._last_result
+                busy, modes = 0.0, {mode: 0.0 for mode in CPU_MODES}
+            per_cpu = [_cpu_percentages(before, after)[0] or 0.0
+                       for before, after in zip(self._last_percpu, percpu)]
+            self._last_total, self._last_percpu = total, percpu
+            self._last_result = {"cpu_percent": busy, "per_cpu": per_cpu, "modes": modes}
+            return self._last_result
+
+
+def _cpu_percentages(before, after):
+    """Return busy and per-mode percentages between two ``cpu_times`` snapshots."""
+    deltas = {field: max(0.0, getattr(after, field) - getattr(before, field))
+              for field in after._fields}
+    # Guest time is already accounted for in user and nice time.
+    total = sum(delta for field, delta in deltas.items()
+                if field not in ("guest", "guest_nice"))
+    if total <= 0:
+        return None, None
+    idle = deltas.get("idle", 0.0) + deltas.get("iowait", 0.0)
+    busy = round((total - idle) / total * 100.0, 1)
+    modes = {mode: round(deltas.get(mode, 0.0) / total * 100.0, 1) for mode in CPU_MODES}
+    return busy, modes
+
+
+_default_cpu_sampler = CpuSampler()
+_default_filesystems = FilesystemCollector()
+
+
+@instrumented("server_health")
+def get_server_health(detailed: bool = False, cpu_sampler: Optional[CpuSampler] = None,
+                      devices: bool = False) -> Dict[str, float]:
     """
     Fetch server health metrics for the local system.
 
     Args:
         detailed (bool): If True, include additional metrics (network, uptime, processes, load).
+        cpu_sampler (CpuSampler): Sampler to measure CPU with. Defaults to a
+            process-wide sampler, so repeated calls never block.
+        devices (bool): If True, include every mounted filesystem (with
+            inodes), per-interface network counters and per-disk I/O counters.
 
     Returns:
         Dict containing system metrics (percentages, counts, or times).
@@ -25,14 +99,20 @@ def get_server_health(detailed: bool = False) -> Dict[str, float]:
         RuntimeError: If fetching metrics fails (e.g., permission denied).
     """
     try:
+        cpu = (cpu_sampler or _default_cpu_sampler).sample()
+
         # Basic metrics
         health = {
-            "cpu_percent": psutil.cpu_percent(interval=1),
+            "cpu_percent": cpu["cpu_percent"],
             "memory_percent": psutil.virtual_memory().percent,
             "disk_percent": psutil.disk_usage("/").percent
         }
 
         if detailed:
+            # CPU time by mode
+            for mode in CPU_MODES:
+                health[f"cpu_{mode}_percent"] = cpu["modes"][mode]
+
             # Network metrics
             net = psutil.net_io_counters()
             health["network_bytes_sent"] = net.bytes_sent
@@ -51,6 +131,11 @@ def get_server_health(detailed: bool = False) -> Dict[str, float]:
                 health["load_avg_5min"] = load5
                 health["load_avg_15min"] = load15
 
+        if devices:
+            health["filesystems"] = _default_filesystems.sample()
+            health["network_interfaces"] = network_interfaces()
+            health["disk_io"] = disk_io()
+
         logging.info("Fetched server health: %s", health)
         return health
     except PermissionError as e:
@@ -0,0 +1,422 @@
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple, Union
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no locking between processes.
+    fcntl = None
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".infrahealth", "history.bin")
+DEFAULT_BUDGET_BYTES = 64 * 1024 * 1024
+
+MAGIC = b"IHHIST01"
+VERSION = 1
+
+# Tier name, bucket width in seconds (0 = raw samples) and share of the disk budget.
+TIERS = (("raw", 0, 0.6), ("1m", 60, 0.3), ("1h", 3600, 0.1))
+
+# magic, version, reserved, then capacity, head and count for each tier.
+HEADER = struct.Struct("<8sII" + "Q" * 3 * len(TIERS))
+HEADER_SIZE = 128
+
+# Every tier uses the same fixed-width record: bucket start, series id,
+# sample count, min, max and sum. A raw record has a count of 1.
+RECORD = struct.Struct("<dIIddd")
+
+# Records unpacked per read while scanning a range.
+SCAN_CHUNK = 4096
+
+# Series held before ids no longer referenced by any ring are reclaimed.
+# After a sweep the limit becomes twice the live series, so the sidecar
+# stays proportional to what the rings hold however many containers come
+# and go, and sweeps stay rare.
+MIN_SERIES_SWEEP = 1024
+
+
+class HistoryStore:
+    """
+    Fixed-size on-disk history of health samples.
+
+    The file is memory-mapped and split into one ring buffer per tier. Raw
+    samples go to the first ring and are rolled up into 1-minute and 1-hour
+    buckets as they are appended, so once the raw ring wraps, older ranges
+    are still answered at a coarser resolution. The file never grows past
+    its budget. Series names live in a small sidecar JSON file; ids of
+    series whose records have all been overwritten, such as removed
+    containers, are reused.
+
+    Several processes may record into the same file, such as a cron check
+    while a watch is recording. Appends hold an exclusive ``flock`` on the
+    file and reads a shared one, and both re-read the header and, if it
+    changed, the sidecar once the lock is held.
+    """
+
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH, budget_bytes: int = DEFAULT_BUDGET_BYTES,
+                 readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        self._series_path = path + ".series"
+        self._series: List[List[str]] = []
+        self._series_ids: Dict[tuple, int] = {}
+        self._free_ids: List[int] = []
+        self._sweep_at = MIN_SERIES_SWEEP
+        self._open_buckets: List[Dict[int, int]] = [{} for _ in TIERS]
+        self._series_stamp = None
+        self._buckets_changed = False
+        if not os.path.exists(path):
+            if readonly:
+                raise RuntimeError(f"No history recorded at {path}")
+            self._create(budget_bytes)
+        self._file = open(path, "rb" if readonly else "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0,
+                              access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE)
+        fields = HEADER.unpack_from(self._map, 0)
+        if fields[0] != MAGIC or fields[1] != VERSION:
+            self._map.close()
+            self._file.close()
+            self._map = None
+            raise RuntimeError(f"{path} is not an infrahealth history file")
+        n = len(TIERS)
+        self.capacities = list(fields[3:3 + n])
+        self._offsets = []
+        offset = HEADER_SIZE
+        for capacity in self.capacities:
+            self._offsets.append(offset)
+            offset += capacity * RECORD.size
+        with self._locked(exclusive=False):
+            self._refresh()
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """Pick up appends made through other handles. Call with the lock held."""
+        n = len(TIERS)
+        fields = HEADER.unpack_from(self._map, 0)
+        self._heads = list(fields[3 + n:3 + 2 * n])
+        self._counts = list(fields[3 + 2 * n:3 + 3 * n])
+        if self._stamp() != self._series_stamp:
+            self._load_series()
+
+    def _stamp(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self._series_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _create(self, budget_bytes: int) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        usable = max(0, budget_bytes - HEADER_SIZE)
+        capacities = [max(1, int(usable * share) // RECORD.size) for _, _, share in TIERS]
+        size = HEADER_SIZE + sum(capacities) * RECORD.size
+        with open(self.path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, *capacities, *([0] * 2 * len(TIERS))))
+            f.truncate(size)
+        logging.info("Created history store %s (%d bytes)", self.path, size)
+
+    def _load_series(self) -> None:
+        self._series_stamp = self._stamp()
+        if self._series_stamp is None:
+            return
+        with open(self._series_path) as f:
+            state = json.load(f)
+        self._series = state.get("series", [])
+        self._series_ids = {tuple(key): i for i, key in enumerate(self._series) if key is not None}
+        # Freed ids are stored as null; pop() hands out the lowest first.
+        self._free_ids = [i for i in reversed(range(len(self._series))) if self._series[i] is None]
+        self._sweep_at = max(MIN_SERIES_SWEEP, 2 * len(self._series_ids))
+        for tier, buckets in enumerate(state.get("open_buckets", [])):
+            self._open_buckets[tier] = {int(sid): slot for sid, slot in buckets.items()}
+
+    def _save_series(self) -> None:
+        tmp_path = self._series_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"series": self._series,
+                       "open_buckets": [{str(k): v for k, v in b.items()} for b in self._open_buckets]}, f)
+        os.replace(tmp_path, self._series_path)
+        self._series_stamp = self._stamp()
+
+    def close(self) -> None:
+        """Flush pending writes and close the file."""
+        if getattr(self, "_map", None) is None:
+            return
+        if not self.readonly:
+            # The header and sidecar are written by every append.
+            self._map.flush()
+        self._map.close()
+        self._file.close()
+        self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, sample: Union[Dict, List[Dict]], timestamp: Optional[float] = None) -> int:
+        """
+        Append one server sample or a list of container samples.
+
+        Numeric fields become series keyed by metric and container name (an
+        empty name for server samples). The timestamp defaults to the time
+        the file lock is acquired, and one earlier than the newest stored
+        sample, e.g. from another writer or a clock step, is raised to it so
+        the rings stay in time order.
+
+        Returns:
+            Number of points written.
+        """
+        if self.readonly:
+            raise RuntimeError("History store is open read-only")
+        records = sample if isinstance(sample, list) else [sample]
+        with self._locked(exclusive=True):
+            self._refresh()
+            timestamp = time.time() if timestamp is None else timestamp
+            if self._counts[0]:
+                timestamp = max(timestamp, self._timestamp(0, self._counts[0] - 1))
+            return self._append(records, isinstance(sample, list), timestamp)
+
+    def _append(self, records: List[Dict], containers: bool, timestamp: float) -> int:
+        new_series = False
+        self._buckets_changed = False
+        written = 0
+        for record in records:
+            container = record.get("name", "") if containers else ""
+            for metric, value in record.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                key = (container, metric)
+                sid = self._series_ids.get(key)
+                if sid is None:
+                    sid = self._series_ids[key] = self._new_series_id()
+                    self._series[sid] = [container, metric]
+                    new_series = True
+                self._add_point(sid, timestamp, float(value))
+                written += 1
+        self._write_header()
+        if new_series or self._buckets_changed:
+            self._save_series()
+        return written
+
+    def _new_series_id(self) -> int:
+        if not self._free_ids and len(self._series) >= self._sweep_at:
+            self._sweep_series()
+        if self._free_ids:
+            return self._free_ids.pop()
+        self._series.append(None)
+        return len(self._series) - 1
+
+    def _sweep_series(self) -> None:
+        """Free the ids of series with no record left in any ring."""
+        live = set()
+        for tier in range(len(TIERS)):
+            live.update(sid for _, sid, _, _, _, _ in self._scan(tier, 0, self._counts[tier]))
+        for sid, key in enumerate(self._series):
+            if key is not None and sid not in live:
+                del self._series_ids[tuple(key)]
+                self._series[sid] = None
+        for buckets in self._open_buckets:
+            for sid in [sid for sid in buckets if sid not in live]:
+                del buckets[sid]
+        self._free_ids = [sid for sid in reversed(range(len(self._series))) if self._series[sid] is None]
+        self._sweep_at = max(MIN_SERIES_SWEEP, 2 * len(self._series_ids))
+        logging.info("Reclaimed %d history series ids", len(self._free_ids))
+
+    def _add_point(self, sid: int, timestamp: float, value: float) -> None:
+        self._write_record(0, (timestamp, sid, 1, value, value, value))
+        for tier in range(1, len(TIERS)):
+            width = TIERS[tier][1]
+            bucket = math.floor(timestamp / width) * width
+            slot = self._open_buckets[tier].get(sid)
+            if slot is not None:
+                position = self._offsets[tier] + slot * RECORD.size
+                start, rec_sid, count, lo, hi, total = RECORD.unpack_from(self._map, position)
+                # The slot may have been reused after the ring wrapped.
+                if start == bucket and rec_sid == sid:
+                    RECORD.pack_into(self._map, position, start, sid, count + 1,
+                                     min(lo, value), max(hi, value), total + value)
+                    continue
+            self._open_buckets[tier][sid] = self._write_record(
+                tier, (bucket, sid, 1, value, value, value))
+            self._buckets_changed = True
+
+    def _write_record(self, tier: int, record: tuple) -> int:
+        slot = self._heads[tier]
+        RECORD.pack_into(self._map, self._offsets[tier] + slot * RECORD.size, *record)
+        self._heads[tier] = (slot + 1) % self.capacities[tier]
+        self._counts[tier] = min(self._counts[tier] + 1, self.capacities[tier])
+        return slot
+
+    def _write_header(self) -> None:
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, 0,
+                         *self.capacities, *self._heads, *self._counts)
+
+    def _slot(self, tier: int, index: int) -> int:
+        """Map a logical index (0 = oldest record) to a ring slot."""
+        return (self._heads[tier] - self._counts[tier] + index) % self.capacities[tier]
+
+    def _timestamp(self, tier: int, index: int) -> float:
+        return struct.unpack_from("<d", self._map,
+                                  self._offsets[tier] + self._slot(tier, index) * RECORD.size)[0]
+
+    def _bisect(self, tier: int, timestamp: float, right: bool = False) -> int:
+        """Return the first logical index whose timestamp is >= ``timestamp`` (> if ``right``)."""
+        lo, hi = 0, self._counts[tier]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            ts = self._timestamp(tier, mid)
+            if ts < timestamp or (right and ts == timestamp):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _choose_tier(self, start: float) -> int:
+        """Pick the finest tier that still holds everything from ``start`` on."""
+        for tier in range(len(TIERS)):
+            wrapped = self._counts[tier] == self.capacities[tier]
+            if self._counts[tier] and (not wrapped or self._timestamp(tier, 0) <= start):
+                return tier
+        # No tier reaches back that far; the coarsest keeps the longest span.
+        return len(TIERS) - 1
+
+    def _scan(self, tier: int, first: int, last: int):
+        """Yield records with logical indexes in [first, last), reading in chunks."""
+        capacity = self.capacities[tier]
+        index = first
+        while index < last:
+            slot = self._slot(tier, index)
+            n = min(SCAN_CHUNK, last - index, capacity - slot)
+            begin = self._offsets[tier] + slot * RECORD.size
+            yield from RECORD.iter_unpack(self._map[begin:begin + n * RECORD.size])
+            index += n
+
+    def query(self, start: float, end: Optional[float] = None, metric: Optional[str] = None,
+              container: Optional[str] = None) -> List[Dict]:
+        """
+        Summarize each series between ``start`` and ``end``.
+
+        Only the records inside the range are read. Ranges older than the raw
+        ring are answered from the rolled-up tiers; there, p95 is estimated
+        from bucket means.
+
+        Args:
+            start: Range start as a Unix timestamp.
+            end: Range end as a Unix timestamp. Defaults to now.
+            metric: Only include this metric.
+            container: Only include this container ("" for server metrics).
+
+        Returns:
+            List of dicts with container, metric, min, max, avg, p95, count
+            and the tier the answer was read from.
+        """
+        with self._locked(exclusive=False):
+            self._refresh()
+            wanted = self._wanted(metric, container)
+            if not wanted:
+                return []
+            tier, first, last = self._range(start, end)
+            summaries: Dict[int, List] = {}
+            for timestamp, sid, count, lo, hi, total in self._scan(tier, first, last):
+                if sid not in wanted:
+                    continue
+                summary = summaries.get(sid)
+                if summary is None:
+                    summary = summaries[sid] = [lo, hi, 0.0, 0, []]
+                summary[0] = min(summary[0], lo)
+                summary[1] = max(summary[1], hi)
+                summary[2] += total
+                summary[3] += count
+                summary[4].append(total / count)
+        results = []
+        for sid, (lo, hi, total, count, values) in sorted(summaries.items()):
+            name, series_metric = self._series[sid]
+            results.append({
+                "container": name,
+                "metric": series_metric,
+                "min": lo,
+                "max": hi,
+                "avg": total / count,
+                "p95": _percentile(values, 95),
+                "count": count,
+                "tier": TIERS[tier][0]
+            })
+        return results
+
+    def points(self, start: float, end: Optional[float] = None, metric: Optional[str] = None,
+               container: Optional[str] = None) -> Dict[Tuple[str, str], Tuple[List[float], List[float]]]:
+        """
+        Return each series' points between ``start`` and ``end``, oldest first.
+
+        Ranges older than the raw ring are read from the rolled-up tiers,
+        where each point is a bucket's start and mean.
+
+        Returns:
+            ``(timestamps, values)`` keyed by ``(container, metric)``.
+        """
+        with self._locked(exclusive=False):
+            self._refresh()
+            wanted = self._wanted(metric, container)
+            if not wanted:
+                return {}
+            tier, first, last = self._range(start, end)
+            points: Dict[int, Tuple[List[float], List[float]]] = {}
+            for timestamp, sid, count, lo, hi, total in self._scan(tier, first, last):
+                if sid not in wanted:
+                    continue
+                series = points.get(sid)
+                if series is None:
+                    series = points[sid] = ([], [])
+                series[0].append(timestamp)
+                series[1].append(total / count)
+        return {tuple(self._series[sid]): series for sid, series in sorted(points.items())}
+
+    def _wanted(self, metric: Optional[str], container: Optional[str]) -> set:
+        return {sid for sid, key in enumerate(self._series)
+                if key is not None and (metric is None or key[1] == metric)
+                and (container is None or key[0] == container)}
+
+    def _range(self, start: float, end: Optional[float]) -> Tuple[int, int, int]:
+        end = time.time() if end is None else end
+        tier = self._choose_tier(start)
+        return tier, self._bisect(tier, start), self._bisect(tier, end, right=True)
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    """Return the nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percentile / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def parse_duration(text: str) -> float:
+    """
+    Parse a duration such as ``90``, ``15m``, ``2h`` or ``7d`` into seconds.
+
+    Raises:
+        ValueError: If the text is not a valid duration.
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*", text)
+    if not match:
+        raise ValueError(f"Invalid duration: {text}")
+    units = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+    return float(match.group(1)) * units[match.group(2)]
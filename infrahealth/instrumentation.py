@@ -0,0 +1,268 @@
+import functools
+import inspect
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Per-container series not updated for this long are dropped, so removed
+# containers do not accumulate.
+CONTAINER_SERIES_TTL = 600.0
+
+# Docker object IDs and names in API paths, e.g. /containers/<id>/stats.
+_API_OBJECT = re.compile(r"/(containers|exec|images|networks|volumes)/(?!json$|create$|prune$)[^/]+")
+_API_OBJECT_TEMPLATE = r"/\1/{id}"
+_API_VERSION = re.compile(r"^/v[\d.]+")
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, plus the largest value seen."""
+
+    __slots__ = ("counts", "count", "sum", "max", "updated_at")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.updated_at = 0.0
+
+    def observe(self, seconds: float, now: float) -> None:
+        index = 0
+        while index < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.updated_at = now
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Return ``(upper bound, cumulative count)`` pairs ending with ``+Inf``."""
+        buckets, total = [], 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), self.counts):
+            total += count
+            buckets.append(("+Inf" if bound == float("inf") else str(bound), total))
+        return buckets
+
+
+class Recorder:
+    """
+    Record how long infrahealth's own collection steps take.
+
+    Each operation (``server_health``, ``container_stats``, ``app_probe``,
+    ``send_alert``...) has a latency histogram and an error count.
+    Operations done per container also keep a histogram per container.
+    Docker API calls are counted per endpoint by clients passed to
+    ``instrument_client``. Nothing is recorded until ``enable`` is called,
+    and while disabled ``timed`` returns a shared no-op context manager.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.enabled = False
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop everything recorded so far."""
+        with self._lock:
+            self._operations: Dict[str, Histogram] = {}
+            self._containers: Dict[Tuple[str, str], Histogram] = {}
+            self._errors: Dict[str, int] = {}
+            self._api_calls: Dict[str, int] = {}
+
+    def observe(self, operation: str, seconds: float, container: Optional[str] = None,
+                error: bool = False) -> None:
+        """Record one timed call of an operation."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            histogram = self._operations.get(operation)
+            if histogram is None:
+                histogram = self._operations[operation] = Histogram()
+            histogram.observe(seconds, now)
+            if container is not None:
+                histogram = self._containers.get((operation, container))
+                if histogram is None:
+                    histogram = self._containers[(operation, container)] = Histogram()
+                histogram.observe(seconds, now)
+            if error:
+                self._errors[operation] = self._errors.get(operation, 0) + 1
+
+    def error(self, operation: str) -> None:
+        """Count a failure that was not timed, such as a timeout waiting for a result."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._errors[operation] = self._errors.get(operation, 0) + 1
+
+    def api_call(self, method: str, path: str) -> None:
+        """Count one Docker API request."""
+        if not self.enabled:
+            return
+        endpoint = f"{method} {_API_OBJECT.sub(_API_OBJECT_TEMPLATE, _API_VERSION.sub('', path))}"
+        with self._lock:
+            self._api_calls[endpoint] = self._api_calls.get(endpoint, 0) + 1
+
+    def snapshot(self) -> Dict:
+        """
+        Return a copy of everything recorded.
+
+        Returns:
+            Dict with ``operations`` and ``containers`` (histograms keyed by
+            operation, and by ``(operation, container)``), ``errors`` and
+            ``docker_api_calls`` (counts), ``resident_memory_bytes`` and
+            ``threads`` of this process.
+        """
+        cutoff = time.monotonic() - CONTAINER_SERIES_TTL
+        with self._lock:
+            self._containers = {key: h for key, h in self._containers.items() if h.updated_at >= cutoff}
+            snapshot = {
+                "operations": {op: _copy(h) for op, h in self._operations.items()},
+                "containers": {key: _copy(h) for key, h in self._containers.items()},
+                "errors": dict(self._errors),
+                "docker_api_calls": dict(self._api_calls),
+            }
+        snapshot["resident_memory_bytes"] = resident_memory_bytes()
+        snapshot["threads"] = threading.active_count()
+        return snapshot
+
+
+class _Timer:
+    __slots__ = ("recorder", "operation", "container", "start")
+
+    def __init__(self, recorder: Recorder, operation: str, container: Optional[str]):
+        self.recorder, self.operation, self.container = recorder, operation, container
+
+    def __enter__(self):
+        self.start = self.recorder._clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.observe(self.operation, self.recorder._clock() - self.start,
+                              container=self.container,
+                              error=exc_type is not None and not issubclass(exc_type, GeneratorExit))
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+def _copy(histogram: Histogram) -> Histogram:
+    copy = Histogram()
+    copy.counts, copy.count, copy.sum = list(histogram.counts), histogram.count, histogram.sum
+    copy.max, copy.updated_at = histogram.max, histogram.updated_at
+    return copy
+
+
+recorder = Recorder()
+
+
+def enable() -> None:
+    """Start recording."""
+    recorder.enabled = True
+
+
+def disable() -> None:
+    """Stop recording; what was recorded is kept until ``recorder.reset()``."""
+    recorder.enabled = False
+
+
+def timed(operation: str, container: Optional[str] = None):
+    """
+    Context manager timing one call of ``operation``.
+
+    A call that raises counts as an error. When recording is disabled this
+    costs one attribute check.
+    """
+    if not recorder.enabled:
+        return _NO_TIMER
+    return _Timer(recorder, operation, container)
+
+
+def instrumented(operation: str):
+    """
+    Decorator timing every call of a function as ``operation``.
+
+    A generator function is timed until it is exhausted or closed, so the
+    time spent producing every item is included.
+    """
+    def decorate(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                if not recorder.enabled:
+                    return (yield from fn(*args, **kwargs))
+                with _Timer(recorder, operation, None):
+                    return (yield from fn(*args, **kwargs))
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not recorder.enabled:
+                return fn(*args, **kwargs)
+            with _Timer(recorder, operation, None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def instrument_client(client):
+    """Count the API requests a Docker client makes. Returns the client."""
+    api = getattr(client, "api", None)
+    hooks = getattr(api, "hooks", None)
+    if isinstance(hooks, dict):
+        hooks.setdefault("response", []).append(_count_response)
+    return client
+
+
+def _count_response(response, *args, **kwargs):
+    if recorder.enabled:
+        request = response.request
+        recorder.api_call(request.method, request.path_url.split("?")[0])
+    return response
+
+
+def resident_memory_bytes() -> int:
+    """Return the resident memory of this process."""
+    import psutil
+    return psutil.Process().memory_info().rss
+
+
+def profile_lines(snapshot: Dict, slowest: int = 5) -> List[str]:
+    """Format a snapshot as a text report for ``--profile``."""
+    output = [f"{'Operation':<20} {'Calls':>7} {'Errors':>7} {'Total ms':>10} {'Mean ms':>9} {'Max ms':>9}"]
+    for operation, histogram in sorted(snapshot["operations"].items()):
+        output.append(f"{operation:<20} {histogram.count:>7} {snapshot['errors'].get(operation, 0):>7} "
+                      f"{histogram.sum * 1000:>10.1f} {histogram.sum / histogram.count * 1000:>9.1f} "
+                      f"{histogram.max * 1000:>9.1f}")
+    for operation, errors in sorted(snapshot["errors"].items()):
+        if operation not in snapshot["operations"]:
+            output.append(f"{operation:<20} {0:>7} {errors:>7}")
+    if snapshot["containers"]:
+        output.append("Slowest containers:")
+        ranked = sorted(snapshot["containers"].items(), key=lambda item: -item[1].max)[:slowest]
+        for (operation, container), histogram in ranked:
+            output.append(f"  {container:<24} {operation:<16} {histogram.max * 1000:>9.1f} ms")
+    if snapshot["docker_api_calls"]:
+        output.append("Docker API calls:")
+        for endpoint, calls in sorted(snapshot["docker_api_calls"].items()):
+            output.append(f"  {endpoint:<40} {calls:>7}")
+    output.append(f"Resident memory: {snapshot['resident_memory_bytes'] / 1048576:.1f} MB, "
+                  f"threads: {snapshot['threads']}")
+    return output
@@ -0,0 +1,187 @@
+import threading
+from typing import Callable, Dict, List, Optional
+import logging
+
+import docker
+
+from .docker_health import connect
+
+DEFAULT_RESYNC_INTERVAL = 300.0
+
+# Seconds before a broken event stream is reopened, doubling while the daemon stays unreachable.
+EVENTS_RETRY_BASE = 1.0
+EVENTS_RETRY_MAX = 30.0
+
+# Container events that change what the inventory holds. A health status
+# event's action carries the new status, e.g. "health_status: healthy".
+INVENTORY_EVENTS = ["start", "die", "destroy", "restart", "rename", "health_status"]
+REMOVE_EVENTS = ("die", "destroy")
+
+
+class ContainerInventory:
+    """
+    In-memory list of running containers kept current from Docker events.
+
+    The container list is loaded once. After that, each relevant event
+    re-inspects or drops just the container it concerns, so names, status
+    and restart counts can be read without calling the daemon. A full
+    resync every ``resync_interval`` seconds catches events missed while
+    the stream was reconnecting. Both keep retrying through any error,
+    such as the connection errors raised while the daemon restarts.
+    Listeners added with ``add_listener`` are called after every change.
+    """
+
+    def __init__(self, client: Optional[docker.DockerClient] = None,
+                 resync_interval: float = DEFAULT_RESYNC_INTERVAL):
+        self.client = client
+        self.resync_interval = resync_interval
+        self._owns_client = client is None
+        self._containers: Dict[str, docker.models.containers.Container] = {}
+        self._lock = threading.Lock()
+        self._events = None
+        self._threads: List[threading.Thread] = []
+        self._listeners: List[Callable[[], None]] = []
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """
+        Load the container list and start following events.
+
+        Raises:
+            RuntimeError: If the Docker daemon cannot be reached.
+        """
+        try:
+            if self.client is None:
+                self.client = connect()
+            # Open the event stream before listing so no change is missed.
+            self._events = self._open_events()
+            self.resync()
+        except docker.errors.DockerException as e:
+            logging.error("Failed to load container inventory: %s", str(e))
+            raise RuntimeError(
+                f"Failed to load container inventory: {str(e)}. Ensure Docker is running and you have permissions.")
+        for target, name in ((self._watch_events, "infrahealth-inventory-events"),
+                             (self._resync_loop, "infrahealth-inventory-resync")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info("Loaded container inventory with %d containers", len(self._containers))
+
+    def stop(self) -> None:
+        """Stop following events and release the Docker client."""
+        self._stopped.set()
+        if self._events is not None:
+            self._events.close()
+        if self._owns_client and self.client is not None:
+            self.client.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def containers(self) -> List[docker.models.containers.Container]:
+        """Return the running containers, in the order they were listed or started."""
+        with self._lock:
+            return list(self._containers.values())
+
+    def get(self, container_id: str) -> Optional[docker.models.containers.Container]:
+        """Return a running container by ID, or None if it is not running."""
+        with self._lock:
+            return self._containers.get(container_id)
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Call ``callback()`` from the inventory's threads whenever the container list may have changed."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[], None]) -> None:
+        """Stop calling a callback added with ``add_listener``."""
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def resync(self) -> None:
+        """Replace the inventory with a fresh listing from the daemon."""
+        listed = self.client.containers.list()
+        with self._lock:
+            self._containers = {container.id: container for container in listed}
+        self._changed()
+
+    def _changed(self) -> None:
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback()
+            except Exception as e:
+                logging.error("Container inventory listener failed: %s", str(e))
+
+    def _open_events(self):
+        return self.client.events(decode=True, filters={"type": "container", "event": INVENTORY_EVENTS})
+
+    def _resync_loop(self) -> None:
+        while not self._stopped.wait(self.resync_interval):
+            try:
+                self.resync()
+            except Exception as e:
+                logging.error("Container inventory resync failed: %s", str(e))
+
+    def _watch_events(self) -> None:
+        backoff = EVENTS_RETRY_BASE
+        while not self._stopped.is_set():
+            try:
+                for event in self._events or ():
+                    if self._stopped.is_set():
+                        return
+                    self._apply(event)
+            except Exception as e:
+                if self._stopped.is_set():
+                    return
+                logging.error("Docker event stream failed: %s", str(e))
+            if self._stopped.wait(backoff):
+                return
+            # The stream ended or broke; reopen it and resync what was missed.
+            try:
+                self._events = self._open_events()
+            except Exception as e:
+                logging.error("Failed to reopen Docker event stream: %s", str(e))
+                # Back off while the daemon stays unreachable.
+                self._events = None
+                backoff = min(EVENTS_RETRY_MAX, backoff * 2)
+                continue
+            backoff = EVENTS_RETRY_BASE
+            try:
+                self.resync()
+            except Exception as e:
+                logging.error("Container inventory resync failed: %s", str(e))
+
+    def _apply(self, event: Dict) -> None:
+        container_id = event.get("id") or event.get("Actor", {}).get("ID")
+        if not container_id:
+            return
+        action = event.get("Action", event.get("status", "")).split(":")[0]
+        if action in REMOVE_EVENTS:
+            with self._lock:
+                self._containers.pop(container_id, None)
+            self._changed()
+            return
+        # start, restart, rename and health_status all change the inspected state.
+        try:
+            container = self.client.containers.get(container_id)
+        except docker.errors.NotFound:
+            with self._lock:
+                self._containers.pop(container_id, None)
+            self._changed()
+            return
+        except Exception as e:
+            logging.error("Failed to inspect %s after %s event: %s", container_id, action, str(e))
+            return
+        with self._lock:
+            if container.status == "running":
+                self._containers[container_id] = container
+            else:
+                self._containers.pop(container_id, None)
+        self._changed()
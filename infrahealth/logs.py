@@ -0,0 +1,22 @@
+import logging
+
+LOG_FILE = "infrahealth.log"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+_configured = False
+
+
+def configure_logging(filename: str = LOG_FILE) -> None:
+    """
+    Send log records to ``filename``, once per process.
+
+    The file is only created when the first record is written, so commands
+    that log nothing leave no file behind.
+    """
+    global _configured
+    if _configured:
+        return
+    handler = logging.FileHandler(filename, delay=True)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+    _configured = True
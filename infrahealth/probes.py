@@ -0,0 +1,203 @@
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import logging
+
+import docker
+import requests
+
+from .instrumentation import recorder
+
+DEFAULT_PROBE_CONCURRENCY = 16
+DEFAULT_PROBE_TIMEOUT = 2.0
+DEFAULT_PROBE_TTL = 15.0
+
+DEFAULT_PROBE_PORT = 80
+DEFAULT_PROBE_PATH = "/health"
+
+# Container labels that override how a container is probed.
+LABEL_KIND = "infrahealth.probe"  # http, tcp or exec
+LABEL_PORT = "infrahealth.probe.port"
+LABEL_PATH = "infrahealth.probe.path"
+
+PROBE_KINDS = ("http", "tcp", "exec")
+
+# Daemon hosts that share the host network with infrahealth.
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+# Cached results held before expired entries are swept out.
+CACHE_PRUNE_SIZE = 4096
+
+
+class AppProber:
+    """
+    Probe container application health from the host.
+
+    Containers are reached on their own IP address, over HTTP through a
+    pooled session or with a plain TCP connect, so no process is started
+    inside the container. ``exec`` (``curl`` inside the container) is only
+    used when a container has no reachable address, runs on a remote
+    daemon whose container addresses are not reachable from here, or asks
+    for it through the ``infrahealth.probe`` label. Results are cached per
+    daemon and endpoint for ``ttl`` seconds, and at most ``concurrency``
+    probes run at once.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_PROBE_CONCURRENCY, timeout: float = DEFAULT_PROBE_TIMEOUT,
+                 ttl: float = DEFAULT_PROBE_TTL):
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.ttl = ttl
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+        self._session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._cache: Dict[Tuple, Tuple[float, Dict]] = {}
+
+    def close(self) -> None:
+        """Close pooled HTTP connections."""
+        self._session.close()
+
+    def probe(self, container: docker.models.containers.Container) -> Dict:
+        """
+        Return the application health of one container.
+
+        Returns:
+            Dict with ``app_health`` (``healthy`` or ``unhealthy``),
+            ``app_latency_ms`` and ``app_probe`` (the probe kind used).
+        """
+        kind, endpoint = probe_target(container)
+        # Container addresses are only unique per daemon.
+        key = (_daemon_url(container), kind, endpoint if kind != "exec" else container.id)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > now:
+                return dict(cached[1])
+        with self._slots:
+            start = time.perf_counter()
+            if kind == "http":
+                healthy = self._probe_http(container, *endpoint)
+            elif kind == "tcp":
+                healthy = self._probe_tcp(container, *endpoint)
+            else:
+                healthy = _probe_exec(container)
+            latency = (time.perf_counter() - start) * 1000.0
+        recorder.observe("app_probe", latency / 1000.0, container=container.name)
+        result = {"app_health": "healthy" if healthy else "unhealthy",
+                  "app_latency_ms": round(latency, 2), "app_probe": kind}
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, result)
+            # Drop expired entries so removed containers do not accumulate.
+            if len(self._cache) > CACHE_PRUNE_SIZE:
+                now = time.monotonic()
+                self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+        return dict(result)
+
+    def probe_many(self, containers: List) -> List[Dict]:
+        """Probe several containers in parallel, returning results in order."""
+        if not containers:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(containers))) as executor:
+            return list(executor.map(self.probe, containers))
+
+    def _probe_http(self, container, address: str, port: int, path: str) -> bool:
+        try:
+            response = self._session.get(f"http://{address}:{port}{path}", timeout=self.timeout,
+                                         allow_redirects=False)
+            response.close()
+            return response.status_code < 400
+        except requests.RequestException as e:
+            logging.error("HTTP health probe for %s failed: %s", container.name, str(e))
+            return False
+
+    def _probe_tcp(self, container, address: str, port: int) -> bool:
+        try:
+            with socket.create_connection((address, port), timeout=self.timeout):
+                return True
+        except OSError as e:
+            logging.error("TCP health probe for %s failed: %s", container.name, str(e))
+            return False
+
+
+def probe_target(container: docker.models.containers.Container) -> Tuple[str, Optional[tuple]]:
+    """
+    Work out how to probe a container from its labels and network settings.
+
+    Returns:
+        The probe kind and its endpoint: ``(address, port, path)`` for http,
+        ``(address, port)`` for tcp and None for exec.
+    """
+    attrs = container.attrs or {}
+    labels = attrs.get("Config", {}).get("Labels") or {}
+    kind = labels.get(LABEL_KIND, "http")
+    if kind not in PROBE_KINDS:
+        logging.error("Unknown probe kind %r for %s; using http", kind, container.name)
+        kind = "http"
+    address = _container_address(attrs)
+    if kind == "exec" or address is None or _is_remote(_daemon_url(container)):
+        return "exec", None
+    port = labels.get(LABEL_PORT) or _exposed_port(attrs)
+    try:
+        port = int(port)
+    except (TypeError, ValueError):
+        logging.error("Invalid probe port %r for %s", port, container.name)
+        port = DEFAULT_PROBE_PORT
+    if kind == "tcp":
+        return kind, (address, port)
+    return kind, (address, port, labels.get(LABEL_PATH, DEFAULT_PROBE_PATH))
+
+
+def _daemon_url(container: docker.models.containers.Container) -> str:
+    """Return the API URL of the daemon a container belongs to, or "" if unknown."""
+    url = getattr(getattr(getattr(container, "client", None), "api", None), "base_url", None)
+    return url if isinstance(url, str) else ""
+
+
+def _is_remote(url: str) -> bool:
+    """Whether a daemon URL points at another host; Unix sockets and named pipes are local."""
+    if not url or url.startswith("http+docker://"):
+        return False
+    return urlparse(url).hostname not in LOCAL_HOSTS
+
+
+def _container_address(attrs: Dict) -> Optional[str]:
+    settings = attrs.get("NetworkSettings") or {}
+    for network in (settings.get("Networks") or {}).values():
+        if network and network.get("IPAddress"):
+            return network["IPAddress"]
+    return settings.get("IPAddress") or None
+
+
+def _exposed_port(attrs: Dict) -> int:
+    """Return the lowest exposed TCP port, or the default HTTP port."""
+    ports = [int(spec.split("/")[0]) for spec in (attrs.get("Config", {}).get("ExposedPorts") or {})
+             if spec.endswith("/tcp")]
+    return min(ports) if ports else DEFAULT_PROBE_PORT
+
+
+def _probe_exec(container: docker.models.containers.Container) -> bool:
+    """Probe from inside the container; needs curl in the image."""
+    try:
+        exec_result = container.exec_run("curl --fail http://localhost/health || exit 1")
+        return exec_result.exit_code == 0
+    except docker.errors.APIError as e:
+        logging.error("Failed to check app health for %s: %s", container.name, str(e))
+        return False
+
+
+_default_prober: Optional[AppProber] = None
+_default_prober_lock = threading.Lock()
+
+
+def default_prober() -> AppProber:
+    """Return the process-wide prober, so repeated checks share its cache and pool."""
+    global _default_prober
+    with _default_prober_lock:
+        if _default_prober is None:
+            _default_prober = AppProber()
+        return _default_prober
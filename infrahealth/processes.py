@@ -0,0 +1,179 @@
+import heapq
+import os
+import sys
+import threading
+import time
+from operator import itemgetter
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+import psutil
+
+from .instrumentation import instrumented
+
+DEFAULT_PROC_ROOT = "/proc"
+
+# Shortest window a first, one-shot sample waits for.
+MIN_SAMPLE_INTERVAL = 0.1
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Row fields, in the order rows are kept internally.
+_CPU, _RSS, _IO, _PID, _NAME = range(5)
+
+
+class ProcessSampler:
+    """
+    Rank processes by CPU, resident memory and disk I/O.
+
+    Per-process state is kept between samples, so CPU and I/O are rates
+    over the time since the previous sample and only the first sample
+    waits ``min_interval`` seconds. On Linux each process costs a single
+    read of ``/proc/<pid>/stat``; ``/proc/<pid>/io`` is only read again for
+    processes that used CPU since the previous sample. I/O issued while a
+    process used no CPU ticks is counted at its next read, as a rate over
+    the time since its previous read, so it is spread rather than inflated.
+    Elsewhere, ``psutil.Process`` objects are cached and read inside
+    ``oneshot()``. The top N of each ranking are picked with a bounded heap.
+    """
+
+    def __init__(self, min_interval: float = MIN_SAMPLE_INTERVAL, proc_root: str = DEFAULT_PROC_ROOT,
+                 use_procfs: Optional[bool] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.min_interval = min_interval
+        self.proc_root = proc_root
+        self.use_procfs = sys.platform.startswith("linux") if use_procfs is None else use_procfs
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        # pid -> [start time, CPU seconds, I/O bytes or None if unreadable, name, time of the I/O read]
+        self._state: Dict[int, List] = {}
+        self._psutil_procs: Dict[int, psutil.Process] = {}
+        self._last_time: Optional[float] = None
+
+    def sample(self, top: int) -> Dict[str, List[Dict]]:
+        """
+        Return the ``top`` processes for each ranking.
+
+        Returns:
+            Dict with ``cpu``, ``memory`` and ``io`` lists. Each entry has
+            ``pid``, ``name``, ``cpu_percent`` (100% per fully used CPU),
+            ``rss_bytes`` and ``io_bytes_per_sec``.
+        """
+        with self._lock:
+            if self._last_time is None:
+                self._collect(self._clock())
+                self._sleep(self.min_interval)
+            rows = self._collect(self._clock())
+            return {ranking: [_row_dict(row) for row in heapq.nlargest(top, rows, key=itemgetter(index))]
+                    for ranking, index in (("cpu", _CPU), ("memory", _RSS), ("io", _IO))}
+
+    def _collect(self, now: float) -> List[Tuple]:
+        elapsed = now - self._last_time if self._last_time is not None else 0.0
+        read = self._read_procfs if self.use_procfs else self._read_psutil
+        state, previous = {}, self._state
+        rows = []
+        for pid in self._pids():
+            try:
+                name, start, cpu_seconds, rss = read(pid)
+            except (OSError, ValueError, IndexError, psutil.Error):
+                continue  # The process exited while being read.
+            entry = previous.get(pid)
+            if entry is None or entry[0] != start:
+                # New process, or the pid was reused: this sample is its baseline.
+                entry = [start, cpu_seconds, self._read_io(pid), name, now]
+                state[pid] = entry
+                rows.append((0.0, rss, 0.0, pid, name))
+                continue
+            cpu_delta = cpu_seconds - entry[1]
+            io_rate = 0.0
+            if cpu_delta > 0 and entry[2] is not None:
+                io_bytes = self._read_io(pid)
+                io_elapsed = now - entry[4]
+                if io_bytes is not None and io_elapsed > 0:
+                    io_rate = max(0, io_bytes - entry[2]) / io_elapsed
+                entry[2], entry[4] = io_bytes, now
+            entry[1] = cpu_seconds
+            state[pid] = entry
+            cpu_percent = round(cpu_delta / elapsed * 100.0, 1) if elapsed > 0 else 0.0
+            rows.append((cpu_percent, rss, io_rate, pid, entry[3]))
+        self._state = state
+        if not self.use_procfs:
+            for pid in set(self._psutil_procs) - set(state):
+                del self._psutil_procs[pid]
+        self._last_time = now
+        return rows
+
+    def _pids(self) -> List[int]:
+        if not self.use_procfs:
+            return psutil.pids()
+        return [int(entry) for entry in os.listdir(self.proc_root) if entry.isdigit()]
+
+    def _read_procfs(self, pid: int) -> Tuple[str, int, float, int]:
+        fd = os.open(f"{self.proc_root}/{pid}/stat", os.O_RDONLY)
+        try:
+            data = os.read(fd, 4096)
+        finally:
+            os.close(fd)
+        # The command name is in parentheses and may itself contain spaces or ')'.
+        close = data.rindex(b")")
+        name = data[data.index(b"(") + 1:close].decode(errors="replace")
+        fields = data[close + 2:].split()
+        # Fields after the name start at stat field 3 (state).
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+        return name, int(fields[19]), cpu_seconds, int(fields[21]) * _PAGE_SIZE
+
+    def _read_psutil(self, pid: int) -> Tuple[str, float, float, int]:
+        process = self._psutil_procs.get(pid)
+        if process is None:
+            process = self._psutil_procs[pid] = psutil.Process(pid)
+        with process.oneshot():
+            times = process.cpu_times()
+            return process.name(), process.create_time(), times.user + times.system, process.memory_info().rss
+
+    def _read_io(self, pid: int) -> Optional[int]:
+        """Return bytes read from and written to storage, or None if not permitted."""
+        try:
+            if not self.use_procfs:
+                counters = self._psutil_procs[pid].io_counters()
+                return counters.read_bytes + counters.write_bytes
+            with open(f"{self.proc_root}/{pid}/io", "rb") as f:
+                total = 0
+                for line in f:
+                    if line.startswith((b"read_bytes:", b"write_bytes:")):
+                        total += int(line.split()[1])
+                return total
+        except (OSError, AttributeError, psutil.Error):
+            return None
+
+
+def _row_dict(row: Tuple) -> Dict:
+    return {"pid": row[_PID], "name": row[_NAME], "cpu_percent": row[_CPU],
+            "rss_bytes": row[_RSS], "io_bytes_per_sec": row[_IO]}
+
+
+_default_process_sampler = ProcessSampler()
+
+
+@instrumented("top_processes")
+def get_top_processes(top: int, sampler: Optional[ProcessSampler] = None) -> Dict[str, List[Dict]]:
+    """
+    Fetch the top processes by CPU, memory and disk I/O.
+
+    Args:
+        top (int): Number of processes in each ranking.
+        sampler (ProcessSampler): Sampler to use. Defaults to a process-wide
+            sampler, so repeated calls report rates without blocking.
+
+    Raises:
+        RuntimeError: If the process table cannot be read.
+    """
+    try:
+        processes = (sampler or _default_process_sampler).sample(top)
+        logging.info("Fetched top %d processes", top)
+        return processes
+    except (OSError, psutil.Error) as e:
+        logging.error("Failed to fetch process metrics: %s", str(e))
+        raise RuntimeError(f"Failed to fetch process metrics: {str(e)}")
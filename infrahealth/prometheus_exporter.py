@@ -1,47 +1,331 @@
-from prometheus_client import start_http_server, Gauge
+from prometheus_client import start_http_server, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
 from .health import get_server_health
-from .docker_health import get_docker_health
+from .docker_health import get_docker_health, collect_container_health
+from .docker_stream import StatsStreamManager
+from .cgroup import CgroupCollector
+from .inventory import ContainerInventory
+from .processes import get_top_processes
+from .probes import default_prober
+from .anomaly import AnomalyDetector
+from .scheduler import (Scheduler, ScheduledSources, ContainerSampler, DEFAULT_INTERVALS, DEFAULT_CPU_BUDGET,
+                        container_values, server_collectors)
+from . import instrumentation
+from typing import Callable, Dict, List, Optional
+import functools
+import threading
 import time
 import logging
 
-logging.basicConfig(
-    filename="infrahealth.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
-
-
-def export_metrics(port: int = 8000):
-    """Export server and Docker metrics to Prometheus."""
-    server_cpu = Gauge("infrahealth_server_cpu_percent",
-                       "Server CPU usage percentage")
-    server_memory = Gauge("infrahealth_server_memory_percent",
-                          "Server memory usage percentage")
-    server_disk = Gauge("infrahealth_server_disk_percent",
-                        "Server disk usage percentage")
-    container_cpu = Gauge("infrahealth_container_cpu_percent",
-                          "Container CPU usage percentage", ["container_name"])
-    container_memory = Gauge("infrahealth_container_memory_percent",
-                             "Container memory usage percentage", ["container_name"])
+DEFAULT_CACHE_TTL = 10.0
 
+
+class InfrahealthCollector:
+    """
+    Collect server and Docker metrics when Prometheus scrapes.
+
+    Results are cached for ``ttl`` seconds and concurrent scrapes share a
+    single collection. Metric families are rebuilt on every scrape, so
+    series for containers that have gone away disappear with them. With a
+    ``detector`` (``AnomalyDetector``), every collection also updates its
+    rolling statistics, which are exported as gauges. With a ``scheduler``
+    (``Scheduler``) feeding the sources, each collector's current interval
+    and cost are exported too.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_CACHE_TTL,
+                 server_source: Optional[Callable[[], Dict]] = None,
+                 docker_source: Optional[Callable[[], List[Dict]]] = None,
+                 detector=None, scheduler=None):
+        self.ttl = ttl
+        self.detector = detector
+        self.scheduler = scheduler
+        self._server_source = server_source or (lambda: get_server_health(detailed=False))
+        self._docker_source = docker_source or (lambda: get_docker_health(detailed=False))
+        self._lock = threading.Lock()
+        self._server: Optional[Dict] = None
+        self._containers: List[Dict] = []
+        self._collected_at: Optional[float] = None
+        self._duration = 0.0
+
+    def refresh(self) -> None:
+        """Collect fresh data unless the cached snapshot is within its TTL."""
+        with self._lock:
+            if self._collected_at is not None and time.time() - self._collected_at < self.ttl:
+                return
+            start = time.perf_counter()
+            try:
+                self._server = self._server_source()
+            except Exception as e:
+                self._server = None
+                logging.error("Failed to collect server metrics: %s", str(e))
+            try:
+                self._containers = self._docker_source()
+            except Exception as e:
+                self._containers = []
+                logging.error("Failed to collect Docker metrics: %s", str(e))
+            self._duration = time.perf_counter() - start
+            self._collected_at = time.time()
+            if self.detector is not None:
+                if self._server is not None:
+                    self.detector.update(self._server)
+                self.detector.update(self._containers)
+
+    def describe(self):
+        """Describe metric families without triggering a collection."""
+        families = self._families()
+        if self.detector is not None:
+            families.extend(_anomaly_families())
+        if self.scheduler is not None:
+            families.extend(_schedule_families())
+        if instrumentation.recorder.enabled:
+            families.extend(_self_families())
+        return families
+
+    def collect(self):
+        """Yield metric families for the current snapshot."""
+        self.refresh()
+        with self._lock:
+            server, containers = self._server, self._containers
+            collected_at, duration = self._collected_at, self._duration
+            series = self.detector.series() if self.detector is not None else None
+        families = self._families(server, containers, collected_at, duration)
+        if series is not None:
+            families.extend(_anomaly_families(series))
+        if self.scheduler is not None:
+            families.extend(_schedule_families(self.scheduler.state(), self.scheduler.load()))
+        if instrumentation.recorder.enabled:
+            families.extend(_self_families(instrumentation.recorder.snapshot()))
+        return families
+
+    def _families(self, server: Optional[Dict] = None, containers: Optional[List[Dict]] = None,
+                  collected_at: Optional[float] = None, duration: float = 0.0) -> List:
+        server_cpu = GaugeMetricFamily("infrahealth_server_cpu_percent",
+                                       "Server CPU usage percentage")
+        server_memory = GaugeMetricFamily("infrahealth_server_memory_percent",
+                                          "Server memory usage percentage")
+        server_disk = GaugeMetricFamily("infrahealth_server_disk_percent",
+                                        "Server disk usage percentage")
+        container_cpu = GaugeMetricFamily("infrahealth_container_cpu_percent",
+                                          "Container CPU usage percentage", labels=["container_name"])
+        container_memory = GaugeMetricFamily("infrahealth_container_memory_percent",
+                                             "Container memory usage percentage", labels=["container_name"])
+        container_app_healthy = GaugeMetricFamily("infrahealth_container_app_healthy",
+                                                  "Whether the container's health probe passed",
+                                                  labels=["container_name", "probe"])
+        container_app_latency = GaugeMetricFamily("infrahealth_container_app_probe_latency_seconds",
+                                                  "Latency of the container's health probe",
+                                                  labels=["container_name", "probe"])
+        process_cpu = GaugeMetricFamily("infrahealth_process_cpu_percent",
+                                        "CPU usage percentage of a top process", labels=["pid", "name"])
+        process_rss = GaugeMetricFamily("infrahealth_process_resident_memory_bytes",
+                                        "Resident memory of a top process", labels=["pid", "name"])
+        process_io = GaugeMetricFamily("infrahealth_process_io_bytes_per_second",
+                                       "Disk I/O rate of a top process", labels=["pid", "name"])
+        collection_duration = GaugeMetricFamily("infrahealth_collection_duration_seconds",
+                                                "Time taken by the last metrics collection")
+        collection_age = GaugeMetricFamily("infrahealth_collection_age_seconds",
+                                           "Age of the served metrics snapshot")
+        if server is not None:
+            server_cpu.add_metric([], server["cpu_percent"])
+            server_memory.add_metric([], server["memory_percent"])
+            server_disk.add_metric([], server["disk_percent"])
+            # A process in several rankings is exported once.
+            processes = {p["pid"]: p for ranked in server.get("top_processes", {}).values() for p in ranked}
+            for process in processes.values():
+                labels = [str(process["pid"]), process["name"]]
+                process_cpu.add_metric(labels, process["cpu_percent"])
+                process_rss.add_metric(labels, process["rss_bytes"])
+                process_io.add_metric(labels, process["io_bytes_per_sec"])
+        for container in containers or []:
+            container_cpu.add_metric([container["name"]], container["cpu_percent"])
+            container_memory.add_metric([container["name"]], container["memory_percent"])
+            if "app_latency_ms" in container:
+                labels = [container["name"], container["app_probe"]]
+                container_app_healthy.add_metric(labels, 1 if container["app_health"] == "healthy" else 0)
+                container_app_latency.add_metric(labels, container["app_latency_ms"] / 1000.0)
+        if collected_at is not None:
+            collection_duration.add_metric([], duration)
+            collection_age.add_metric([], max(0.0, time.time() - collected_at))
+        return [server_cpu, server_memory, server_disk, container_cpu, container_memory,
+                container_app_healthy, container_app_latency, process_cpu, process_rss, process_io,
+                collection_duration, collection_age]
+
+
+def _anomaly_families(series: Optional[List[Dict]] = None) -> List:
+    """Build the rolling statistics families from ``AnomalyDetector.series()``."""
+    labels = ["container_name", "metric"]
+    mean = GaugeMetricFamily("infrahealth_rolling_mean", "Time-weighted rolling mean of a metric", labels=labels)
+    stddev = GaugeMetricFamily("infrahealth_rolling_stddev", "Time-weighted rolling standard deviation of a metric",
+                               labels=labels)
+    zscore = GaugeMetricFamily("infrahealth_rolling_zscore",
+                               "Standard deviations between the latest value and the rolling mean before it",
+                               labels=labels)
+    quantile = GaugeMetricFamily("infrahealth_rolling_p95", "Estimated 95th percentile of a metric", labels=labels)
+    trend = GaugeMetricFamily("infrahealth_trend_per_second", "Slope of a metric's rolling trend line",
+                              labels=labels)
+    to_limit = GaugeMetricFamily("infrahealth_forecast_seconds_to_limit",
+                                 "Seconds until the trend line reaches the metric's limit", labels=labels)
+    for row in series or []:
+        values = [row["container"], row["metric"]]
+        mean.add_metric(values, row["mean"])
+        stddev.add_metric(values, row["stddev"])
+        if row["zscore"] is not None:
+            zscore.add_metric(values, row["zscore"])
+        quantile.add_metric(values, row["p95"])
+        trend.add_metric(values, row["trend_per_second"])
+        if row.get("seconds_to_limit") is not None:
+            to_limit.add_metric(values, row["seconds_to_limit"])
+    return [mean, stddev, zscore, quantile, trend, to_limit]
+
+
+def _schedule_families(state: Optional[List[Dict]] = None, load: float = 0.0) -> List:
+    """Build the sampling schedule families from ``Scheduler.state()`` and ``Scheduler.load()``."""
+    interval = GaugeMetricFamily("infrahealth_self_sample_interval_seconds",
+                                 "Current seconds between runs of a collector", labels=["collector"])
+    cost = GaugeMetricFamily("infrahealth_self_sample_cost_seconds",
+                             "Average CPU seconds a collector's run takes", labels=["collector"])
+    cpu_load = GaugeMetricFamily("infrahealth_self_sampling_cpu_load",
+                                 "Projected fraction of one CPU used by sampling")
+    if state is not None:
+        for row in state:
+            interval.add_metric([row["collector"]], row["interval"])
+            cost.add_metric([row["collector"]], row["cost_seconds"])
+        cpu_load.add_metric([], load)
+    return [interval, cost, cpu_load]
+
+
+def _self_families(snapshot: Optional[Dict] = None) -> List:
+    """Build the ``infrahealth_self_*`` families from an instrumentation snapshot."""
+    operation_duration = HistogramMetricFamily("infrahealth_self_operation_duration_seconds",
+                                               "Time infrahealth spent in each collection step",
+                                               labels=["operation"])
+    container_duration = HistogramMetricFamily("infrahealth_self_container_duration_seconds",
+                                               "Time infrahealth spent on each container, per step",
+                                               labels=["operation", "container_name"])
+    errors = CounterMetricFamily("infrahealth_self_errors", "Failed or timed out collection steps",
+                                 labels=["operation"])
+    api_calls = CounterMetricFamily("infrahealth_self_docker_api_calls", "Docker Engine API requests made",
+                                    labels=["endpoint"])
+    memory = GaugeMetricFamily("infrahealth_self_resident_memory_bytes", "Resident memory of the exporter")
+    threads = GaugeMetricFamily("infrahealth_self_threads", "Threads running in the exporter")
+    if snapshot is not None:
+        for operation, histogram in snapshot["operations"].items():
+            operation_duration.add_metric([operation], histogram.cumulative(), histogram.sum)
+        for (operation, container), histogram in snapshot["containers"].items():
+            container_duration.add_metric([operation, container], histogram.cumulative(), histogram.sum)
+        for operation, count in snapshot["errors"].items():
+            errors.add_metric([operation], count)
+        for endpoint, count in snapshot["docker_api_calls"].items():
+            api_calls.add_metric([endpoint], count)
+        memory.add_metric([], snapshot["resident_memory_bytes"])
+        threads.add_metric([], snapshot["threads"])
+    return [operation_duration, container_duration, errors, api_calls, memory, threads]
+
+
+def _server_health(top: int) -> Dict:
+    """Fetch basic server health together with the top processes."""
+    health = get_server_health(detailed=False)
+    health["top_processes"] = get_top_processes(top)
+    return health
+
+
+def create_collector(ttl: float = DEFAULT_CACHE_TTL, stream: bool = False, backend: str = "api",
+                     app_check: bool = False, top: int = 0, anomalies: bool = False, adaptive: bool = False,
+                     intervals: Optional[Dict[str, float]] = None,
+                     cpu_budget: float = DEFAULT_CPU_BUDGET) -> InfrahealthCollector:
+    """
+    Create a collector over long-lived Docker sources.
+
+    Args:
+        ttl (float): Seconds a collected snapshot is reused across scrapes.
+        stream (bool): If True, keep a streaming stats subscription per
+            container and serve Docker metrics from its latest samples.
+        backend (str): ``cgroup`` to read container stats from cgroup v2
+            files instead of the Docker API.
+        app_check (bool): If True, probe each container's health endpoint.
+        top (int): Number of top processes by CPU, memory and disk I/O to
+            export. Zero disables process metrics.
+        anomalies (bool): If True, also export rolling statistics, trends
+            and forecasts for each server and container metric.
+        adaptive (bool): If True, sample each collector in the background
+            on its own adaptive interval (see ``Scheduler``) and serve
+            scrapes from the latest samples instead of collecting on scrape.
+        intervals (dict): Base seconds between samples by collector name,
+            overriding ``DEFAULT_INTERVALS``. Used with ``adaptive``.
+        cpu_budget (float): Fraction of one CPU adaptive sampling may use.
+    """
+    inventory = None
+    if stream:
+        streams = StatsStreamManager()
+        streams.start()
+        docker_source = streams.snapshot
+    else:
+        inventory = ContainerInventory()
+        try:
+            inventory.start()
+        except RuntimeError as e:
+            # Keep serving server metrics; containers are listed per scrape instead.
+            logging.error("Container inventory unavailable: %s", str(e))
+            inventory = None
+        probe_inline = app_check and not (adaptive and inventory is not None)
+        if backend == "cgroup":
+            docker_source = functools.partial(CgroupCollector(inventory=inventory).collect, app_check=probe_inline)
+        else:
+            docker_source = functools.partial(get_docker_health, app_check=probe_inline, inventory=inventory)
+    detector = AnomalyDetector() if anomalies else None
+    if not adaptive:
+        server_source = functools.partial(_server_health, top) if top else None
+        return InfrahealthCollector(ttl=ttl, server_source=server_source, docker_source=docker_source,
+                                    detector=detector)
+
+    intervals = dict(DEFAULT_INTERVALS, **(intervals or {}))
+    scheduler = Scheduler(cpu_budget=cpu_budget)
+    for name, sample in server_collectors(top).items():
+        scheduler.add(name, sample, intervals[name])
+    if backend == "api" and inventory is not None:
+        # Containers are sampled one by one, each on its own interval.
+        sampler = ContainerSampler(inventory.containers, collect_container_health, interval=intervals["docker"])
+        scheduler.add("docker", sampler, sampler.tick, adaptive=False)
+    else:
+        scheduler.add("docker", docker_source, intervals["docker"], values=container_values)
+    if app_check and inventory is not None:
+        scheduler.add("probes", functools.partial(_probe_containers, inventory), intervals["probes"],
+                      adaptive=False)
+    scheduler.start()
+    sources = ScheduledSources(scheduler)
+    return InfrahealthCollector(ttl=0, server_source=sources.server_health, docker_source=sources.containers,
+                                detector=detector, scheduler=scheduler)
+
+
+def _probe_containers(inventory: ContainerInventory) -> Dict[str, Dict]:
+    """Probe every running container, returning results by container name."""
+    containers = inventory.containers()
+    results = default_prober().probe_many(containers)
+    return {container.name: result for container, result in zip(containers, results)}
+
+
+def export_metrics(port: int = 8000, stream: bool = False, ttl: float = DEFAULT_CACHE_TTL,
+                   backend: str = "api", app_check: bool = False, top: int = 0, self_metrics: bool = True,
+                   anomalies: bool = False, adaptive: bool = False, intervals: Optional[Dict[str, float]] = None,
+                   cpu_budget: float = DEFAULT_CPU_BUDGET):
+    """
+    Export server and Docker metrics to Prometheus.
+
+    Args:
+        port (int): Port for the exporter's HTTP server.
+        self_metrics (bool): If True, also export ``infrahealth_self_*``
+            metrics on the exporter's own collection costs.
+
+    The other arguments are passed to ``create_collector``.
+    """
+    if self_metrics:
+        instrumentation.enable()
+    REGISTRY.register(create_collector(ttl=ttl, stream=stream, backend=backend, app_check=app_check, top=top,
+                                       anomalies=anomalies, adaptive=adaptive, intervals=intervals,
+                                       cpu_budget=cpu_budget))
     start_http_server(port)
     logging.info("Started Prometheus exporter on port %d", port)
 
-    while True:
-        try:
-            # Server metrics
-            server_health = get_server_health(detailed=False)
-            server_cpu.set(server_health["cpu_percent"])
-            server_memory.set(server_health["memory_percent"])
-            server_disk.set(server_health["disk_percent"])
-
-            # Docker metrics
-            docker_health = get_docker_health(detailed=False)
-            for container in docker_health:
-                container_cpu.labels(container_name=container["name"]).set(
-                    container["cpu_percent"])
-                container_memory.labels(container_name=container["name"]).set(
-                    container["memory_percent"])
-        except Exception as e:
-            logging.error("Failed to export metrics: %s", str(e))
-        time.sleep(10)
+    # Metrics are collected on scrape or by the scheduler; keep the main thread alive.
+    threading.Event().wait()
@@ -0,0 +1,439 @@
+import json
+import os
+import random
+import socket
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+import requests
+
+from .instrumentation import recorder, timed
+
+DEFAULT_SPOOL_DIR = os.path.join(os.path.expanduser("~"), ".infrahealth", "spool")
+DEFAULT_SPOOL_BUDGET = 64 * 1024 * 1024
+DEFAULT_PUSH_INTERVAL = 15.0
+DEFAULT_PUSH_TIMEOUT = 10.0
+DEFAULT_JOB = "infrahealth"
+
+PROTOCOLS = ("remote-write", "pushgateway")
+
+# Spooled collections sent in one request.
+DEFAULT_BATCH_SIZE = 20
+
+# Seconds between retries of a failed push, doubling up to the maximum.
+RETRY_BASE = 1.0
+RETRY_MAX = 60.0
+
+# Statuses worth retrying; any other error status rejects the batch for good.
+RETRY_STATUSES = {408, 429}
+
+_SPOOL_SUFFIX = ".spool"
+
+
+class Spool:
+    """
+    Bounded on-disk queue of collected samples.
+
+    Each collection is written as one zlib-compressed file named by a
+    sequence number, so the queue survives restarts and hosts that die
+    before delivery send their backlog on the next run. When the files
+    exceed ``budget_bytes`` the oldest are deleted first; the newest
+    collection is always kept.
+    """
+
+    def __init__(self, directory: str = DEFAULT_SPOOL_DIR, budget_bytes: int = DEFAULT_SPOOL_BUDGET):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, int]" = OrderedDict()
+        self._bytes = 0
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(_SPOOL_SUFFIX):
+                continue
+            try:
+                seq = int(name[:-len(_SPOOL_SUFFIX)])
+                size = os.path.getsize(os.path.join(directory, name))
+            except (ValueError, OSError):
+                continue
+            self._entries[seq] = size
+            self._bytes += size
+        self._next = max(self._entries, default=0) + 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def append(self, timestamp_ms: int, samples: List[Tuple[str, Dict[str, str], float]]) -> None:
+        """Spool one collection, dropping the oldest ones if over budget."""
+        data = zlib.compress(json.dumps({"t": timestamp_ms, "s": samples}, separators=(",", ":")).encode())
+        with self._lock:
+            seq = self._next
+            self._next += 1
+        path = self._path(seq)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            self._entries[seq] = len(data)
+            self._bytes += len(data)
+            dropped = 0
+            while self._bytes > self.budget_bytes and len(self._entries) > 1:
+                self._discard(next(iter(self._entries)))
+                dropped += 1
+            self.dropped += dropped
+        if dropped:
+            recorder.error("push_spool")
+            logging.warning("Push spool over %d bytes; dropped the %d oldest collections",
+                            self.budget_bytes, dropped)
+
+    def oldest(self, limit: int) -> List[Tuple[int, Dict]]:
+        """Return up to ``limit`` of the oldest collections as ``(seq, collection)``."""
+        with self._lock:
+            seqs = list(self._entries)[:limit]
+        return self._read(seqs)
+
+    def newest(self) -> List[Tuple[int, Dict]]:
+        """Return the newest collection, if any, as ``[(seq, collection)]``."""
+        with self._lock:
+            seqs = [next(reversed(self._entries))] if self._entries else []
+        return self._read(seqs)
+
+    def remove_before(self, seq: int) -> None:
+        """Delete every collection older than ``seq``."""
+        with self._lock:
+            for older in [older for older in self._entries if older < seq]:
+                self._discard(older)
+
+    def remove(self, seqs: List[int]) -> None:
+        """Delete collections; ones already dropped are ignored."""
+        with self._lock:
+            for seq in seqs:
+                if seq in self._entries:
+                    self._discard(seq)
+
+    def _read(self, seqs: List[int]) -> List[Tuple[int, Dict]]:
+        collections = []
+        for seq in seqs:
+            try:
+                with open(self._path(seq), "rb") as f:
+                    collections.append((seq, json.loads(zlib.decompress(f.read()))))
+            except FileNotFoundError:
+                # Dropped for space since it was listed.
+                continue
+            except (OSError, ValueError, zlib.error) as e:
+                logging.error("Discarding unreadable spool file %s: %s", self._path(seq), str(e))
+                self.remove([seq])
+        return collections
+
+    def _discard(self, seq: int) -> None:
+        self._bytes -= self._entries.pop(seq)
+        try:
+            os.unlink(self._path(seq))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:016d}{_SPOOL_SUFFIX}")
+
+
+class PushRejected(Exception):
+    """The receiver refused a batch; retrying would not help."""
+
+
+class Pusher:
+    """
+    Collect metrics on a schedule and push them to a remote endpoint.
+
+    Samples are taken from an ``InfrahealthCollector``, so they carry the
+    same names and labels as the pull exporter, and are spooled to disk
+    before a background sender delivers them over one pooled keep-alive
+    connection. Failed pushes are retried with exponential backoff and
+    jitter while newer collections keep spooling; rejected batches (4xx
+    other than 408 and 429) are dropped.
+
+    ``remote-write`` sends up to ``batch_size`` spooled collections per
+    request as a snappy-compressed protobuf ``WriteRequest``, oldest first.
+    ``pushgateway`` only keeps the latest value per group, so only the
+    newest collection is sent and older ones are discarded.
+    """
+
+    def __init__(self, url: str, collector, protocol: str = "remote-write", spool: Optional[Spool] = None,
+                 interval: float = DEFAULT_PUSH_INTERVAL, job: str = DEFAULT_JOB,
+                 instance: Optional[str] = None, headers: Optional[Dict[str, str]] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, timeout: float = DEFAULT_PUSH_TIMEOUT,
+                 clock: Callable[[], float] = time.time):
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"Unknown push protocol: {protocol}")
+        self.url = url
+        self.collector = collector
+        self.protocol = protocol
+        self.spool = spool if spool is not None else Spool()
+        self.interval = interval
+        self.job = job
+        self.instance = instance or socket.gethostname()
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        self._clock = clock
+        self._session = requests.Session()
+        self._session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self._session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self._session.headers.update(headers or {})
+        self._stopped = threading.Event()
+        self._spooled = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """Start collecting and sending in the background."""
+        for target, name in ((self._collect_loop, "collect"), (self._send_loop, "send")):
+            thread = threading.Thread(target=target, name=f"infrahealth-push-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info("Pushing to %s (%s) every %.1fs", self.url, self.protocol, self.interval)
+
+    def wait(self) -> None:
+        """Block until the pusher is stopped."""
+        self._stopped.wait()
+
+    def stop(self, flush_timeout: float = 5.0) -> None:
+        """Stop collecting, then try to deliver what is spooled for up to ``flush_timeout`` seconds."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._spooled.set()
+        for thread in self._threads:
+            thread.join(self.timeout)
+        self._threads = []
+        self.flush(flush_timeout)
+        self._session.close()
+
+    def collect(self) -> int:
+        """Take one collection and spool it. Returns the number of samples."""
+        samples = []
+        for family in self.collector.collect():
+            for sample in family.samples:
+                samples.append((sample.name, dict(sample.labels), sample.value))
+        self.spool.append(int(self._clock() * 1000), samples)
+        self._spooled.set()
+        return len(samples)
+
+    def flush(self, timeout: float) -> bool:
+        """
+        Send spooled collections until none are left or ``timeout`` passes.
+
+        Returns:
+            True if the spool was emptied.
+        """
+        deadline = time.monotonic() + timeout
+        while len(self.spool) and time.monotonic() < deadline:
+            try:
+                self.send_batch()
+            except PushRejected as e:
+                logging.error("Dropped push batch: %s", str(e))
+            except requests.RequestException as e:
+                logging.warning("Push to %s failed: %s", self.url, str(e))
+                time.sleep(min(RETRY_BASE, max(0.0, deadline - time.monotonic())))
+        return not len(self.spool)
+
+    def send_batch(self) -> int:
+        """
+        Send the next batch from the spool and remove it once delivered.
+
+        Returns:
+            Number of collections delivered.
+
+        Raises:
+            requests.RequestException: If the push failed and should be retried.
+            PushRejected: If the receiver refused the batch, which is then dropped.
+        """
+        if self.protocol == "pushgateway":
+            batch = self.spool.newest()
+            if batch:
+                self.spool.remove_before(batch[0][0])
+        else:
+            batch = self.spool.oldest(self.batch_size)
+        if not batch:
+            return 0
+        seqs = [seq for seq, _ in batch]
+        with timed("push"):
+            response = self._post([collection for _, collection in batch])
+            if response.status_code >= 500 or response.status_code in RETRY_STATUSES:
+                response.raise_for_status()
+        if response.status_code >= 400:
+            self.spool.remove(seqs)
+            recorder.error("push")
+            raise PushRejected(f"{self.url} rejected {len(seqs)} collections: "
+                               f"{response.status_code} {response.text[:200]}")
+        self.spool.remove(seqs)
+        return len(seqs)
+
+    def _post(self, collections: List[Dict]) -> requests.Response:
+        if self.protocol == "pushgateway":
+            url = f"{self.url.rstrip('/')}/metrics/job/{self.job}/instance/{self.instance}"
+            return self._session.put(url, data=encode_text(collections[-1]["s"]),
+                                     headers={"Content-Type": "text/plain; version=0.0.4"}, timeout=self.timeout)
+        body = snappy_compress(encode_write_request(collections, {"job": self.job, "instance": self.instance}))
+        return self._session.post(self.url, data=body, timeout=self.timeout, headers={
+            "Content-Type": "application/x-protobuf",
+            "Content-Encoding": "snappy",
+            "X-Prometheus-Remote-Write-Version": "0.1.0",
+        })
+
+    def _collect_loop(self) -> None:
+        from .watch import watch
+        for _ in watch(self._collect_safely, self.interval, sleep=self._stopped.wait):
+            if self._stopped.is_set():
+                return
+
+    def _collect_safely(self) -> None:
+        try:
+            self.collect()
+        except Exception as e:
+            logging.error("Failed to collect metrics to push: %s", str(e))
+
+    def _send_loop(self) -> None:
+        backoff = RETRY_BASE
+        while not self._stopped.is_set():
+            if not len(self.spool):
+                self._spooled.wait()
+                self._spooled.clear()
+                continue
+            try:
+                self.send_batch()
+                backoff = RETRY_BASE
+            except PushRejected as e:
+                logging.error("Dropped push batch: %s", str(e))
+            except requests.RequestException as e:
+                delay = backoff * random.uniform(0.5, 1.0)
+                logging.warning("Push to %s failed, retrying in %.1fs: %s", self.url, delay, str(e))
+                self._stopped.wait(delay)
+                backoff = min(RETRY_MAX, backoff * 2)
+
+
+def encode_text(samples: List) -> bytes:
+    """Encode samples in the Prometheus text format, without timestamps, as the Pushgateway expects."""
+    lines = []
+    for name, labels, value in samples:
+        if labels:
+            pairs = ",".join(f'{key}="{_escape(str(val))}"' for key, val in sorted(labels.items()))
+            lines.append(f"{name}{{{pairs}}} {_format_value(value)}")
+        else:
+            lines.append(f"{name} {_format_value(value)}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def encode_write_request(collections: List[Dict], extra_labels: Dict[str, str]) -> bytes:
+    """
+    Encode spooled collections as a remote-write ``WriteRequest`` protobuf.
+
+    Samples of the same series across collections are grouped into one
+    ``TimeSeries``, oldest first, with labels sorted by name as the
+    protocol requires.
+    """
+    series: Dict[Tuple, List[bytes]] = {}
+    for collection in collections:
+        timestamp = collection["t"]
+        for name, labels, value in collection["s"]:
+            key = tuple(sorted(dict(extra_labels, __name__=name, **labels).items()))
+            encoded = b"\x09" + struct.pack("<d", value) + b"\x10" + _varint(timestamp)
+            series.setdefault(key, []).append(encoded)
+    out = bytearray()
+    for key, samples in series.items():
+        body = bytearray()
+        for label_name, label_value in key:
+            label = _field(1, label_name.encode()) + _field(2, str(label_value).encode())
+            body += _field(1, label)
+        for sample in samples:
+            body += _field(2, sample)
+        out += _field(1, bytes(body))
+    return bytes(out)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    """Encode a length-delimited protobuf field."""
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def snappy_compress(data: bytes) -> bytes:
+    """
+    Compress data in the snappy block format used by remote write.
+
+    Uses python-snappy or cramjam when installed, and a pure-Python
+    compressor otherwise. The fallback finds repeats through a table of
+    4-byte prefixes. Metric payloads repeat label names and values
+    throughout, so it still roughly halves them.
+    """
+    try:
+        import snappy
+        return snappy.compress(data)
+    except ImportError:
+        pass
+    try:
+        import cramjam
+        return bytes(cramjam.snappy.compress_raw(data))
+    except ImportError:
+        pass
+    out = bytearray(_varint(len(data)))
+    table: Dict[bytes, int] = {}
+    size = len(data)
+    position = literal = 0
+    while position + 4 <= size:
+        key = data[position:position + 4]
+        candidate = table.get(key)
+        table[key] = position
+        if candidate is None or position - candidate > 0xffff:
+            position += 1
+            continue
+        length = 4
+        limit = min(64, size - position)
+        while length < limit and data[candidate + length] == data[position + length]:
+            length += 1
+        _snappy_literal(out, data, literal, position)
+        offset = position - candidate
+        # Copy with a 2-byte offset: tag holds length - 1.
+        out += bytes(((length - 1) << 2 | 2, offset & 0xff, offset >> 8))
+        position += length
+        literal = position
+    _snappy_literal(out, data, literal, size)
+    return bytes(out)
+
+
+def _snappy_literal(out: bytearray, data: bytes, start: int, end: int) -> None:
+    while start < end:
+        length = min(end - start, 1 << 16)
+        if length <= 60:
+            out.append((length - 1) << 2)
+        else:
+            out += bytes((61 << 2,)) + struct.pack("<H", length - 1)
+        out += data[start:start + length]
+        start += length
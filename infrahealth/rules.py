@@ -0,0 +1,220 @@
+import json
+import re
+import fnmatch
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple, Union
+import logging
+
+from .alert import Check
+
+SCOPES = ("server", "container")
+
+# Display label and unit used in alert lines for well-known metrics.
+METRIC_LABELS = {
+    "cpu_percent": ("CPU", "%"),
+    "memory_percent": ("Memory", "%"),
+    "disk_percent": ("Disk", "%"),
+    "restart_count": ("Restarts", ""),
+}
+
+# Health record fields that are not numbers and so cannot carry a threshold.
+NON_NUMERIC_METRICS = {"name", "status", "networks", "app_health", "app_probe"}
+
+RULE_KEYS = {"name", "scope", "metric", "container", "threshold", "for_seconds", "hysteresis", "label", "unit"}
+
+# Container names whose matching rules are remembered between evaluations.
+MATCH_CACHE_SIZE = 4096
+
+Rule = namedtuple("Rule", ["id", "scope", "metric", "container", "threshold", "for_seconds",
+                           "hysteresis", "label", "unit"])
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+def load_rules(path: str, defaults: Optional[Dict] = None) -> "RuleSet":
+    """
+    Load and compile a rule file.
+
+    Files ending in ``.yml`` or ``.yaml`` are read with PyYAML, anything
+    else as JSON.
+
+    Args:
+        path: Rule file path.
+        defaults: Fallback ``for_seconds`` and ``hysteresis`` for rules
+            that set neither themselves nor in the file's ``defaults``.
+
+    Raises:
+        ValueError: If the file is not a valid rule file.
+        RuntimeError: If a YAML file is given and PyYAML is not installed.
+    """
+    with open(path) as f:
+        text = f.read()
+    if path.endswith((".yml", ".yaml")):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("PyYAML is required to read YAML rule files. Install it with: pip install pyyaml")
+        try:
+            spec = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid rule file {path}: {str(e)}")
+    else:
+        try:
+            spec = json.loads(text)
+        except ValueError as e:
+            raise ValueError(f"Invalid rule file {path}: {str(e)}")
+    rules = RuleSet.from_spec(spec, defaults)
+    logging.info("Loaded %d rules from %s", len(rules.rules), path)
+    return rules
+
+
+def parse_rules(spec: Union[Dict, List], defaults: Optional[Dict] = None) -> List[Rule]:
+    """
+    Validate a parsed rule file.
+
+    The spec is either a list of rules or a dict with ``rules`` and optional
+    ``defaults``. Each rule needs a ``metric`` and a ``threshold``; ``scope``
+    is ``container`` (the default) or ``server``, and ``container`` is a
+    glob over container names that defaults to ``*``. Rule ids default to
+    the metric name, followed by ``@`` and the container glob unless it is
+    ``*``, and must be unique within a scope.
+
+    Raises:
+        ValueError: If the spec is malformed.
+    """
+    fallback = {"for_seconds": 0, "hysteresis": 0}
+    fallback.update(defaults or {})
+    if isinstance(spec, dict):
+        fallback.update(spec.get("defaults") or {})
+        spec = spec.get("rules")
+    if not isinstance(spec, list):
+        raise ValueError("Rule file must contain a list of rules")
+    rules, seen = [], set()
+    for index, entry in enumerate(spec):
+        where = f"rule {index + 1}"
+        if not isinstance(entry, dict):
+            raise ValueError(f"{where}: expected a mapping")
+        unknown = set(entry) - RULE_KEYS
+        if unknown:
+            raise ValueError(f"{where}: unknown keys {', '.join(sorted(unknown))}")
+        metric = entry.get("metric")
+        if not isinstance(metric, str) or not metric:
+            raise ValueError(f"{where}: 'metric' is required")
+        if metric in NON_NUMERIC_METRICS:
+            raise ValueError(f"{where}: '{metric}' is not a numeric metric")
+        scope = entry.get("scope", "container")
+        if scope not in SCOPES:
+            raise ValueError(f"{where}: scope must be one of {', '.join(SCOPES)}")
+        container = entry.get("container", "*")
+        if not isinstance(container, str):
+            raise ValueError(f"{where}: 'container' must be a string")
+        values = {}
+        for key in ("threshold", "for_seconds", "hysteresis"):
+            value = entry.get(key, fallback.get(key))
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"{where}: '{key}' must be a number")
+            values[key] = value
+        if values["for_seconds"] < 0 or values["hysteresis"] < 0:
+            raise ValueError(f"{where}: 'for_seconds' and 'hysteresis' must not be negative")
+        rule_id = str(entry.get("name", metric if container == "*" else f"{metric}@{container}"))
+        if (scope, rule_id) in seen:
+            raise ValueError(f"{where}: duplicate rule id '{rule_id}'; give rules on the same metric and containers "
+                             f"a name")
+        seen.add((scope, rule_id))
+        label, unit = METRIC_LABELS.get(metric, (metric, ""))
+        rules.append(Rule(rule_id, scope, metric, container, values["threshold"], values["for_seconds"],
+                          values["hysteresis"], entry.get("label", label), entry.get("unit", unit)))
+    return rules
+
+
+class RuleSet:
+    """
+    Threshold rules compiled into an index for fast evaluation.
+
+    Container rules are indexed by the literal part of their name glob: exact
+    names go into a dict, and globs are bucketed by the text before their
+    first wildcard, so a container only tests the rules whose prefix it
+    starts with. The matching rules for each container name are cached,
+    grouped by metric, so evaluating a snapshot costs one lookup per
+    container plus one check per matching rule.
+    """
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = list(rules)
+        self._server = _group_by_metric(r for r in self.rules if r.scope == "server")
+        self._exact: Dict[str, List[Tuple[int, Rule]]] = {}
+        self._prefixed: Dict[str, List[Tuple[int, Rule, "re.Pattern"]]] = {}
+        for order, rule in enumerate(self.rules):
+            if rule.scope != "container":
+                continue
+            wildcard = _GLOB_CHARS.search(rule.container)
+            if wildcard is None:
+                self._exact.setdefault(rule.container, []).append((order, rule))
+            else:
+                prefix = rule.container[:wildcard.start()]
+                pattern = re.compile(fnmatch.translate(rule.container))
+                self._prefixed.setdefault(prefix, []).append((order, rule, pattern))
+        self._prefix_lengths = sorted({len(prefix) for prefix in self._prefixed})
+        self._matches: Dict[str, List[Tuple[str, List[Rule]]]] = {}
+
+    @classmethod
+    def from_spec(cls, spec: Union[Dict, List], defaults: Optional[Dict] = None) -> "RuleSet":
+        """Validate and compile a parsed rule file."""
+        return cls(parse_rules(spec, defaults))
+
+    def matching(self, name: str) -> List[Tuple[str, List[Rule]]]:
+        """Return the rules matching a container name, grouped by metric in rule order."""
+        groups = self._matches.get(name)
+        if groups is not None:
+            return groups
+        candidates = list(self._exact.get(name, ()))
+        for length in self._prefix_lengths:
+            if length > len(name):
+                break
+            for order, rule, pattern in self._prefixed.get(name[:length], ()):
+                if pattern.match(name):
+                    candidates.append((order, rule))
+        candidates.sort(key=lambda candidate: candidate[0])
+        groups = _group_by_metric(rule for _, rule in candidates)
+        if len(self._matches) >= MATCH_CACHE_SIZE:
+            self._matches.clear()
+        self._matches[name] = groups
+        return groups
+
+    def checks(self, health_data) -> List[Check]:
+        """
+        Build checks for every rule matching a health sample.
+
+        Args:
+            health_data: Server health dict or list of container health dicts.
+
+        Returns:
+            List of checks, whether or not they breach their thresholds.
+            Metrics missing from the sample or not numeric are skipped.
+        """
+        checks = []
+        if isinstance(health_data, list):  # Docker metrics
+            for container in health_data:
+                subject = f"Container {container['name']}"
+                _append_checks(checks, subject, container, self.matching(container["name"]))
+        else:  # Server metrics
+            _append_checks(checks, "Server", health_data, self._server)
+        return checks
+
+
+def _group_by_metric(rules) -> List[Tuple[str, List[Rule]]]:
+    groups: Dict[str, List[Rule]] = {}
+    for rule in rules:
+        groups.setdefault(rule.metric, []).append(rule)
+    return list(groups.items())
+
+
+def _append_checks(checks: List[Check], subject: str, sample: Dict,
+                   groups: List[Tuple[str, List[Rule]]]) -> None:
+    for metric, rules in groups:
+        value = sample.get(metric)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        for rule in rules:
+            checks.append(Check(f"{subject}/{rule.id}", subject, rule.label, value, rule.unit,
+                                rule.threshold, rule.for_seconds, rule.hysteresis))
@@ -0,0 +1,433 @@
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+import logging
+
+# Base seconds between samples of each collector.
+DEFAULT_INTERVALS = {
+    "cpu": 5.0,
+    "memory": 10.0,
+    "disk": 60.0,
+    "network": 10.0,
+    "processes": 15.0,
+    "docker": 10.0,
+    "probes": 30.0,
+}
+COLLECTORS = tuple(DEFAULT_INTERVALS)
+SERVER_COLLECTORS = ("cpu", "memory", "disk", "network", "processes")
+
+# Each run is rescheduled up to this fraction of its interval early or late.
+DEFAULT_JITTER = 0.1
+# Fraction of one CPU that sampling may use before every interval is stretched.
+DEFAULT_CPU_BUDGET = 0.02
+
+# Metrics whose values drive adaptation, and the level each alerts at.
+DEFAULT_THRESHOLDS = {"cpu_percent": 80.0, "memory_percent": 80.0, "disk_percent": 90.0}
+# Intervals adapt between the base interval divided and multiplied by this.
+ADAPT_RANGE = 4.0
+# A value within this many points of its threshold is sampled at the fastest rate.
+NEAR_MARGIN = 10.0
+# Change in points between two samples that counts as changing quickly, or as idle.
+FAST_CHANGE = 10.0
+IDLE_CHANGE = 1.0
+# Factor an idle interval grows by per sample, and a steady one moves back
+# towards the base interval by. Near a threshold or on a fast change the
+# interval halves instead.
+STEP = 1.5
+
+# Weight of the latest run in each collector's average CPU cost.
+COST_WEIGHT = 0.2
+
+
+class AdaptiveInterval:
+    """
+    Pick the next sampling interval of one series from its recent values.
+
+    While any value is within ``NEAR_MARGIN`` points of its threshold or
+    moved by ``FAST_CHANGE`` points or more since the previous sample, the
+    interval halves, down to the base interval over ``ADAPT_RANGE``. While
+    every value moves less than ``IDLE_CHANGE`` points it grows by ``STEP``,
+    up to the base interval times ``ADAPT_RANGE``. Otherwise it returns
+    towards the base interval. Values are keyed by metric name, optionally
+    prefixed by a subject (``web-1/cpu_percent``); keys without a threshold
+    are ignored.
+    """
+
+    __slots__ = ("base", "min_interval", "max_interval", "thresholds", "interval", "reason", "_previous")
+
+    def __init__(self, base: float, thresholds: Optional[Dict[str, float]] = None,
+                 min_interval: Optional[float] = None, max_interval: Optional[float] = None):
+        self.base = base
+        self.min_interval = min_interval if min_interval is not None else base / ADAPT_RANGE
+        self.max_interval = max_interval if max_interval is not None else base * ADAPT_RANGE
+        self.thresholds = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+        self.interval = base
+        self.reason = "steady"
+        self._previous: Dict[str, float] = {}
+
+    def observe(self, values: Dict[str, float]) -> float:
+        """Update from one sample's values and return the next interval."""
+        near = False
+        change = None
+        current = {}
+        for key, value in values.items():
+            threshold = self.thresholds.get(key.rsplit("/", 1)[-1])
+            if threshold is None or value is None:
+                continue
+            current[key] = value
+            if value >= threshold - NEAR_MARGIN:
+                near = True
+            previous = self._previous.get(key)
+            if previous is not None:
+                change = max(change or 0.0, abs(value - previous))
+        self._previous = current
+        if near or (change is not None and change >= FAST_CHANGE):
+            self.reason = "near_threshold" if near else "changing"
+            self.interval = max(self.min_interval, self.interval / 2)
+        elif change is not None and change < IDLE_CHANGE:
+            self.reason = "idle"
+            self.interval = min(self.max_interval, self.interval * STEP)
+        else:
+            self.reason = "steady"
+            if self.interval < self.base:
+                self.interval = min(self.base, self.interval * STEP)
+            else:
+                self.interval = max(self.base, self.interval / STEP)
+        return self.interval
+
+
+class _Task:
+    __slots__ = ("name", "sample", "values", "adaptive", "latest", "collected_at", "next_due", "cost",
+                 "runs", "errors", "scheduled_interval")
+
+    def __init__(self, name, sample, values, adaptive):
+        self.name = name
+        self.sample = sample
+        self.values = values
+        self.adaptive = adaptive
+        self.latest = None
+        self.collected_at: Optional[float] = None
+        self.next_due = 0.0
+        self.cost = 0.0
+        self.runs = 0
+        self.errors = 0
+        self.scheduled_interval = adaptive.base
+
+
+class Scheduler:
+    """
+    Run each collector on its own adaptive, jittered interval.
+
+    Collectors run one at a time on a single thread and keep their latest
+    result, which readers take without collecting anything. After each run
+    the collector's interval adapts to its values (see
+    ``AdaptiveInterval``), and the next run is moved up to ``jitter`` of
+    that interval early or late so a fleet started together drifts apart.
+    The first runs after start are spread at random over each interval for
+    the same reason.
+
+    The CPU time each run takes is averaged per collector. When the
+    projected total, the sum of each collector's cost divided by its
+    interval, is over ``cpu_budget`` (a fraction of one CPU), every interval
+    is stretched by the same factor, so sampling never uses more.
+    """
+
+    def __init__(self, jitter: float = DEFAULT_JITTER, cpu_budget: float = DEFAULT_CPU_BUDGET,
+                 clock: Callable[[], float] = time.monotonic,
+                 cpu_clock: Callable[[], float] = time.process_time,
+                 rng: Optional[random.Random] = None):
+        self.jitter = jitter
+        self.cpu_budget = cpu_budget
+        self._clock = clock
+        self._cpu_clock = cpu_clock
+        self._random = rng or random.Random()
+        self._tasks: Dict[str, _Task] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, name: str, sample: Callable[[], object], interval: float,
+            values: Optional[Callable[[object], Dict[str, float]]] = None,
+            thresholds: Optional[Dict[str, float]] = None, adaptive: bool = True) -> None:
+        """
+        Add a collector.
+
+        Args:
+            name: Name the collector's result is read back by.
+            sample: Callable returning a fresh result.
+            interval: Base seconds between runs.
+            values: Callable mapping a result to the values its interval
+                adapts to. Defaults to the result itself, for dict results.
+            thresholds: Alert level of each metric. Defaults to
+                ``DEFAULT_THRESHOLDS``.
+            adaptive: If False, the collector keeps its base interval.
+        """
+        if adaptive:
+            pacing = AdaptiveInterval(interval, thresholds)
+        else:
+            pacing = AdaptiveInterval(interval, {}, min_interval=interval, max_interval=interval)
+        task = _Task(name, sample, values or _numeric_values, pacing)
+        task.next_due = self._clock()
+        with self._lock:
+            self._tasks[name] = task
+
+    def start(self) -> None:
+        """Run due collectors on a background thread until stopped."""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, name="infrahealth-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread after its current run."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def run_pending(self) -> List[str]:
+        """
+        Run every collector that is due, earliest first.
+
+        Returns:
+            The names of the collectors run.
+        """
+        now = self._clock()
+        with self._lock:
+            due = sorted((task for task in self._tasks.values() if task.next_due <= now),
+                         key=lambda task: task.next_due)
+        for task in due:
+            self._run(task)
+        return [task.name for task in due]
+
+    def seconds_until_due(self) -> float:
+        """Seconds until the next collector is due, zero if one already is."""
+        with self._lock:
+            if not self._tasks:
+                return 1.0
+            next_due = min(task.next_due for task in self._tasks.values())
+        return max(0.0, next_due - self._clock())
+
+    def latest(self, name: str):
+        """Return a collector's latest result, or None before its first successful run."""
+        with self._lock:
+            task = self._tasks.get(name)
+            return task.latest if task is not None else None
+
+    def load(self) -> float:
+        """Projected CPU use of sampling at the adapted intervals, as a fraction of one CPU."""
+        with self._lock:
+            return _load(self._tasks.values())
+
+    def state(self) -> List[Dict]:
+        """
+        Describe each collector's schedule.
+
+        Returns:
+            One dict per collector with ``collector``, ``interval`` (seconds
+            until the run after the latest, before jitter), ``base_interval``,
+            ``reason`` (``near_threshold``, ``changing``, ``idle`` or
+            ``steady``), ``cost_seconds`` (average CPU seconds per run),
+            ``runs`` and ``errors``.
+        """
+        with self._lock:
+            return [{"collector": task.name, "interval": task.scheduled_interval,
+                     "base_interval": task.adaptive.base, "reason": task.adaptive.reason,
+                     "cost_seconds": task.cost, "runs": task.runs, "errors": task.errors}
+                    for task in self._tasks.values()]
+
+    def _loop(self) -> None:
+        while not self._stopped.is_set():
+            self.run_pending()
+            self._stopped.wait(self.seconds_until_due())
+
+    def _run(self, task: _Task) -> None:
+        cpu_start = self._cpu_clock()
+        try:
+            result = task.sample()
+            error = None
+        except Exception as e:
+            result, error = None, e
+            logging.error("Failed to sample %s: %s", task.name, str(e))
+        cost = self._cpu_clock() - cpu_start
+        values = {}
+        if error is None:
+            try:
+                values = task.values(result)
+            except Exception as e:
+                logging.error("Failed to read %s values: %s", task.name, str(e))
+        now = self._clock()
+        with self._lock:
+            if error is None:
+                task.latest = result
+                task.collected_at = now
+            else:
+                task.errors += 1
+            task.cost = cost if task.runs == 0 else task.cost + COST_WEIGHT * (cost - task.cost)
+            first = task.runs == 0
+            task.runs += 1
+            interval = task.adaptive.observe(values) if error is None else task.adaptive.interval
+            load = _load(self._tasks.values())
+            if self.cpu_budget > 0 and load > self.cpu_budget:
+                interval *= load / self.cpu_budget
+            task.scheduled_interval = interval
+            if first:
+                # Spread the second run over the whole interval so collectors
+                # on many hosts, started together, do not stay in step.
+                task.next_due = now + interval * self._random.random()
+            else:
+                task.next_due = now + interval * (1 + self._random.uniform(-self.jitter, self.jitter))
+
+
+def _load(tasks) -> float:
+    return sum(task.cost / task.adaptive.interval for task in tasks if task.adaptive.interval > 0)
+
+
+def _numeric_values(result) -> Dict[str, float]:
+    if not isinstance(result, dict):
+        return {}
+    return {key: value for key, value in result.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)}
+
+
+def container_values(containers: List[Dict]) -> Dict[str, float]:
+    """Map container records to ``{"<name>/<metric>": value}`` for adaptation."""
+    values = {}
+    for container in containers or []:
+        for key, value in _numeric_values(container).items():
+            values[f"{container['name']}/{key}"] = value
+    return values
+
+
+class ContainerSampler:
+    """
+    Sample each container on its own adaptive interval.
+
+    Called on every scheduler tick, it collects only the containers that
+    are due, so a container near a threshold is sampled up to
+    ``ADAPT_RANGE`` times as often as the base interval while idle ones are
+    sampled up to that many times less often. It returns the latest record
+    of every container still running; a container whose latest sample
+    failed is left out until it is sampled again, rather than reported
+    with stale values.
+    """
+
+    def __init__(self, list_containers: Callable[[], List], collect: Callable[[List], List[Dict]],
+                 interval: float = DEFAULT_INTERVALS["docker"], thresholds: Optional[Dict[str, float]] = None,
+                 jitter: float = DEFAULT_JITTER, clock: Callable[[], float] = time.monotonic,
+                 rng: Optional[random.Random] = None):
+        """
+        Args:
+            list_containers: Callable returning the running containers,
+                each with ``id`` and ``name`` attributes.
+            collect: Callable collecting records for a list of containers.
+            interval: Base seconds between samples of one container.
+        """
+        self.interval = interval
+        self.thresholds = thresholds
+        self.jitter = jitter
+        self._list_containers = list_containers
+        self._collect = collect
+        self._clock = clock
+        self._random = rng or random.Random()
+        self._pacing: Dict[str, AdaptiveInterval] = {}
+        self._due: Dict[str, float] = {}
+        self._records: Dict[str, Dict] = {}
+
+    @property
+    def tick(self) -> float:
+        """Seconds between calls needed to sample containers at their fastest rate."""
+        return self.interval / ADAPT_RANGE
+
+    def __call__(self) -> List[Dict]:
+        containers = self._list_containers()
+        now = self._clock()
+        due = [container for container in containers if self._due.get(container.id, now) <= now]
+        by_name = {container.name: container for container in due}
+        collected = self._collect(due) if due else []
+        now = self._clock()
+        for record in collected:
+            container = by_name.get(record.get("name"))
+            if container is None:
+                continue
+            pacing = self._pacing.get(container.id)
+            if pacing is None:
+                pacing = self._pacing[container.id] = AdaptiveInterval(self.interval, self.thresholds)
+            interval = pacing.observe(_numeric_values(record))
+            self._records[container.id] = record
+            self._due[container.id] = now + interval * (1 + self._random.uniform(-self.jitter, self.jitter))
+        for container in due:
+            if container.id not in self._due or self._due[container.id] <= now:
+                # Failed or timed out: try again after the base interval.
+                self._due[container.id] = now + self.interval
+                self._records.pop(container.id, None)
+        running = {container.id for container in containers}
+        for state in (self._pacing, self._due, self._records):
+            for container_id in [key for key in state if key not in running]:
+                del state[container_id]
+        return [self._records[container.id] for container in containers if container.id in self._records]
+
+    def intervals(self) -> Dict[str, float]:
+        """Return the current interval of each sampled container, by container ID."""
+        return {container_id: pacing.interval for container_id, pacing in self._pacing.items()}
+
+
+class ScheduledSources:
+    """
+    Server and container sources read from a scheduler's latest results.
+
+    ``server_health`` merges the server collectors into the dict
+    ``get_server_health`` returns, and ``containers`` merges container
+    records with the latest probe results by name. Neither collects.
+    """
+
+    def __init__(self, scheduler: Scheduler):
+        self.scheduler = scheduler
+
+    def server_health(self) -> Optional[Dict]:
+        """Return the merged server sample, or None until CPU, memory and disk have each been sampled."""
+        health = {}
+        for name in SERVER_COLLECTORS:
+            result = self.scheduler.latest(name)
+            if result is not None:
+                health.update(result)
+        if not all(key in health for key in DEFAULT_THRESHOLDS):
+            return None
+        return health
+
+    def containers(self) -> List[Dict]:
+        """Return the latest container records, with probe results merged in."""
+        containers = self.scheduler.latest("docker") or []
+        probes = self.scheduler.latest("probes")
+        if not probes:
+            return containers
+        return [dict(container, **probes[container["name"]]) if container["name"] in probes else container
+                for container in containers]
+
+
+def server_collectors(top: int = 0) -> Dict[str, Callable[[], Dict]]:
+    """
+    Build a sampling callable for each server collector.
+
+    Args:
+        top (int): Number of top processes to sample. Zero leaves out the
+            ``processes`` collector.
+    """
+    import psutil
+    from .health import CpuSampler
+    from .processes import get_top_processes
+    cpu_sampler = CpuSampler()
+
+    def network():
+        counters = psutil.net_io_counters()
+        return {"network_bytes_sent": counters.bytes_sent, "network_bytes_received": counters.bytes_recv}
+
+    collectors = {
+        "cpu": lambda: {"cpu_percent": cpu_sampler.sample()["cpu_percent"]},
+        "memory": lambda: {"memory_percent": psutil.virtual_memory().percent},
+        "disk": lambda: {"disk_percent": psutil.disk_usage("/").percent},
+        "network": network,
+    }
+    if top:
+        collectors["processes"] = lambda: {"top_processes": get_top_processes(top)}
+    return collectors
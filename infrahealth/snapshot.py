@@ -0,0 +1,258 @@
+import json
+import struct
+import sys
+from array import array
+from typing import Dict, IO, Iterable, Iterator, List, Optional
+
+MAGIC = b"IHSNAP01"
+
+# magic, row count, column count.
+HEADER = struct.Struct("<8sIH")
+# name length, kind, count of rows missing the field.
+COLUMN = struct.Struct("<HcI")
+LENGTH = struct.Struct("<I")
+
+# Column kinds: 64-bit ints and floats in arrays, strings in a list, and
+# anything else (nested dicts such as ``networks``) as plain objects.
+INT, FLOAT, STR, OBJECT = b"q", b"d", b"s", b"o"
+
+_json_dumps = None
+
+
+class ContainerSnapshot:
+    """
+    Container health records stored column by column.
+
+    Numeric fields are kept in ``array`` columns (8 bytes a value) rather
+    than one dict of Python floats per container, so keeping many samples
+    in memory, as the agent's history does, costs a fraction of the record
+    dicts. Records are rebuilt as dicts on demand, in the order they were
+    added. A field missing from some records is left out of those records.
+    """
+
+    __slots__ = ("_rows", "_columns", "_kinds", "_missing")
+
+    def __init__(self):
+        self._rows = 0
+        self._columns: Dict[str, object] = {}
+        self._kinds: Dict[str, bytes] = {}
+        self._missing: Dict[str, set] = {}
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "ContainerSnapshot":
+        snapshot = cls()
+        for record in records:
+            snapshot.append(record)
+        return snapshot
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def __iter__(self) -> Iterator[Dict]:
+        return self.records()
+
+    def append(self, record: Dict) -> None:
+        """Add one container record."""
+        row = self._rows
+        for key, value in record.items():
+            kind = self._kinds.get(key)
+            if kind is None:
+                kind = _kind_of(value)
+                self._kinds[key] = kind
+                self._columns[key] = array(kind.decode(), [0] * row) if kind in (INT, FLOAT) else [None] * row
+                if row:
+                    self._missing[key] = set(range(row))
+            elif kind != OBJECT and _kind_of(value) != kind:
+                if kind == INT and _kind_of(value) == FLOAT:
+                    self._columns[key] = array("d", self._columns[key])
+                    kind = self._kinds[key] = FLOAT
+                else:
+                    # Mixed types: fall back to plain objects for this column.
+                    self._columns[key] = list(self._columns[key])
+                    kind = self._kinds[key] = OBJECT
+            self._columns[key].append(value)
+        for key, column in self._columns.items():
+            if len(column) == row:
+                column.append(0 if self._kinds[key] in (INT, FLOAT) else None)
+                self._missing.setdefault(key, set()).add(row)
+        self._rows = row + 1
+
+    def column(self, key: str) -> List:
+        """Return every record's value of a field, with None where it is missing."""
+        values = list(self._columns[key])
+        for row in self._missing.get(key, ()):
+            values[row] = None
+        return values
+
+    def records(self) -> Iterator[Dict]:
+        """Yield the records as dicts."""
+        keys = list(self._columns)
+        columns = [self._columns[key] for key in keys]
+        if not self._missing:
+            for row in range(self._rows):
+                yield {key: column[row] for key, column in zip(keys, columns)}
+            return
+        missing = [self._missing.get(key, ()) for key in keys]
+        for row in range(self._rows):
+            yield {key: column[row] for key, column, absent in zip(keys, columns, missing) if row not in absent}
+
+    def to_bytes(self) -> bytes:
+        """
+        Encode the snapshot in infrahealth's compact binary format.
+
+        Numeric columns are written as packed little-endian arrays, strings
+        as lengths followed by UTF-8 text, and other values as JSON.
+        """
+        parts = [HEADER.pack(MAGIC, self._rows, len(self._columns))]
+        for key, column in self._columns.items():
+            kind = self._kinds[key]
+            name = key.encode()
+            missing = sorted(self._missing.get(key, ()))
+            parts.append(COLUMN.pack(len(name), kind, len(missing)))
+            parts.append(name)
+            parts.append(array("I", missing).tobytes() if sys.byteorder == "little" else _swapped("I", missing))
+            if kind in (INT, FLOAT):
+                parts.append(column.tobytes() if sys.byteorder == "little" else _swapped(kind.decode(), column))
+            elif kind == STR:
+                encoded = [(value or "").encode() for value in column]
+                parts.append(LENGTH.pack(len(encoded)))
+                parts.append(_little(array("I", [len(value) for value in encoded])))
+                parts.extend(encoded)
+            else:
+                data = json.dumps(column, separators=(",", ":")).encode()
+                parts.append(LENGTH.pack(len(data)))
+                parts.append(data)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ContainerSnapshot":
+        """
+        Decode a snapshot written by ``to_bytes``.
+
+        Raises:
+            ValueError: If the data is not a valid snapshot.
+        """
+        try:
+            magic, rows, count = HEADER.unpack_from(data, 0)
+            if magic != MAGIC:
+                raise ValueError("not an infrahealth snapshot")
+            snapshot = cls()
+            snapshot._rows = rows
+            offset = HEADER.size
+            for _ in range(count):
+                name_length, kind, missing_count = COLUMN.unpack_from(data, offset)
+                offset += COLUMN.size
+                key = data[offset:offset + name_length].decode()
+                offset += name_length
+                missing = _read_array("I", data, offset, missing_count)
+                offset += missing_count * 4
+                if kind in (INT, FLOAT):
+                    column = _read_array(kind.decode(), data, offset, rows)
+                    offset += rows * 8
+                elif kind == STR:
+                    (length,) = LENGTH.unpack_from(data, offset)
+                    lengths = _read_array("I", data, offset + LENGTH.size, length)
+                    offset += LENGTH.size + length * 4
+                    column = []
+                    for size in lengths:
+                        column.append(data[offset:offset + size].decode())
+                        offset += size
+                elif kind == OBJECT:
+                    (length,) = LENGTH.unpack_from(data, offset)
+                    column = json.loads(data[offset + LENGTH.size:offset + LENGTH.size + length])
+                    offset += LENGTH.size + length
+                else:
+                    raise ValueError(f"unknown column kind {kind!r}")
+                if len(column) != rows:
+                    raise ValueError(f"column {key} has {len(column)} values for {rows} rows")
+                snapshot._columns[key] = column
+                snapshot._kinds[key] = kind
+                if missing_count:
+                    snapshot._missing[key] = set(missing)
+            return snapshot
+        except (struct.error, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid snapshot: {str(e)}")
+
+    def to_msgpack(self) -> bytes:
+        """
+        Encode the records as a msgpack array of maps.
+
+        Raises:
+            RuntimeError: If msgpack is not installed.
+        """
+        try:
+            import msgpack
+        except ImportError:
+            raise RuntimeError("msgpack is required for msgpack output. Install it with: pip install msgpack")
+        return msgpack.packb(list(self.records()))
+
+
+def _kind_of(value) -> bytes:
+    if isinstance(value, bool):
+        return OBJECT
+    if isinstance(value, int):
+        return INT if -2 ** 63 <= value < 2 ** 63 else OBJECT
+    if isinstance(value, float):
+        return FLOAT
+    if isinstance(value, str):
+        return STR
+    return OBJECT
+
+
+def _little(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _swapped(typecode: str, values) -> bytes:
+    return _little(array(typecode, values))
+
+
+def _read_array(typecode: str, data: bytes, offset: int, count: int) -> array:
+    values = array(typecode)
+    end = offset + count * values.itemsize
+    if end > len(data):
+        raise ValueError("truncated snapshot")
+    values.frombytes(data[offset:end])
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def dumps_compact(value) -> bytes:
+    """
+    Encode a value as compact single-line JSON.
+
+    Uses orjson when it is installed, and the standard library otherwise.
+    """
+    global _json_dumps
+    if _json_dumps is None:
+        try:
+            import orjson
+            _json_dumps = orjson.dumps
+        except ImportError:
+            _json_dumps = lambda data: json.dumps(data, separators=(",", ":")).encode()
+    return _json_dumps(value)
+
+
+def write_ndjson(records: Iterable[Dict], stream: Optional[IO[bytes]] = None) -> int:
+    """
+    Write each record as one JSON line as soon as it is produced.
+
+    Args:
+        records: Records to write; may be a generator yielding them as they
+            are collected.
+        stream: Binary stream to write to. Defaults to standard output.
+
+    Returns:
+        The number of records written.
+    """
+    stream = stream or sys.stdout.buffer
+    written = 0
+    for record in records:
+        stream.write(dumps_compact(record) + b"\n")
+        stream.flush()
+        written += 1
+    return written
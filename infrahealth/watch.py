@@ -0,0 +1,94 @@
+import math
+import time
+import psutil
+from typing import Callable, Dict, Iterator, Optional, Tuple, Any
+from .health import get_server_health
+
+# Cumulative counters and the per-second rate reported for each.
+RATE_KEYS = {
+    "network_bytes_sent": "network_bytes_sent_per_sec",
+    "network_bytes_received": "network_bytes_received_per_sec",
+    "disk_read_bytes": "disk_read_bytes_per_sec",
+    "disk_write_bytes": "disk_write_bytes_per_sec",
+    "disk_read_count": "disk_reads_per_sec",
+    "disk_write_count": "disk_writes_per_sec",
+}
+
+
+def compute_rates(previous: Optional[Dict], current: Dict, elapsed: float) -> Dict[str, float]:
+    """
+    Compute per-interval rates between two samples.
+
+    Args:
+        previous: The previous sample, or None for the first interval.
+        current: The current sample.
+        elapsed: Seconds between the two samples.
+
+    Returns:
+        Dict of per-second rates for the counters in ``RATE_KEYS`` and the
+        change in ``cpu_percent``. Empty for the first interval.
+    """
+    if previous is None or elapsed <= 0:
+        return {}
+    rates = {}
+    for key, rate_key in RATE_KEYS.items():
+        if key in current and key in previous:
+            # Counters reset when an interface or container restarts.
+            rates[rate_key] = max(0.0, (current[key] - previous[key]) / elapsed)
+    if "cpu_percent" in current and "cpu_percent" in previous:
+        rates["cpu_percent_delta"] = current["cpu_percent"] - previous["cpu_percent"]
+    return rates
+
+
+def watch(sample: Callable[[], Any], interval: float, count: Optional[int] = None,
+          clock: Callable[[], float] = time.monotonic,
+          sleep: Callable[[float], None] = time.sleep) -> Iterator[Tuple[Any, Any, float]]:
+    """
+    Call ``sample`` on a fixed schedule and yield consecutive samples.
+
+    Ticks are scheduled from the start time rather than from the end of the
+    previous sample, so slow samples do not make the schedule drift. Ticks
+    missed entirely are skipped.
+
+    Args:
+        sample: Callable returning the current sample.
+        interval: Seconds between ticks.
+        count: Number of samples to take, or None to run until interrupted.
+
+    Yields:
+        Tuples of (current sample, previous sample or None, seconds elapsed).
+    """
+    next_tick = clock()
+    previous, previous_time = None, None
+    taken = 0
+    while count is None or taken < count:
+        sampled_at = clock()
+        current = sample()
+        elapsed = sampled_at - previous_time if previous_time is not None else 0.0
+        yield current, previous, elapsed
+        previous, previous_time = current, sampled_at
+        taken += 1
+        if count is not None and taken >= count:
+            break
+        next_tick += interval
+        now = clock()
+        if now > next_tick:
+            next_tick += math.ceil((now - next_tick) / interval) * interval
+        sleep(next_tick - now)
+
+
+def sample_server(detailed: bool = False, devices: bool = False) -> Dict:
+    """Sample server health together with the I/O counters watch mode reports as rates."""
+    health = get_server_health(detailed=detailed, devices=devices)
+    net = psutil.net_io_counters()
+    health["network_bytes_sent"] = net.bytes_sent
+    health["network_bytes_received"] = net.bytes_recv
+    disk = psutil.disk_io_counters()
+    if disk is not None:
+        health.update({
+            "disk_read_bytes": disk.read_bytes,
+            "disk_write_bytes": disk.write_bytes,
+            "disk_read_count": disk.read_count,
+            "disk_write_count": disk.write_count
+        })
+    return health
@@ -0,0 +1,136 @@
+import os
+import socket
+import tempfile
+import time
+import pytest
+from infrahealth.agent import Agent, agent_snapshot, query_agent
+from infrahealth.snapshot import ContainerSnapshot
+
+
+@pytest.fixture
+def socket_path():
+    # pytest's tmp_path can exceed the length limit of a Unix socket path.
+    with tempfile.TemporaryDirectory(prefix="ih") as directory:
+        yield os.path.join(directory, "agent.sock")
+
+
+def _server_source():
+    calls = []
+
+    def sample():
+        calls.append(None)
+        return {"cpu_percent": 10.0 + len(calls), "memory_percent": 40.0, "disk_percent": 50.0,
+                "load_avg_1min": 0.5}
+    return sample
+
+
+def _docker_source():
+    return [{"name": "web", "status": "running", "cpu_percent": 5.0, "memory_percent": 20.0,
+             "restart_count": 1}]
+
+
+def _wait_for(source, socket_path):
+    deadline = time.monotonic() + 5.0
+    while time.monotonic() < deadline:
+        if query_agent("latest", socket_path=socket_path, source=source) is not None:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"Agent never collected {source}")
+
+
+@pytest.fixture
+def agent(socket_path):
+    agent = Agent(socket_path, interval=0.05, history_size=3,
+                  server_source=_server_source(), docker_source=_docker_source)
+    agent.start()
+    _wait_for("server", socket_path)
+    _wait_for("docker", socket_path)
+    yield agent
+    agent.stop()
+
+
+def test_agent_serves_latest_samples(agent, socket_path):
+    """Test checks are answered from the agent's latest samples."""
+    detailed = agent_snapshot("server", detailed=True, socket_path=socket_path)
+    assert detailed["load_avg_1min"] == 0.5
+    assert agent_snapshot("server", detailed=False, socket_path=socket_path).keys() == {
+        "cpu_percent", "memory_percent", "disk_percent"}
+    assert agent_snapshot("docker", detailed=False, socket_path=socket_path) == [
+        {"name": "web", "status": "running", "cpu_percent": 5.0, "memory_percent": 20.0}]
+    assert agent_snapshot("docker", detailed=True, socket_path=socket_path)[0]["restart_count"] == 1
+    assert oct(os.stat(socket_path).st_mode & 0o777) == oct(0o600)
+
+
+def test_agent_keeps_bounded_history(agent, socket_path):
+    """Test the history holds at most history_size samples, oldest first."""
+    deadline = time.monotonic() + 5.0
+    while len(query_agent("history", socket_path=socket_path, source="server")["history"]) < 3:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    history = query_agent("history", socket_path=socket_path, source="server")["history"]
+    assert len(history) == 3
+    assert [entry["collected_at"] for entry in history] == sorted(entry["collected_at"] for entry in history)
+    latest = query_agent("history", socket_path=socket_path, source="server", limit=1)["history"]
+    assert len(latest) == 1
+
+
+def test_agent_keeps_docker_history_in_columns(agent, socket_path):
+    """Test container history is held as columnar snapshots and served as records."""
+    with agent._lock:
+        assert all(isinstance(entry["data"], ContainerSnapshot) for entry in agent._history["docker"])
+    history = query_agent("history", socket_path=socket_path, source="docker")["history"]
+    assert history and all(entry["data"] == _docker_source() for entry in history)
+
+
+def test_agent_answers_several_requests_per_connection(agent, socket_path):
+    """Test a client can keep one connection open for repeated queries."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        reader = sock.makefile("rb")
+        for _ in range(3):
+            sock.sendall(b'{"query":"latest","source":"server"}\n')
+            assert b'"ok":true' in reader.readline()
+        sock.sendall(b'not json\n')
+        assert b'"ok":false' in reader.readline()
+        sock.sendall(b'{"query":"latest","source":"disk"}\n')
+        assert b"Unknown source" in reader.readline()
+        reader.close()
+
+
+def test_snapshot_falls_back_without_agent(socket_path):
+    """Test clients get None when no agent is listening, even with a stale socket file."""
+    assert agent_snapshot("server", detailed=False, socket_path=socket_path) is None
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    assert agent_snapshot("server", detailed=False, socket_path=socket_path) is None
+
+    # A new agent replaces the stale socket.
+    agent = Agent(socket_path, interval=0.05, server_source=_server_source(), docker_source=_docker_source)
+    agent.start()
+    try:
+        _wait_for("server", socket_path)
+    finally:
+        agent.stop()
+    assert not os.path.exists(socket_path)
+
+
+def test_second_agent_refuses_live_socket(agent, socket_path):
+    """Test an agent does not take over a socket another agent is serving."""
+    with pytest.raises(RuntimeError, match="already running"):
+        Agent(socket_path, server_source=_server_source(), docker_source=_docker_source).start()
+    assert query_agent("ping", socket_path=socket_path) is not None
+
+
+def test_snapshot_rejects_failed_and_stale_samples(socket_path):
+    """Test collection errors and old samples make clients collect directly."""
+    def broken():
+        raise RuntimeError("Docker is down")
+    agent = Agent(socket_path, interval=0.05, server_source=_server_source(), docker_source=broken)
+    agent.start()
+    try:
+        _wait_for("server", socket_path)
+        assert agent_snapshot("docker", detailed=False, socket_path=socket_path) is None
+        assert agent_snapshot("server", detailed=False, socket_path=socket_path, max_age=1e-9) is None
+    finally:
+        agent.stop()
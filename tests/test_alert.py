@@ -0,0 +1,140 @@
+import smtplib
+import time
+from unittest.mock import patch, MagicMock
+from infrahealth.alert import (send_alert, threshold_checks, AlertEngine, SmtpNotifier,
+                               PENDING, FIRING, RESOLVED)
+
+CONFIG = {
+    "cpu_threshold": 80, "memory_threshold": 80, "restart_threshold": 5,
+    "email_from": "alert@infrahealth.com", "email_to": "admin@infrahealth.com",
+    "smtp_host": "smtp.example.com", "smtp_port": 587,
+    "email_user": "user", "email_password": "pass"
+}
+
+
+class _RecordingNotifier:
+    def __init__(self):
+        self.lines = []
+        self.closed = False
+
+    def notify(self, line):
+        self.lines.append(line)
+
+    def close(self):
+        self.closed = True
+
+
+@patch("smtplib.SMTP")
+def test_send_alert_on_breach(mock_smtp):
+    """Test that a threshold breach sends one email listing the issues."""
+    send_alert([{"name": "web", "cpu_percent": 95.0, "memory_percent": 10.0, "restart_count": 7}], CONFIG)
+    server = mock_smtp.return_value.__enter__.return_value
+    server.login.assert_called_once_with("user", "pass")
+    msg = server.send_message.call_args[0][0]
+    assert msg.get_content().strip() == "Container web: CPU 95.0%\nContainer web: Restarts 7"
+
+
+@patch("smtplib.SMTP")
+def test_send_alert_below_thresholds(mock_smtp):
+    """Test that no email is sent when all metrics are within thresholds."""
+    send_alert({"cpu_percent": 10.0, "memory_percent": 20.0}, CONFIG)
+    mock_smtp.assert_not_called()
+
+
+def test_engine_for_duration_and_dedup():
+    """Test pending -> firing after the for duration, with no repeat notifications."""
+    notifier = _RecordingNotifier()
+    engine = AlertEngine(dict(CONFIG, for_seconds=30), notifier=notifier)
+    hot = {"cpu_percent": 90.0, "memory_percent": 10.0}
+
+    engine.evaluate_health(hot, now=0)
+    assert engine.state("Server/cpu_percent") == PENDING
+    engine.evaluate_health(hot, now=20)
+    assert notifier.lines == []
+    engine.evaluate_health(hot, now=30)
+    assert engine.state("Server/cpu_percent") == FIRING
+    engine.evaluate_health(hot, now=40)
+    engine.evaluate_health(hot, now=50)
+    assert notifier.lines == ["FIRING Server: CPU 90.0%"]
+
+
+def test_engine_pending_resets_when_breach_ends():
+    """Test that a short spike never fires."""
+    notifier = _RecordingNotifier()
+    engine = AlertEngine(dict(CONFIG, for_seconds=30), notifier=notifier)
+    engine.evaluate_health({"cpu_percent": 90.0, "memory_percent": 10.0}, now=0)
+    engine.evaluate_health({"cpu_percent": 50.0, "memory_percent": 10.0}, now=10)
+    engine.evaluate_health({"cpu_percent": 90.0, "memory_percent": 10.0}, now=35)
+    assert engine.state("Server/cpu_percent") == PENDING
+    assert notifier.lines == []
+
+
+def test_engine_hysteresis():
+    """Test that a firing alert only resolves below threshold minus hysteresis."""
+    notifier = _RecordingNotifier()
+    engine = AlertEngine(dict(CONFIG, hysteresis=5), notifier=notifier)
+    engine.evaluate_health({"cpu_percent": 85.0, "memory_percent": 10.0}, now=0)
+    engine.evaluate_health({"cpu_percent": 78.0, "memory_percent": 10.0}, now=1)
+    assert engine.state("Server/cpu_percent") == FIRING
+    engine.evaluate_health({"cpu_percent": 74.0, "memory_percent": 10.0}, now=2)
+    assert engine.state("Server/cpu_percent") == RESOLVED
+    assert notifier.lines == ["FIRING Server: CPU 85.0%", "RESOLVED Server: CPU 74.0%"]
+
+
+def test_engine_resolves_and_forgets_removed_series():
+    """Test a firing container that disappears resolves, and no state is kept for quiet series."""
+    notifier = _RecordingNotifier()
+    engine = AlertEngine(CONFIG, notifier=notifier)
+    engine.evaluate_health([{"name": "web", "cpu_percent": 95.0, "memory_percent": 10.0},
+                            {"name": "db", "cpu_percent": 10.0, "memory_percent": 10.0}], now=0)
+    assert engine.state("Container web/cpu_percent") == FIRING
+    engine.evaluate_health([{"name": "db", "cpu_percent": 10.0, "memory_percent": 10.0}], now=1)
+    assert engine.state("Container web/cpu_percent") is None
+    assert notifier.lines == ["FIRING Container web: CPU 95.0%", "RESOLVED Container web: CPU no longer reported"]
+    engine.evaluate_health([{"name": "db", "cpu_percent": 95.0, "memory_percent": 10.0}], now=2)
+    engine.evaluate_health([{"name": "db", "cpu_percent": 10.0, "memory_percent": 10.0}], now=3)
+    assert engine.state("Container db/cpu_percent") == RESOLVED
+    engine.evaluate_health([{"name": "db", "cpu_percent": 10.0, "memory_percent": 10.0}], now=4)
+    assert engine._states == {}
+
+
+def test_threshold_checks_cover_containers():
+    """Test that each container yields CPU, memory and restart checks."""
+    checks = threshold_checks([{"name": "a", "cpu_percent": 1.0, "memory_percent": 2.0}], CONFIG)
+    assert [c.key for c in checks] == [
+        "Container a/cpu_percent", "Container a/memory_percent", "Container a/restart_count"]
+
+
+@patch("smtplib.SMTP")
+def test_notifier_batches_over_one_connection(mock_smtp):
+    """Test that notifications in one window share an email and connection."""
+    connection = mock_smtp.return_value
+    connection.noop.return_value = (250, b"OK")
+    notifier = SmtpNotifier(CONFIG, batch_window=0.2)
+    notifier.notify("FIRING a")
+    notifier.notify("FIRING b")
+    time.sleep(0.4)
+    notifier.notify("FIRING c")
+    notifier.close()
+
+    assert mock_smtp.call_count == 1
+    connection.login.assert_called_once_with("user", "pass")
+    sent = [call[0][0].get_content().strip() for call in connection.send_message.call_args_list]
+    assert sent == ["FIRING a\nFIRING b", "FIRING c"]
+    connection.quit.assert_called_once()
+
+
+@patch("smtplib.SMTP")
+def test_notifier_reconnects_after_disconnect(mock_smtp):
+    """Test that a dropped connection is reopened for the next batch."""
+    first, second = MagicMock(), MagicMock()
+    first.noop.side_effect = smtplib.SMTPServerDisconnected("gone")
+    mock_smtp.side_effect = [first, second]
+    notifier = SmtpNotifier(CONFIG, batch_window=0.05)
+    notifier.notify("FIRING a")
+    time.sleep(0.2)
+    notifier.notify("FIRING b")
+    notifier.close()
+
+    assert mock_smtp.call_count == 2
+    second.send_message.assert_called_once()
@@ -0,0 +1,141 @@
+import random
+import pytest
+from infrahealth.alert import AlertEngine, FIRING
+from infrahealth.anomaly import AnomalyDetector, P2Quantile, SeriesStats, history_stats
+from infrahealth.history import HistoryStore
+
+
+class _RecordingNotifier:
+    def __init__(self):
+        self.lines = []
+
+    def notify(self, line):
+        self.lines.append(line)
+
+    def close(self):
+        pass
+
+
+def _leaking_series(count=500, seed=1):
+    """Memory creeping up 0.01 points a second, sampled at irregular intervals."""
+    rng = random.Random(seed)
+    times, values, t = [], [], 0.0
+    for _ in range(count):
+        t += rng.uniform(1, 20)
+        times.append(t)
+        values.append(50 + 0.01 * t + rng.gauss(0, 3))
+    return times, values
+
+
+def test_series_stats_tracks_mean_and_trend():
+    """Test the rolling mean, deviation and trend of a noisy rising series."""
+    times, values = _leaking_series()
+    stats = SeriesStats(half_life=600)
+    for t, value in zip(times, values):
+        stats.update(value, t)
+    assert stats.slope == pytest.approx(0.01, rel=0.2)
+    # Noise plus the rise within the window.
+    assert 3 < stats.stddev < 15
+    assert stats.level() == pytest.approx(50 + 0.01 * times[-1], abs=3)
+    assert stats.seconds_to(1000) == pytest.approx((1000 - stats.level()) / stats.slope)
+    assert stats.seconds_to(0) == 0.0
+
+
+def test_p2_quantile_estimates_p95():
+    """Test the streaming estimate lands close to the true 95th percentile."""
+    rng = random.Random(2)
+    quantile = P2Quantile(0.95)
+    assert quantile.value() is None
+    for _ in range(20000):
+        quantile.add(rng.random())
+    assert quantile.value() == pytest.approx(0.95, abs=0.01)
+
+
+def test_detector_learns_hot_containers_and_flags_spikes():
+    """Test a container that always runs hot is normal, and a sudden spike is not."""
+    detector = AnomalyDetector(metrics=("cpu_percent",))
+    for second in range(30):
+        checks = detector.update([{"name": "batch", "cpu_percent": 95.0 + second % 2},
+                                  {"name": "web", "cpu_percent": 10.0 + second % 2}], now=second)
+    assert all(check.value < check.threshold for check in checks)
+    checks = detector.update([{"name": "batch", "cpu_percent": 96.0}, {"name": "web", "cpu_percent": 60.0}], now=30)
+    breaching = [check for check in checks if check.value > check.threshold]
+    assert [check.key for check in breaching] == ["Container web/cpu_percent:anomaly"]
+
+
+def test_detector_warms_up_before_checking():
+    """Test no checks are produced until a series has enough samples."""
+    detector = AnomalyDetector(min_samples=5)
+    assert [detector.update({"cpu_percent": 1.0}, now=t) for t in range(5)] == [[]] * 5
+    assert len(detector.update({"cpu_percent": 1.0}, now=5)) == 1
+
+
+def test_detector_forecasts_disk_filling_up():
+    """Test a disk on course to fill within the horizon raises a forecast alert."""
+    notifier = _RecordingNotifier()
+    engine = AlertEngine({"cpu_threshold": 80, "memory_threshold": 80}, notifier=notifier,
+                         detector=AnomalyDetector(metrics=("disk_percent",)))
+    for hour in range(24):
+        engine.evaluate_health({"cpu_percent": 5.0, "memory_percent": 5.0, "disk_percent": 40.0 + hour * 2},
+                               now=hour * 3600.0)
+    assert engine.state("Server/disk_percent:forecast") == FIRING
+    assert notifier.lines[0].startswith("FIRING Server: Disk forecast (1d) ")
+
+
+def test_flat_noisy_series_does_not_forecast_a_breach():
+    """Test a flat, noisy series never forecasts a breach, however the noise falls."""
+    for seed in range(200):
+        rng = random.Random(seed)
+        detector = AnomalyDetector(metrics=("memory_percent",))
+        for step in range(360):  # 30 minutes, every 5 seconds
+            checks = detector.update({"memory_percent": 60.0 + rng.uniform(-0.5, 0.5)}, now=step * 5.0)
+            forecasts = [check for check in checks if check.key.endswith(":forecast")]
+            if step * 5.0 < 900:
+                assert forecasts == []
+            else:
+                assert forecasts[0].value < 70, (seed, step)
+
+
+def test_detector_checks_use_alert_for_and_hysteresis():
+    """Test anomaly and forecast checks carry for_seconds, and hysteresis in metric units."""
+    detector = AnomalyDetector(metrics=("disk_percent",), for_seconds=60, hysteresis=5,
+                               forecasts={"disk_percent": (100.0, 3600.0)})
+    for step in range(200):
+        checks = detector.update({"disk_percent": 50.0 + (step % 5)}, now=step * 10.0)
+    anomaly, forecast = checks
+    assert anomaly.for_seconds == forecast.for_seconds == 60
+    assert forecast.hysteresis == 5
+    assert anomaly.hysteresis == pytest.approx(5 / detector.series()[0]["stddev"], rel=0.05)
+
+
+def test_detector_bounds_series():
+    """Test idle series are dropped once the series cap is reached."""
+    detector = AnomalyDetector(metrics=("cpu_percent",), max_series=10)
+    detector.update([{"name": f"old-{i}", "cpu_percent": 1.0} for i in range(10)], now=0)
+    detector.update([{"name": f"new-{i}", "cpu_percent": 1.0} for i in range(5)], now=10000)
+    assert sorted(row["container"] for row in detector.series()) == [f"new-{i}" for i in range(5)]
+    # Nothing idle: the least recently updated series makes room.
+    detector.update([{"name": f"more-{i}", "cpu_percent": 1.0} for i in range(6)], now=10001)
+    assert len(detector) == 10
+    assert "new-0" not in {row["container"] for row in detector.series()}
+
+
+def test_history_stats_match_streaming(tmp_path):
+    """Test the vectorized recomputation over recorded history matches the streaming statistics."""
+    pytest.importorskip("numpy")
+    times, values = _leaking_series(300)
+    detector = AnomalyDetector(metrics=("memory_percent",), half_life=600)
+    with HistoryStore(str(tmp_path / "history.bin"), budget_bytes=1024 * 1024) as store:
+        for t, value in zip(times, values):
+            store.append([{"name": "web", "memory_percent": value}], timestamp=1000.0 + t)
+            store.append({"memory_percent": 10.0}, timestamp=1000.0 + t)
+            detector.update([{"name": "web", "memory_percent": value}], now=1000.0 + t)
+        points = store.points(0, 1e12)
+    assert set(points) == {("web", "memory_percent"), ("", "memory_percent")}
+    batch = {row["container"]: row for row in history_stats(points, half_life=600)}
+    streaming = detector.series()[0]
+    for key in ("mean", "stddev", "zscore", "trend_per_second", "seconds_to_limit"):
+        assert batch["web"][key] == pytest.approx(streaming[key], rel=1e-6), key
+    assert batch["web"]["p95"] == pytest.approx(streaming["p95"], rel=0.05)
+    assert batch[""]["stddev"] == pytest.approx(0.0, abs=1e-9)
+    assert batch[""]["trend_per_second"] == pytest.approx(0.0, abs=1e-9)
@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+
+RUNNER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "run.py")
+
+
+def _run(tmp_path, *args):
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(RUNNER)))
+    return subprocess.run([sys.executable, RUNNER, "--containers", "3", "--processes", "20", "--rounds", "2",
+                           "--stats-latency", "0", *args], capture_output=True, text=True, env=env, cwd=tmp_path)
+
+
+def test_benchmark_suite_writes_results(tmp_path):
+    """Test every scenario runs against the fakes and reports machine-readable results."""
+    output = tmp_path / "results.json"
+    result = _run(tmp_path, "--output", str(output))
+    assert result.returncode == 0, result.stderr
+    report = json.loads(output.read_text())
+    assert report["parameters"]["containers"] == 3
+    assert set(report["results"]) == {"docker_api", "docker_adaptive", "docker_cgroup", "processes", "server_health",
+                                      "exporter_scrape", "alert_rules", "anomaly_update", "encode_json",
+                                      "encode_ndjson", "encode_binary", "cli_check_docker", "cli_check_server"}
+    for name, record in report["results"].items():
+        assert record["rounds"] == 2 and record["mean_ms"] > 0, name
+        assert record["peak_memory_bytes"] > 0, name
+
+
+def test_benchmark_compare_flags_regressions(tmp_path):
+    """Test --compare fails when a scenario is slower than the baseline allows."""
+    baseline = {"results": {"alert_rules": {"mean_ms": 1e-6, "peak_memory_bytes": 1e12}}}
+    (tmp_path / "baseline.json").write_text(json.dumps(baseline))
+    result = _run(tmp_path, "--only", "alert_rules", "--compare", str(tmp_path / "baseline.json"))
+    assert result.returncode == 1
+    assert "REGRESSION alert_rules: mean_ms" in result.stderr
+    assert "peak_memory_bytes" not in result.stderr
@@ -0,0 +1,107 @@
+import pytest
+from unittest.mock import MagicMock
+from infrahealth.cgroup import CgroupCollector
+
+CONTAINER_ID = "abc123"
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def _fake_tree(tmp_path, usage_usec=1000000):
+    root = tmp_path / "cgroup"
+    directory = root / "system.slice" / f"docker-{CONTAINER_ID}.scope"
+    directory.mkdir(parents=True)
+    (root / "cgroup.controllers").write_text("cpu io memory\n")
+    (directory / "cpu.stat").write_text(f"usage_usec {usage_usec}\nuser_usec 600000\nsystem_usec 400000\n")
+    (directory / "memory.current").write_text("1000000\n")
+    (directory / "memory.stat").write_text("anon 800000\nfile 200000\ninactive_file 100000\n")
+    (directory / "memory.max").write_text("2000000\n")
+    (directory / "io.stat").write_text("8:0 rbytes=4096 wbytes=8192 rios=1 wios=2 dbytes=0 dios=0\n"
+                                       "8:16 rbytes=4096 wbytes=0 rios=1 wios=0 dbytes=0 dios=0\n")
+    proc = tmp_path / "proc"
+    (proc / "42" / "net").mkdir(parents=True)
+    (proc / "42" / "net" / "dev").write_text(
+        "Inter-|   Receive                                                |  Transmit\n"
+        " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n"
+        "    lo:       0       0    0    0    0     0          0         0        0       0    0    0    0     0       0          0\n"
+        "  eth0:    1500      10    0    0    0     0          0         0     2500      20    0    0    0     0       0          0\n")
+    (proc / "meminfo").write_text("MemTotal:        4000 kB\n")
+    return root, directory, proc
+
+
+def _client():
+    container = MagicMock()
+    container.id = CONTAINER_ID
+    container.name = "web"
+    container.status = "running"
+    container.attrs = {"State": {"Pid": 42}, "RestartCount": 3}
+    client = MagicMock()
+    client.containers.list.return_value = [container]
+    return client
+
+
+def test_collect_reads_cgroup_files(tmp_path):
+    """Test CPU, memory, network and I/O fields read from a fake cgroup tree."""
+    root, directory, proc = _fake_tree(tmp_path)
+    clock = _FakeClock()
+    collector = CgroupCollector(client=_client(), root=str(root), proc_root=str(proc),
+                                clock=clock, sleep=clock.sleep)
+    first = collector.collect(detailed=True)
+    assert first[0]["cpu_percent"] == 0.0  # No usage during the first window
+    assert first[0]["memory_percent"] == 45.0  # (1000000-100000)/2000000*100
+    assert first[0]["network_bytes_sent"] == 2500
+    assert first[0]["network_bytes_received"] == 1500
+    assert first[0]["restart_count"] == 3
+    assert first[0]["disk_read_bytes"] == 8192
+    assert first[0]["disk_write_count"] == 2
+
+    (directory / "cpu.stat").write_text("usage_usec 1500000\n")
+    (directory / "memory.max").write_text("max\n")
+    clock.now += 1.0
+    second = collector.collect()
+    assert second == [{"name": "web", "status": "running", "cpu_percent": 50.0,
+                       "memory_percent": 900000 / 4096000 * 100.0}]
+    collector.close()
+
+
+def test_metadata_is_cached(tmp_path):
+    """Test that the daemon is only listed again once the metadata TTL expires."""
+    root, _, proc = _fake_tree(tmp_path)
+    clock = _FakeClock()
+    client = _client()
+    collector = CgroupCollector(client=client, root=str(root), proc_root=str(proc),
+                                metadata_ttl=30, clock=clock, sleep=clock.sleep)
+    collector.collect()
+    clock.now += 10
+    collector.collect()
+    assert client.containers.list.call_count == 1
+    clock.now += 30
+    collector.collect()
+    assert client.containers.list.call_count == 2
+    collector.close()
+
+
+def test_missing_cgroup_is_skipped(tmp_path):
+    """Test that containers without a cgroup directory are left out."""
+    root, directory, proc = _fake_tree(tmp_path)
+    client = _client()
+    client.containers.list.return_value[0].id = "other"
+    clock = _FakeClock()
+    collector = CgroupCollector(client=client, root=str(root), proc_root=str(proc),
+                                clock=clock, sleep=clock.sleep)
+    assert collector.collect() == []
+
+
+def test_requires_cgroup_v2(tmp_path):
+    """Test that a host without a cgroup v2 mount is rejected."""
+    with pytest.raises(RuntimeError, match="cgroup v2"):
+        CgroupCollector(client=MagicMock(), root=str(tmp_path))
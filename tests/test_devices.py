@@ -0,0 +1,130 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+import infrahealth
+from infrahealth.devices import FilesystemCollector, container_blkio, container_networks
+from infrahealth.docker_health import container_network_totals
+
+Partition = namedtuple("Partition", ["device", "mountpoint", "fstype", "opts"])
+
+USAGE = {"total_bytes": 100, "used_bytes": 40, "free_bytes": 60, "percent": 40.0,
+         "inodes_total": 10, "inodes_used": 1, "inodes_percent": 10.0}
+
+
+def test_hung_mount_does_not_stall_the_check():
+    """Test that a hung mount times out while other mounts are still reported."""
+    release = threading.Event()
+    calls = []
+
+    def usage(path):
+        calls.append(path)
+        if path == "/mnt/nfs":
+            release.wait(5)
+        return USAGE
+
+    mounts = [Partition("/dev/sda1", "/", "ext4", "rw"), Partition("nas:/export", "/mnt/nfs", "nfs4", "rw"),
+              Partition("/dev/sdb1", "/data", "xfs", "rw")]
+    collector = FilesystemCollector(timeout=0.2, partitions=lambda: mounts, usage=usage)
+    try:
+        start = time.perf_counter()
+        first = collector.sample()
+        assert time.perf_counter() - start < 1.0
+        assert [fs.get("percent") for fs in first] == [40.0, None, 40.0]
+        assert "timed out" in first[1]["error"]
+
+        # The stuck query is not piled onto while it is still running.
+        second = collector.sample()
+        assert second[1]["error"] == "not responding"
+        assert calls.count("/mnt/nfs") == 1
+
+        release.set()
+        time.sleep(0.05)
+        assert collector.sample()[1]["percent"] == 40.0
+    finally:
+        release.set()
+        collector.close()
+
+
+def test_network_mounts_are_sampled_and_cannot_starve_the_pool(monkeypatch):
+    """Test nfs4 mounts are in the default mount table and a hung one does not block the others."""
+    import psutil
+    release = threading.Event()
+    monkeypatch.setattr(psutil, "disk_partitions", lambda all=False: [
+        Partition("/dev/sda1", "/", "ext4", "rw"), Partition("proc", "/proc", "proc", "rw"),
+        Partition("tmpfs", "/run", "tmpfs", "rw"), Partition("cgroup2", "/sys/fs/cgroup", "cgroup2", "rw"),
+        Partition("nas:/export", "/mnt/nfs", "nfs4", "rw")] if all else [Partition("/dev/sda1", "/", "ext4", "rw")])
+
+    def usage(path):
+        if path == "/mnt/nfs":
+            release.wait(5)
+        return USAGE
+    collector = FilesystemCollector(timeout=0.2, workers=1, usage=usage)
+    try:
+        first = collector.sample()
+        assert [fs["mountpoint"] for fs in first] == ["/", "/mnt/nfs"]
+        assert "timed out" in first[1]["error"]
+        # The only worker of the first pool is stuck on the nfs mount.
+        second = collector.sample()
+        assert second[0]["percent"] == 40.0
+        assert second[1]["error"] == "not responding"
+    finally:
+        release.set()
+        collector.close()
+
+
+def test_hung_mount_does_not_block_exit():
+    """Test the process exits promptly while a filesystem query is still stuck."""
+    code = ("import time\n"
+            "from types import SimpleNamespace\n"
+            "from infrahealth.devices import FilesystemCollector\n"
+            "mount = SimpleNamespace(device='nas:/export', mountpoint='/mnt/nfs', fstype='nfs4')\n"
+            "collector = FilesystemCollector(timeout=0.1, partitions=lambda: [mount],\n"
+            "                                usage=lambda path: time.sleep(30))\n"
+            "print(collector.sample()[0]['error'])\n")
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(infrahealth.__file__))))
+    start = time.monotonic()
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, timeout=20)
+    assert "timed out" in result.stdout, result.stderr
+    assert time.monotonic() - start < 10
+
+
+def test_mount_table_is_cached():
+    """Test that the mount table is only read again after its TTL."""
+    now = [0.0]
+    reads = []
+
+    def partitions():
+        reads.append(1)
+        return [Partition("/dev/sda1", "/", "ext4", "rw")]
+    collector = FilesystemCollector(mount_ttl=60, partitions=partitions, usage=lambda path: USAGE,
+                                    clock=lambda: now[0])
+    collector.sample()
+    now[0] = 30
+    collector.sample()
+    assert len(reads) == 1
+    now[0] = 61
+    collector.sample()
+    assert len(reads) == 2
+    collector.close()
+
+
+def test_container_networks_and_blkio():
+    """Test that every container network and block device is counted."""
+    stats = {
+        "networks": {"eth0": {"tx_bytes": 100, "rx_bytes": 200}, "eth1": {"tx_bytes": 1, "rx_bytes": 2}},
+        "blkio_stats": {
+            "io_service_bytes_recursive": [{"major": 8, "minor": 0, "op": "read", "value": 4096},
+                                           {"major": 8, "minor": 16, "op": "Read", "value": 1024},
+                                           {"major": 8, "minor": 0, "op": "write", "value": 512}],
+            "io_serviced_recursive": [{"major": 8, "minor": 0, "op": "read", "value": 3}]
+        }
+    }
+    assert container_networks(stats)["eth1"] == {"bytes_sent": 1, "bytes_received": 2}
+    totals = container_network_totals(stats)
+    assert (totals["network_bytes_sent"], totals["network_bytes_received"]) == (101, 202)
+    assert container_blkio(stats) == {"disk_read_bytes": 5120, "disk_write_bytes": 512,
+                                      "disk_read_count": 3, "disk_write_count": 0}
+    assert container_blkio({"blkio_stats": {"io_service_bytes_recursive": None}})["disk_read_bytes"] == 0
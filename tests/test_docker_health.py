@@ -1,6 +1,10 @@
+import math
+import time
+import docker
 import pytest
+import requests
 from unittest.mock import patch, MagicMock
-from infrahealth.docker_health import get_docker_health
+from infrahealth.docker_health import calculate_memory_percent, get_docker_health, stream_docker_health
 
 
 @patch("docker.from_env")
@@ -94,3 +98,131 @@ def test_get_docker_health_error(mock_docker):
         "Docker not running")
     with pytest.raises(RuntimeError, match="Docker not running"):
         get_docker_health()
+
+
+def _slow_container(name, delay):
+    """Build a fake container whose stats call blocks like the daemon does."""
+    container = MagicMock()
+    container.name = name
+    container.status = "running"
+
+    def stats(stream=False):
+        time.sleep(delay)
+        return {
+            "cpu_stats": {
+                "cpu_usage": {"total_usage": 2000},
+                "system_cpu_usage": 10000,
+                "online_cpus": 2
+            },
+            "precpu_stats": {
+                "cpu_usage": {"total_usage": 1000},
+                "system_cpu_usage": 5000
+            },
+            "memory_stats": {"usage": 1000000, "limit": 2000000}
+        }
+    container.stats.side_effect = stats
+    return container
+
+
+@patch("docker.from_env")
+def test_get_docker_health_preserves_order(mock_docker):
+    """Test that concurrent collection keeps the daemon's container order."""
+    containers = [_slow_container(f"c{i}", 0.05 * (5 - i)) for i in range(5)]
+    mock_docker.return_value.containers.list.return_value = containers
+
+    health = get_docker_health(concurrency=5)
+    assert [c["name"] for c in health] == ["c0", "c1", "c2", "c3", "c4"]
+
+
+@patch("docker.from_env")
+def test_get_docker_health_timeout_skips_container(mock_docker):
+    """Test that a container exceeding the per-container timeout is dropped."""
+    containers = [_slow_container("fast", 0.0), _slow_container("hung", 1.0)]
+    mock_docker.return_value.containers.list.return_value = containers
+
+    health = get_docker_health(concurrency=2, timeout=0.1)
+    assert [c["name"] for c in health] == ["fast"]
+
+
+@patch("docker.from_env")
+def test_get_docker_health_request_timeout_skips_container(mock_docker):
+    """Test the client gets the stats timeout, and a container whose request times out is dropped."""
+    hung = _slow_container("hung", 0.0)
+    hung.stats.side_effect = requests.exceptions.ReadTimeout("read timed out")
+    mock_docker.return_value.containers.list.return_value = [hung, _slow_container("fast", 0.0)]
+
+    health = get_docker_health(concurrency=2, timeout=3)
+    assert [c["name"] for c in health] == ["fast"]
+    assert mock_docker.call_args[1]["timeout"] == 3
+
+
+@patch("docker.from_env")
+def test_get_docker_health_queued_containers_keep_their_timeout(mock_docker):
+    """Test containers queued behind slower ones are not timed out by the time spent waiting on those."""
+    containers = [_slow_container(f"c{i}", 0.2) for i in range(3)]
+    mock_docker.return_value.containers.list.return_value = containers
+
+    health = get_docker_health(concurrency=1, timeout=0.3)
+    assert [c["name"] for c in health] == ["c0", "c1", "c2"]
+
+
+@patch("docker.from_env")
+def test_get_docker_health_benchmark_waves(mock_docker):
+    """Benchmark: with fewer workers than containers, wall time follows ceil(count / concurrency)."""
+    delay, concurrency = 0.1, 10
+    for count in (10, 50, 150):
+        containers = [_slow_container(f"c{i}", delay) for i in range(count)]
+        mock_docker.return_value.containers.list.return_value = containers
+        start = time.perf_counter()
+        # Every container finishes within its wave's share of the timeout.
+        health = get_docker_health(concurrency=concurrency, timeout=delay * 3)
+        elapsed = time.perf_counter() - start
+        assert len(health) == count
+        waves = math.ceil(count / concurrency)
+        assert waves * delay <= elapsed < waves * delay * 2 + 0.2, (count, elapsed)
+
+
+@patch("docker.from_env")
+def test_get_docker_health_wave_budget_drops_hung_containers(mock_docker):
+    """Test containers still pending after every wave's share of the timeout are dropped."""
+    containers = [_slow_container(f"c{i}", 0.05) for i in range(4)] + [_slow_container("hung", 2.0)]
+    mock_docker.return_value.containers.list.return_value = containers
+    start = time.perf_counter()
+    health = get_docker_health(concurrency=2, timeout=0.2)
+    # Three waves of 0.2s, not the hung call's 2s.
+    assert time.perf_counter() - start < 1.0
+    assert [c["name"] for c in health] == ["c0", "c1", "c2", "c3"]
+
+
+@patch("docker.from_env")
+def test_stream_docker_health_yields_in_completion_order(mock_docker):
+    """Test streamed containers arrive as they finish, not in listing order."""
+    containers = [_slow_container("slow", 0.3), _slow_container("fast", 0.0)]
+    mock_docker.return_value.containers.list.return_value = containers
+
+    start = time.perf_counter()
+    stream = stream_docker_health(concurrency=2)
+    assert next(stream)["name"] == "fast"
+    assert time.perf_counter() - start < 0.25
+    assert [c["name"] for c in stream] == ["slow"]
+    mock_docker.return_value.close.assert_called_once()
+
+
+@patch("docker.from_env")
+def test_stream_docker_health_skips_timed_out_containers(mock_docker):
+    """Test the stream ends once the timeout passes, leaving hung containers out."""
+    containers = [_slow_container("fast", 0.0), _slow_container("hung", 1.0)]
+    mock_docker.return_value.containers.list.return_value = containers
+
+    assert [c["name"] for c in stream_docker_health(concurrency=2, timeout=0.1)] == ["fast"]
+
+
+def test_memory_percent_prefers_inactive_file_over_cache():
+    """Test the reclaimable cache subtracted from usage, on cgroup v2, v1 and older daemons."""
+    def memory(stat):
+        return {"memory_stats": {"usage": 1000000, "limit": 2000000, "stats": stat}}
+    assert calculate_memory_percent(memory({"inactive_file": 200000, "cache": 600000})) == 40.0
+    assert calculate_memory_percent(memory({"total_inactive_file": 200000, "cache": 600000})) == 40.0
+    assert calculate_memory_percent(memory({"cache": 600000})) == 20.0
+    assert calculate_memory_percent(memory({"inactive_file": 3000000})) == 50.0
+    assert calculate_memory_percent({"memory_stats": {"usage": 1000000, "limit": 2000000}}) == 50.0
@@ -0,0 +1,177 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+import requests
+from infrahealth import docker_stream, inventory
+from infrahealth.docker_stream import StatsStreamManager
+
+
+def _frame(total_usage, system_usage, precpu=True):
+    """Build one streamed stats frame."""
+    return {
+        "cpu_stats": {
+            "cpu_usage": {"total_usage": total_usage},
+            "system_cpu_usage": system_usage,
+            "online_cpus": 2
+        },
+        "precpu_stats": {
+            "cpu_usage": {"total_usage": total_usage - 1000},
+            "system_cpu_usage": system_usage - 5000
+        } if precpu else {"cpu_usage": {"total_usage": 0}},
+        "memory_stats": {"usage": 1000000, "limit": 2000000}
+    }
+
+
+class _FakeEvents:
+    """Event stream that yields queued events until closed."""
+
+    def __init__(self):
+        self._queue = []
+        self._closed = threading.Event()
+        self._cond = threading.Condition()
+
+    def push(self, event):
+        with self._cond:
+            self._queue.append(event)
+            self._cond.notify()
+
+    def close(self):
+        self._closed.set()
+        with self._cond:
+            self._cond.notify()
+
+    def __iter__(self):
+        while not self._closed.is_set():
+            with self._cond:
+                if not self._queue:
+                    self._cond.wait(0.05)
+                    continue
+                event = self._queue.pop(0)
+            yield event
+
+
+def _streaming_container(container_id, name, frames):
+    container = MagicMock()
+    container.id = container_id
+    container.name = name
+    container.status = "running"
+    container.attrs = {"RestartCount": 0}
+    release = threading.Event()
+
+    def stats(stream=True, decode=True):
+        for frame in frames:
+            yield frame
+        # Hold the stream open like the daemon does for a live container.
+        release.wait(5)
+    container.stats.side_effect = stats
+    container.release = release
+    return container
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_snapshot_serves_latest_streamed_sample():
+    """Test that snapshots come from the latest frame of each stream."""
+    container = _streaming_container(
+        "abc", "web", [_frame(1000, 5000, precpu=False), _frame(2000, 10000)])
+    client = MagicMock()
+    client.containers.list.return_value = [container]
+    client.events.return_value = _FakeEvents()
+
+    manager = StatsStreamManager(client=client)
+    manager.start()
+    try:
+        assert _wait_for(lambda: manager.snapshot())
+        assert manager.snapshot() == [{
+            "name": "web", "status": "running",
+            "cpu_percent": 40.0, "memory_percent": 50.0
+        }]
+    finally:
+        container.release.set()
+        manager.stop()
+
+
+def test_events_start_and_stop_subscriptions():
+    """Test that start/die events add and remove container subscriptions."""
+    events = _FakeEvents()
+    container = _streaming_container("def", "worker", [_frame(2000, 10000)])
+    client = MagicMock()
+    client.containers.list.return_value = []
+    client.containers.get.return_value = container
+    client.events.return_value = events
+
+    manager = StatsStreamManager(client=client)
+    manager.start()
+    try:
+        assert manager.snapshot() == []
+        events.push({"status": "start", "id": "def"})
+        assert _wait_for(lambda: [c["name"] for c in manager.snapshot()] == ["worker"])
+        events.push({"status": "die", "id": "def"})
+        assert _wait_for(lambda: manager.snapshot() == [])
+    finally:
+        container.release.set()
+        manager.stop()
+    client.close.assert_not_called()
+
+
+def test_broken_streams_are_reopened(monkeypatch):
+    """Test a stats stream dying with a connection error is resubscribed, and so is the event stream."""
+    monkeypatch.setattr(docker_stream, "STREAM_RETRY_BASE", 0.01)
+    monkeypatch.setattr(inventory, "EVENTS_RETRY_BASE", 0.01)
+    container = _streaming_container("abc", "web", [_frame(2000, 10000)])
+    streamed = container.stats.side_effect
+    attempts = []
+
+    def flaky_stats(stream=True, decode=True):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise requests.exceptions.ConnectionError("connection reset")
+        return streamed(stream, decode)
+    container.stats.side_effect = flaky_stats
+
+    def broken_events():
+        raise requests.exceptions.ChunkedEncodingError("stream closed")
+        yield
+    late = _streaming_container("def", "late", [_frame(2000, 10000)])
+    events = _FakeEvents()
+    client = MagicMock()
+    client.containers.list.side_effect = [[container], [container, late]]
+    client.events.side_effect = [broken_events(), events]
+
+    manager = StatsStreamManager(client=client)
+    manager.start()
+    try:
+        assert _wait_for(lambda: sorted(c["name"] for c in manager.snapshot()) == ["late", "web"])
+        assert len(attempts) == 2
+    finally:
+        container.release.set()
+        late.release.set()
+        events.close()
+        manager.stop()
+
+
+@patch("docker.from_env")
+def test_client_pool_holds_every_stream(mock_docker):
+    """Test the manager's own client has a connection pool sized for its streams and is closed on stop."""
+    container = _streaming_container("abc", "web", [_frame(2000, 10000)])
+    client = mock_docker.return_value
+    client.containers.list.return_value = [container]
+    client.events.return_value = events = _FakeEvents()
+
+    manager = StatsStreamManager(max_streams=64)
+    manager.start()
+    try:
+        assert mock_docker.call_args[1]["max_pool_size"] == 64
+        assert _wait_for(lambda: manager.snapshot())
+    finally:
+        container.release.set()
+        events.close()
+        manager.stop()
+    client.close.assert_called_once()
@@ -0,0 +1,137 @@
+import json
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import pytest
+from infrahealth.fleet import Fleet, read_hosts
+
+STATS = {
+    "cpu_stats": {"cpu_usage": {"total_usage": 2000}, "system_cpu_usage": 10000, "online_cpus": 2},
+    "precpu_stats": {"cpu_usage": {"total_usage": 1000}, "system_cpu_usage": 5000},
+    "memory_stats": {"usage": 1000000, "limit": 2000000, "stats": {"cache": 100000}},
+    "networks": {"eth0": {"tx_bytes": 10, "rx_bytes": 20}}
+}
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _FakeDocker:
+    """Minimal Docker Engine API serving a fixed set of containers."""
+
+    def __init__(self, names, delay=0.0, fail=False):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                path = re.sub(r"^/v[\d.]+", "", self.path.split("?")[0])
+                if path == "/version":
+                    return self._json({"ApiVersion": "1.41", "Version": "24.0.0"})
+                if fake.fail:
+                    return self._json({"message": "daemon error"}, status=500)
+                time.sleep(fake.delay)
+                if path == "/containers/json":
+                    return self._json([{"Id": name} for name in fake.names])
+                match = re.fullmatch(r"/containers/([^/]+)/(json|stats)", path)
+                if match and match.group(1) in fake.names:
+                    if match.group(2) == "stats":
+                        return self._json(STATS)
+                    return self._json({"Id": match.group(1), "Name": "/" + match.group(1),
+                                       "State": {"Status": "running"}, "RestartCount": 1})
+                self._json({"message": "not found"}, status=404)
+
+            def _json(self, body, status=200):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.names, self.delay, self.fail = names, delay, fail
+        self.server = _ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"tcp://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def daemons():
+    started = []
+
+    def start(*args, **kwargs):
+        daemon = _FakeDocker(*args, **kwargs)
+        started.append(daemon)
+        return daemon
+    yield start
+    for daemon in started:
+        daemon.close()
+
+
+def _unused_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"tcp://127.0.0.1:{s.getsockname()[1]}"
+
+
+def test_fleet_checks_hosts_and_records_failures(daemons):
+    """Test results from healthy hosts alongside failing and unreachable ones."""
+    a, b = daemons(["web", "db"]), daemons(["cache"])
+    broken, unreachable = daemons([], fail=True), _unused_url()
+    with Fleet([a.url, b.url, broken.url, unreachable], concurrency=4, host_timeout=5) as fleet:
+        results = {r["host"]: r for r in fleet.check(detailed=True)}
+
+    assert sorted(c["name"] for c in results[a.url]["containers"]) == ["db", "web"]
+    assert results[b.url]["containers"][0]["cpu_percent"] == 40.0
+    assert results[b.url]["containers"][0]["restart_count"] == 1
+    assert results[a.url]["error"] is None
+    assert results[broken.url]["error"] and results[broken.url]["containers"] == []
+    assert results[unreachable]["error"]
+
+
+def test_fleet_streams_results_as_hosts_finish(daemons):
+    """Test that a fast host is reported before a slow one."""
+    slow, fast = daemons(["slow"], delay=0.5), daemons(["fast"])
+    with Fleet([slow.url, fast.url], concurrency=4, host_timeout=5) as fleet:
+        order = [r["host"] for r in fleet.check()]
+    assert order == [fast.url, slow.url]
+
+
+def test_queued_hosts_get_their_own_timeout(daemons):
+    """Test hosts waiting for a worker are not timed out while they wait."""
+    hosts = [daemons([f"c{i}"], delay=0.3) for i in range(3)]
+    with Fleet([host.url for host in hosts], concurrency=1, host_timeout=2) as fleet:
+        results = list(fleet.check(timeout=0.5))
+    assert [r["error"] for r in results] == [None, None, None]
+    assert all(len(r["containers"]) == 1 for r in results)
+
+
+def test_unresponsive_host_fails_after_the_request_timeout(daemons):
+    """Test a hung host fails after the per-request timeout rather than the whole host budget."""
+    hung, healthy = daemons(["hung"], delay=3.0), daemons(["web"])
+    with Fleet([hung.url, healthy.url], concurrency=4, host_timeout=10) as fleet:
+        start = time.monotonic()
+        results = {r["host"]: r for r in fleet.check(timeout=0.3)}
+    assert time.monotonic() - start < 2.0
+    assert results[hung.url]["error"]
+    assert results[healthy.url]["error"] is None
+
+
+def test_read_hosts(tmp_path):
+    """Test parsing a hosts file with comments and duplicates."""
+    path = tmp_path / "hosts.txt"
+    path.write_text("# fleet\ntcp://10.0.0.1:2375\n\nunix:///var/run/docker.sock\ntcp://10.0.0.1:2375\n")
+    assert read_hosts(str(path)) == ["tcp://10.0.0.1:2375", "unix:///var/run/docker.sock"]
+    path.write_text("http://10.0.0.1\n")
+    with pytest.raises(ValueError, match="tcp:// or unix://"):
+        read_hosts(str(path))
@@ -1,24 +1,37 @@
 import pytest
 import psutil
+from collections import namedtuple
 from unittest.mock import patch
-from infrahealth.health import get_server_health
+from infrahealth.health import get_server_health, CpuSampler
 
+cputimes = namedtuple("cputimes", ["user", "system", "idle", "iowait", "steal"])
 
-@patch("psutil.cpu_percent")
+
+def _cpu_times(before, after):
+    """Return a cpu_times side effect yielding two total and per-CPU snapshots."""
+    def cpu_times(percpu=False):
+        snapshot = snapshots.pop(0)
+        return [snapshot, snapshot] if percpu else snapshot
+    snapshots = [before, before, after, after]
+    return cpu_times
+
+
+@patch("psutil.cpu_times")
 @patch("psutil.virtual_memory")
 @patch("psutil.disk_usage")
 def test_get_server_health_basic(mock_disk, mock_memory, mock_cpu):
     """Test fetching basic server health metrics."""
-    mock_cpu.return_value = 10.0
+    mock_cpu.side_effect = _cpu_times(
+        cputimes(100, 50, 850, 0, 0), cputimes(105, 55, 940, 0, 0))
     mock_memory.return_value.percent = 50.0
     mock_disk.return_value.percent = 75.0
 
-    health = get_server_health(detailed=False)
+    health = get_server_health(detailed=False, cpu_sampler=CpuSampler(min_interval=0))
     assert health == {"cpu_percent": 10.0,
                       "memory_percent": 50.0, "disk_percent": 75.0}
 
 
-@patch("psutil.cpu_percent")
+@patch("psutil.cpu_times")
 @patch("psutil.virtual_memory")
 @patch("psutil.disk_usage")
 @patch("psutil.net_io_counters")
@@ -27,7 +40,8 @@ def test_get_server_health_basic(mock_disk, mock_memory, mock_cpu):
 @patch("psutil.getloadavg")
 def test_get_server_health_detailed(mock_loadavg, mock_pids, mock_boot, mock_net, mock_disk, mock_memory, mock_cpu):
     """Test fetching detailed server health metrics."""
-    mock_cpu.return_value = 10.0
+    mock_cpu.side_effect = _cpu_times(
+        cputimes(100, 50, 800, 40, 10), cputimes(104, 52, 890, 42, 12))
     mock_memory.return_value.percent = 50.0
     mock_disk.return_value.percent = 75.0
     mock_net.return_value = type(
@@ -38,11 +52,15 @@ def test_get_server_health_detailed(mock_loadavg, mock_pids, mock_boot, mock_net
 
     with patch("platform.system", return_value="Linux"):
         with patch("time.time", return_value=4600):  # 3600s = 1 hour uptime
-            health = get_server_health(detailed=True)
+            health = get_server_health(detailed=True, cpu_sampler=CpuSampler(min_interval=0))
             assert health == {
-                "cpu_percent": 10.0,
+                "cpu_percent": 8.0,
                 "memory_percent": 50.0,
                 "disk_percent": 75.0,
+                "cpu_user_percent": 4.0,
+                "cpu_system_percent": 2.0,
+                "cpu_iowait_percent": 2.0,
+                "cpu_steal_percent": 2.0,
                 "network_bytes_sent": 1000,
                 "network_bytes_received": 2000,
                 "uptime_seconds": 3600,
@@ -53,9 +71,46 @@ def test_get_server_health_detailed(mock_loadavg, mock_pids, mock_boot, mock_net
             }
 
 
-@patch("psutil.cpu_percent")
+@patch("psutil.cpu_times")
 def test_get_server_health_permission_error(mock_cpu):
     """Test handling of permission errors."""
     mock_cpu.side_effect = PermissionError("Permission denied")
     with pytest.raises(RuntimeError, match="Permission denied. Try running with sudo."):
-        get_server_health()
+        get_server_health(cpu_sampler=CpuSampler())
+
+
+@patch("psutil.cpu_times")
+def test_cpu_sampler_reuses_previous_snapshot(mock_cpu):
+    """Test that only the first sample blocks and later ones use deltas."""
+    snapshots = [cputimes(0, 0, 100, 0, 0), cputimes(10, 0, 190, 0, 0),
+                 cputimes(40, 20, 240, 0, 0)]
+    calls = []
+
+    def cpu_times(percpu=False):
+        calls.append(percpu)
+        snapshot = snapshots[(len(calls) - 1) // 2]
+        return [snapshot] if percpu else snapshot
+    mock_cpu.side_effect = cpu_times
+
+    sampler = CpuSampler(min_interval=0)
+    first = sampler.sample()
+    assert first["cpu_percent"] == 10.0
+    with patch("time.sleep") as mock_sleep:
+        second = sampler.sample()
+        mock_sleep.assert_not_called()
+    assert second["cpu_percent"] == 50.0
+    assert second["per_cpu"] == [50.0]
+    assert second["modes"]["user"] == 30.0
+    assert second["modes"]["system"] == 20.0
+
+
+@patch("psutil.cpu_times")
+def test_cpu_sampler_without_elapsed_time(mock_cpu):
+    """Test that a sample with no elapsed CPU time reuses the last result."""
+    snapshots = [cputimes(0, 0, 100, 0, 0)] * 2 + [cputimes(10, 0, 190, 0, 0)] * 4
+    mock_cpu.side_effect = lambda percpu=False: (
+        [snapshots.pop(0)] if percpu else snapshots.pop(0))
+
+    sampler = CpuSampler(min_interval=0)
+    first = sampler.sample()
+    assert sampler.sample() == first
@@ -0,0 +1,154 @@
+import os
+import time
+import pytest
+from infrahealth import history
+from infrahealth.history import HistoryStore, RECORD, HEADER_SIZE, parse_duration
+
+
+def test_append_and_query_raw(tmp_path):
+    """Test range queries over raw server and container samples."""
+    path = str(tmp_path / "history.bin")
+    with HistoryStore(path, budget_bytes=1024 * 1024) as store:
+        for i in range(100):
+            store.append({"cpu_percent": float(i), "memory_percent": 50.0}, timestamp=1000.0 + i)
+            store.append([{"name": "web", "status": "running", "cpu_percent": 2.0 * i}],
+                         timestamp=1000.0 + i)
+
+        results = store.query(1010, 1019, metric="cpu_percent")
+    by_container = {r["container"]: r for r in results}
+    assert by_container[""]["min"] == 10.0
+    assert by_container[""]["max"] == 19.0
+    assert by_container[""]["avg"] == 14.5
+    assert by_container[""]["p95"] == 19.0
+    assert by_container[""]["count"] == 10
+    assert by_container["web"]["max"] == 38.0
+    assert by_container["web"]["tier"] == "raw"
+
+
+def test_reopen_preserves_data(tmp_path):
+    """Test that series and records survive reopening the store."""
+    path = str(tmp_path / "history.bin")
+    with HistoryStore(path, budget_bytes=1024 * 1024) as store:
+        store.append({"cpu_percent": 5.0}, timestamp=1000.0)
+    with HistoryStore(path, budget_bytes=1024 * 1024) as store:
+        store.append({"cpu_percent": 7.0}, timestamp=1001.0)
+    with HistoryStore(path, readonly=True) as store:
+        [summary] = store.query(0, 2000)
+    assert summary["count"] == 2
+    assert summary["avg"] == 6.0
+
+
+def test_concurrent_writers_do_not_overwrite_each_other(tmp_path):
+    """Test two open stores, as two recording processes hold, interleave appends safely."""
+    path = str(tmp_path / "history.bin")
+    watcher = HistoryStore(path, budget_bytes=1024 * 1024)
+    cron = HistoryStore(path, budget_bytes=1024 * 1024)
+    reader = HistoryStore(path, readonly=True)
+    try:
+        for i in range(10):
+            watcher.append([{"name": "web", "cpu_percent": 10.0}], timestamp=1000.0 + 2 * i)
+            cron.append({"cpu_percent": 50.0, "memory_percent": 60.0}, timestamp=1001.0 + 2 * i)
+        summaries = {(r["container"], r["metric"]): r for r in reader.query(0, 2000)}
+    finally:
+        watcher.close()
+        cron.close()
+        reader.close()
+    assert {key: (r["count"], r["avg"]) for key, r in summaries.items()} == {
+        ("web", "cpu_percent"): (10, 10.0), ("", "cpu_percent"): (10, 50.0), ("", "memory_percent"): (10, 60.0)}
+    with HistoryStore(path, readonly=True) as store:
+        assert len(store.query(0, 2000)) == 3
+
+
+def test_late_writer_stays_in_time_order(tmp_path):
+    """Test a sample stamped before the newest stored one is stored at that time, so range queries stay correct."""
+    path = str(tmp_path / "history.bin")
+    with HistoryStore(path, budget_bytes=1024 * 1024) as agent, \
+            HistoryStore(path, budget_bytes=1024 * 1024) as cli:
+        agent.append({"cpu_percent": 1.0}, timestamp=1000.0)
+        agent.append({"cpu_percent": 2.0}, timestamp=1010.0)
+        # Stamped before the agent's append, but written after it.
+        cli.append({"cpu_percent": 3.0}, timestamp=1005.0)
+        agent.append({"cpu_percent": 4.0}, timestamp=1020.0)
+        assert [r["count"] for r in agent.query(1010, 1020)] == [3]
+        assert agent.query(1000, 1009)[0]["count"] == 1
+        agent.append({"cpu_percent": 5.0})
+        assert agent.query(time.time() - 60)[0]["max"] == 5.0
+
+
+def test_fixed_budget_and_downsampling(tmp_path):
+    """Test that old data falls back to rolled-up tiers within a fixed size."""
+    path = str(tmp_path / "history.bin")
+    budget = 64 * 1024
+    with HistoryStore(path, budget_bytes=budget) as store:
+        raw_capacity = store.capacities[0]
+        # Two hours of one sample per second overflows the raw ring.
+        for i in range(7200):
+            store.append({"cpu_percent": float(i % 60)}, timestamp=float(i))
+        assert os.path.getsize(path) <= budget
+
+        recent = store.query(7200 - 30, 7200)
+        assert recent[0]["tier"] == "raw"
+
+        old = store.query(0, 599)
+        assert old[0]["tier"] == "1m"
+        assert old[0]["count"] == 600
+        assert old[0]["min"] == 0.0
+        assert old[0]["max"] == 59.0
+        assert old[0]["avg"] == 29.5
+    assert raw_capacity < 7200
+
+
+def test_container_churn_does_not_grow_the_series_file(tmp_path, monkeypatch):
+    """Test ids of containers whose records were all overwritten are reused."""
+    monkeypatch.setattr(history, "MIN_SERIES_SWEEP", 8)
+    path = str(tmp_path / "history.bin")
+    budget = HEADER_SIZE + 50 * RECORD.size
+    with HistoryStore(path, budget_bytes=budget) as store:
+        for i in range(500):
+            store.append([{"name": f"job-{i}", "cpu_percent": float(i)}], timestamp=1000.0 + 3600 * i)
+        # Every tier still holds at least the newest container.
+        assert len(store._series) <= 2 * sum(store.capacities)
+    assert os.path.getsize(path + ".series") < 4096
+    with HistoryStore(path, readonly=True) as store:
+        [latest] = store.query(1000.0 + 3600 * 499, 1e12)
+        assert (latest["container"], latest["max"]) == ("job-499", 499.0)
+        assert {r["container"] for r in store.query(0, 1e12)} <= {f"job-{i}" for i in range(450, 500)}
+
+
+def test_rejects_foreign_file(tmp_path):
+    """Test that a file without the history header is refused untouched."""
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"x" * (HEADER_SIZE + RECORD.size))
+    with pytest.raises(RuntimeError, match="not an infrahealth history file"):
+        HistoryStore(str(path))
+    assert path.read_bytes() == b"x" * (HEADER_SIZE + RECORD.size)
+
+
+def test_parse_duration():
+    """Test parsing of duration strings."""
+    assert parse_duration("90") == 90
+    assert parse_duration("15m") == 900
+    assert parse_duration("2h") == 7200
+    assert parse_duration("1d") == 86400
+    with pytest.raises(ValueError):
+        parse_duration("soon")
+
+
+def test_query_benchmark_million_points(tmp_path):
+    """Benchmark: a narrow range query over 1M points reads only that range."""
+    path = str(tmp_path / "history.bin")
+    with HistoryStore(path, budget_bytes=80 * 1024 * 1024) as store:
+        for second in range(100000):
+            store.append([{"name": f"c{i}", "cpu_percent": float(i)} for i in range(10)],
+                         timestamp=float(second))
+    with HistoryStore(path, readonly=True) as store:
+        start = time.perf_counter()
+        results = store.query(99000, 99999, metric="cpu_percent")
+        narrow = time.perf_counter() - start
+        start = time.perf_counter()
+        full = store.query(0, 100000, metric="cpu_percent", container="c3")
+        wide = time.perf_counter() - start
+    assert len(results) == 10
+    assert full[0]["count"] == 100000
+    assert narrow < 0.5
+    assert wide < 10
@@ -0,0 +1,155 @@
+import time
+from unittest.mock import MagicMock, patch
+import pytest
+from infrahealth import instrumentation
+from infrahealth.docker_health import get_docker_health, stream_docker_health
+from infrahealth.instrumentation import Recorder, instrumented, profile_lines, recorder, timed
+
+
+@pytest.fixture
+def enabled():
+    recorder.reset()
+    instrumentation.enable()
+    yield recorder
+    instrumentation.disable()
+    recorder.reset()
+
+
+def _container(name, delay=0.0):
+    container = MagicMock()
+    container.name = name
+    container.status = "running"
+
+    def stats(stream=False):
+        time.sleep(delay)
+        return {
+            "cpu_stats": {"cpu_usage": {"total_usage": 2000}, "system_cpu_usage": 10000, "online_cpus": 2},
+            "precpu_stats": {"cpu_usage": {"total_usage": 1000}, "system_cpu_usage": 5000},
+            "memory_stats": {"usage": 1000000, "limit": 2000000}
+        }
+    container.stats.side_effect = stats
+    return container
+
+
+def test_nothing_is_recorded_while_disabled():
+    """Test the disabled path records nothing and shares one no-op timer."""
+    recorder.reset()
+    assert timed("a") is timed("b", "web")
+    with timed("a"):
+        pass
+    recorder.observe("a", 1.0)
+    recorder.api_call("GET", "/containers/json")
+    snapshot = recorder.snapshot()
+    assert snapshot["operations"] == {} and snapshot["docker_api_calls"] == {}
+
+
+def test_timed_records_latency_and_errors(enabled):
+    """Test histograms, per-container series and error counts."""
+    with timed("container_stats", "web"):
+        pass
+    with pytest.raises(ValueError):
+        with timed("container_stats", "db"):
+            raise ValueError("boom")
+    enabled.error("container_stats")
+
+    snapshot = enabled.snapshot()
+    histogram = snapshot["operations"]["container_stats"]
+    assert histogram.count == 2
+    assert histogram.cumulative()[0] == ("0.001", 2)
+    assert histogram.cumulative()[-1] == ("+Inf", 2)
+    assert set(snapshot["containers"]) == {("container_stats", "web"), ("container_stats", "db")}
+    assert snapshot["errors"] == {"container_stats": 2}
+    assert snapshot["resident_memory_bytes"] > 0
+
+
+def test_histogram_buckets():
+    """Test values land in the first bucket at or above them."""
+    local = Recorder()
+    local.enabled = True
+    for seconds in (0.0005, 0.001, 0.02, 30.0):
+        local.observe("op", seconds)
+    histogram = local.snapshot()["operations"]["op"]
+    buckets = dict(histogram.cumulative())
+    assert buckets["0.001"] == 2
+    assert buckets["0.025"] == 3
+    assert buckets["10.0"] == 3
+    assert buckets["+Inf"] == 4
+    assert histogram.max == 30.0
+
+
+def test_instrumented_decorator(enabled):
+    """Test decorated functions are timed and failures counted."""
+    @instrumented("send_alert")
+    def send(fail):
+        if fail:
+            raise RuntimeError("smtp down")
+        return "sent"
+    assert send(False) == "sent"
+    with pytest.raises(RuntimeError):
+        send(True)
+    snapshot = enabled.snapshot()
+    assert snapshot["operations"]["send_alert"].count == 2
+    assert snapshot["errors"] == {"send_alert": 1}
+
+
+def test_api_calls_are_grouped_by_endpoint(enabled):
+    """Test container IDs and API versions are stripped from endpoints."""
+    enabled.api_call("GET", "/v1.41/containers/json")
+    enabled.api_call("GET", "/v1.41/containers/abc123/stats")
+    enabled.api_call("GET", "/v1.41/containers/def456/stats")
+    enabled.api_call("GET", "/containers/abc123/json")
+    assert enabled.snapshot()["docker_api_calls"] == {
+        "GET /containers/json": 1, "GET /containers/{id}/stats": 2, "GET /containers/{id}/json": 1}
+
+
+def test_instrument_client_counts_responses(enabled):
+    """Test the response hook installed on a Docker client's session."""
+    client = MagicMock()
+    client.api.hooks = {"response": []}
+    instrumentation.instrument_client(client)
+    response = MagicMock()
+    response.request.method = "GET"
+    response.request.path_url = "/v1.41/containers/abc/stats?stream=0"
+    for hook in client.api.hooks["response"]:
+        hook(response)
+    assert enabled.snapshot()["docker_api_calls"] == {"GET /containers/{id}/stats": 1}
+
+
+def test_stale_container_series_are_dropped(enabled, monkeypatch):
+    """Test containers not seen for the series TTL disappear from snapshots."""
+    enabled.observe("container_stats", 0.01, container="gone")
+    monkeypatch.setattr(instrumentation, "CONTAINER_SERIES_TTL", -1.0)
+    snapshot = enabled.snapshot()
+    assert snapshot["containers"] == {}
+    assert snapshot["operations"]["container_stats"].count == 1
+
+
+@patch("docker.from_env")
+def test_docker_collection_is_instrumented(mock_docker, enabled):
+    """Test stats calls are timed per container and timeouts counted as errors."""
+    mock_docker.return_value.containers.list.return_value = [_container("fast"), _container("hung", 0.5)]
+    get_docker_health(concurrency=2, timeout=0.1)
+    time.sleep(0.5)  # Let the hung call finish and record its latency.
+    snapshot = enabled.snapshot()
+    assert snapshot["operations"]["docker_health"].count == 1
+    assert snapshot["operations"]["container_stats"].count == 2
+    assert snapshot["containers"][("container_stats", "hung")].max >= 0.5
+    assert snapshot["errors"] == {"container_stats": 1}
+
+    report = "\n".join(profile_lines(snapshot))
+    assert "docker_health" in report and "Slowest containers:" in report
+    assert report.index("hung") < report.index("fast")
+
+
+@patch("docker.from_env")
+def test_streamed_collection_is_timed_until_consumed(mock_docker, enabled):
+    """Test a streamed collection is timed across every yielded container, and early close is not an error."""
+    mock_docker.return_value.containers.list.return_value = [_container("a", 0.1), _container("b", 0.2)]
+    assert len(list(stream_docker_health(concurrency=2))) == 2
+    stream = stream_docker_health(concurrency=2)
+    next(stream)
+    stream.close()
+    snapshot = enabled.snapshot()
+    assert snapshot["operations"]["docker_health"].count == 2
+    assert snapshot["operations"]["docker_health"].max >= 0.2
+    assert snapshot["errors"] == {}
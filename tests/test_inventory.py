@@ -0,0 +1,152 @@
+import threading
+import time
+from unittest.mock import MagicMock
+import docker
+import requests
+from infrahealth import inventory as inventory_module
+from infrahealth.docker_health import get_docker_health
+from infrahealth.inventory import ContainerInventory
+
+
+class _FakeEvents:
+    """Event stream that yields queued events until closed."""
+
+    def __init__(self):
+        self._queue = []
+        self._closed = threading.Event()
+        self._cond = threading.Condition()
+
+    def push(self, event):
+        with self._cond:
+            self._queue.append(event)
+            self._cond.notify()
+
+    def close(self):
+        self._closed.set()
+        with self._cond:
+            self._cond.notify()
+
+    def __iter__(self):
+        while not self._closed.is_set():
+            with self._cond:
+                if not self._queue:
+                    self._cond.wait(0.05)
+                    continue
+                event = self._queue.pop(0)
+            yield event
+
+
+def _container(container_id, name, restarts=0, status="running"):
+    container = MagicMock()
+    container.id = container_id
+    container.name = name
+    container.status = status
+    container.attrs = {"RestartCount": restarts}
+    container.stats.return_value = {
+        "cpu_stats": {"cpu_usage": {"total_usage": 2000}, "system_cpu_usage": 10000, "online_cpus": 2},
+        "precpu_stats": {"cpu_usage": {"total_usage": 1000}, "system_cpu_usage": 5000},
+        "memory_stats": {"usage": 1000000, "limit": 2000000},
+        "networks": {}
+    }
+    return container
+
+
+def _client(listed, inspected):
+    client = MagicMock()
+    client.events.return_value = events = _FakeEvents()
+    client.containers.list.return_value = listed
+
+    def get(container_id):
+        if container_id not in inspected:
+            raise docker.errors.NotFound("gone")
+        return inspected[container_id]
+    client.containers.get.side_effect = get
+    return client, events
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_inventory_follows_events():
+    """Test that start, die, restart and rename events update the inventory."""
+    web = _container("a", "web")
+    client, events = _client([web], {})
+    inventory = ContainerInventory(client)
+    inventory.start()
+    try:
+        assert [c.name for c in inventory.containers()] == ["web"]
+
+        client.containers.get.side_effect = None
+        client.containers.get.return_value = _container("b", "db")
+        events.push({"Action": "start", "Actor": {"ID": "b"}})
+        assert _wait_for(lambda: len(inventory.containers()) == 2)
+
+        client.containers.get.return_value = _container("a", "web-renamed", restarts=3)
+        events.push({"Action": "restart", "id": "a"})
+        assert _wait_for(lambda: inventory.get("a").name == "web-renamed")
+        assert inventory.get("a").attrs["RestartCount"] == 3
+
+        events.push({"Action": "die", "id": "b"})
+        assert _wait_for(lambda: inventory.get("b") is None)
+        assert client.containers.list.call_count == 1
+    finally:
+        inventory.stop()
+
+
+def test_inventory_resyncs_periodically():
+    """Test that a periodic full listing catches containers whose events were missed."""
+    client, _ = _client([_container("a", "web")], {})
+    inventory = ContainerInventory(client, resync_interval=0.05)
+    inventory.start()
+    try:
+        client.containers.list.return_value = [_container("a", "web"), _container("c", "missed")]
+        assert _wait_for(lambda: inventory.get("c") is not None)
+    finally:
+        inventory.stop()
+
+
+def test_inventory_survives_a_daemon_restart(monkeypatch):
+    """Test connection errors while the daemon is down do not stop the event and resync threads."""
+    monkeypatch.setattr(inventory_module, "EVENTS_RETRY_BASE", 0.01)
+    down = requests.exceptions.ConnectionError("connection refused")
+
+    def broken_events():
+        raise down
+        yield
+    client, events = _client([_container("a", "web")], {})
+    client.events.side_effect = [broken_events(), down, down, events]
+    inventory = ContainerInventory(client, resync_interval=0.05)
+    inventory.start()
+    try:
+        client.containers.list.side_effect = down
+        time.sleep(0.2)
+        assert all(thread.is_alive() for thread in inventory._threads)
+        client.containers.list.side_effect = None
+        client.containers.list.return_value = [_container("a", "web"), _container("b", "worker")]
+        assert _wait_for(lambda: inventory.get("b") is not None)
+        assert client.events.call_count == 4
+        assert all(thread.is_alive() for thread in inventory._threads)
+    finally:
+        events.close()
+        inventory.stop()
+
+
+def test_get_docker_health_uses_inventory():
+    """Test that collection reads the container list from the inventory, not the daemon."""
+    client, _ = _client([_container("a", "web", restarts=2)], {})
+    inventory = ContainerInventory(client)
+    inventory.start()
+    try:
+        for _ in range(3):
+            health = get_docker_health(detailed=True, inventory=inventory)
+        assert [(c["name"], c["restart_count"]) for c in health] == [("web", 2)]
+        assert client.containers.list.call_count == 1
+        client.close.assert_not_called()
+    finally:
+        inventory.stop()
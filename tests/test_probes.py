@@ -0,0 +1,122 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest.mock import MagicMock
+import pytest
+from infrahealth.probes import AppProber, probe_target
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def app():
+    """Local HTTP app whose /health status and latency can be changed."""
+    state = {"status": 200, "delay": 0.0, "hits": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            state["hits"] += 1
+            time.sleep(state["delay"])
+            self.send_response(state["status"] if self.path == "/health" else 404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    server = _ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["port"] = server.server_address[1]
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def _container(name, address="127.0.0.1", port=None, labels=None):
+    container = MagicMock()
+    container.id = name
+    container.name = name
+    labels = dict(labels or {})
+    if port is not None:
+        labels["infrahealth.probe.port"] = str(port)
+    container.attrs = {
+        "Config": {"Labels": labels, "ExposedPorts": {"8080/tcp": {}}},
+        "NetworkSettings": {"Networks": {"bridge": {"IPAddress": address}}}
+    }
+    return container
+
+
+def test_http_probe_reports_health_and_latency(app):
+    """Test that the HTTP probe reaches the container address and times it."""
+    prober = AppProber(ttl=0)
+    result = prober.probe(_container("web", port=app["port"]))
+    assert result["app_health"] == "healthy"
+    assert result["app_probe"] == "http"
+    assert result["app_latency_ms"] >= 0
+    app["status"] = 503
+    assert prober.probe(_container("web", port=app["port"]))["app_health"] == "unhealthy"
+
+
+def test_probe_results_are_cached(app):
+    """Test that repeated probes within the TTL do not hit the endpoint again."""
+    prober = AppProber(ttl=60)
+    container = _container("web", port=app["port"])
+    for _ in range(5):
+        assert prober.probe(container)["app_health"] == "healthy"
+    assert app["hits"] == 1
+
+
+def test_probe_many_runs_in_parallel(app):
+    """Test that probes for many containers overlap up to the concurrency limit."""
+    app["delay"] = 0.2
+    prober = AppProber(concurrency=10, ttl=0)
+    containers = [_container(f"c{i}", port=app["port"], labels={"infrahealth.probe.path": f"/health?{i}"})
+                  for i in range(10)]
+    start = time.perf_counter()
+    results = prober.probe_many(containers)
+    assert time.perf_counter() - start < 1.0  # Serial probing would take 2s
+    assert len(results) == 10
+
+
+def test_tcp_probe():
+    """Test TCP connect probes against listening and closed ports."""
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        port = listener.getsockname()[1]
+        prober = AppProber(ttl=0, timeout=0.5)
+        labels = {"infrahealth.probe": "tcp"}
+        assert prober.probe(_container("db", port=port, labels=labels))["app_health"] == "healthy"
+    assert prober.probe(_container("db", port=port, labels=labels))["app_health"] == "unhealthy"
+
+
+def test_exec_is_only_a_fallback():
+    """Test that exec is used when the container has no address."""
+    container = _container("host-net", address="")
+    container.exec_run.return_value = MagicMock(exit_code=0)
+    result = AppProber(ttl=0).probe(container)
+    assert result["app_probe"] == "exec"
+    assert result["app_health"] == "healthy"
+    assert probe_target(_container("web")) == ("http", ("127.0.0.1", 8080, "/health"))
+
+
+def test_remote_daemon_containers_are_probed_with_exec(app):
+    """Test containers of a remote daemon use exec, and same-address containers on two daemons are cached apart."""
+    prober = AppProber(ttl=60)
+    local = _container("web", port=app["port"])
+    local.client.api.base_url = "http+docker://localhost"
+    remote = _container("web", port=app["port"])
+    remote.client.api.base_url = "https://10.0.0.5:2376"
+    remote.exec_run.return_value = MagicMock(exit_code=1)
+    result = prober.probe(local)
+    assert (result["app_probe"], result["app_health"]) == ("http", "healthy")
+    result = prober.probe(remote)
+    assert (result["app_probe"], result["app_health"]) == ("exec", "unhealthy")
+    assert app["hits"] == 1
+    loopback = _container("web", port=app["port"])
+    loopback.client.api.base_url = "http://127.0.0.1:2375"
+    assert probe_target(loopback)[0] == "http"
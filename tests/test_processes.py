@@ -0,0 +1,97 @@
+import os
+import pytest
+from unittest.mock import patch
+from infrahealth.processes import ProcessSampler
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def _write(root, pid, name, ticks, rss_pages=0, start=1000, io_bytes=0):
+    directory = root / str(pid)
+    directory.mkdir(exist_ok=True)
+    fields = ["S", "1", "1", "1", "0", "-1", "0", "0", "0", "0", "0", str(ticks), "0",
+              "0", "0", "20", "0", "1", "0", str(start), "0", str(rss_pages)]
+    (directory / "stat").write_text(f"{pid} ({name}) " + " ".join(fields) + "\n")
+    (directory / "io").write_text(f"rchar: 1\nwchar: 1\nread_bytes: {io_bytes}\nwrite_bytes: 0\n")
+
+
+def _sampler(root, clock):
+    return ProcessSampler(proc_root=str(root), use_procfs=True, clock=clock, sleep=clock.sleep)
+
+
+def test_top_processes_by_cpu_memory_and_io(tmp_path):
+    """Test CPU and I/O rates between samples and the top-N rankings."""
+    _write(tmp_path, 1, "init", 0, rss_pages=10)
+    _write(tmp_path, 2, "busy worker", 0, rss_pages=5)
+    _write(tmp_path, 3, "big (cache)", 0, rss_pages=1000)
+    clock = _FakeClock()
+    sampler = _sampler(tmp_path, clock)
+    sampler.sample(2)
+
+    ticks = os.sysconf("SC_CLK_TCK")
+    _write(tmp_path, 2, "busy worker", ticks, rss_pages=5, io_bytes=2048)
+    _write(tmp_path, 3, "big (cache)", ticks // 4, rss_pages=1000)
+    clock.now += 2.0
+    top = sampler.sample(2)
+    assert [(p["name"], p["cpu_percent"]) for p in top["cpu"]] == [("busy worker", 50.0), ("big (cache)", 12.5)]
+    assert [p["pid"] for p in top["memory"]] == [3, 1]
+    assert top["io"][0]["pid"] == 2
+    # Counted from the baseline read, before the first sample's warm-up.
+    assert top["io"][0]["io_bytes_per_sec"] == pytest.approx(2048 / 2.1)
+    assert top["memory"][0]["rss_bytes"] == 1000 * os.sysconf("SC_PAGE_SIZE")
+
+
+def test_idle_processes_skip_io_reads(tmp_path):
+    """Test that /proc/<pid>/io is only read again for processes that ran."""
+    _write(tmp_path, 1, "idle", 0)
+    _write(tmp_path, 2, "busy", 0)
+    clock = _FakeClock()
+    sampler = _sampler(tmp_path, clock)
+    sampler.sample(1)
+    _write(tmp_path, 2, "busy", 10)
+    clock.now += 1.0
+    with patch.object(sampler, "_read_io", wraps=sampler._read_io) as read_io:
+        sampler.sample(1)
+    assert [call.args[0] for call in read_io.call_args_list] == [2]
+
+
+def test_io_rate_spans_intervals_without_cpu_ticks(tmp_path):
+    """Test I/O issued while a process used no CPU ticks is averaged over the time since its last I/O read."""
+    _write(tmp_path, 2, "writer", 0)
+    clock = _FakeClock()
+    sampler = _sampler(tmp_path, clock)
+    sampler.sample(1)
+    _write(tmp_path, 2, "writer", 0, io_bytes=3000)
+    clock.now += 1.0
+    assert sampler.sample(1)["io"][0]["io_bytes_per_sec"] == 0.0
+    _write(tmp_path, 2, "writer", 1, io_bytes=6000)
+    clock.now += 2.0
+    assert sampler.sample(1)["io"][0]["io_bytes_per_sec"] == pytest.approx(6000 / 3.1)
+
+
+def test_reused_pid_starts_a_new_baseline(tmp_path):
+    """Test that a new process reusing a pid is not charged the old one's CPU."""
+    _write(tmp_path, 7, "old", 5000, start=100)
+    clock = _FakeClock()
+    sampler = _sampler(tmp_path, clock)
+    sampler.sample(1)
+    _write(tmp_path, 7, "new", 10, start=900)
+    clock.now += 1.0
+    top = sampler.sample(1)
+    assert top["cpu"] == [{"pid": 7, "name": "new", "cpu_percent": 0.0, "rss_bytes": 0, "io_bytes_per_sec": 0.0}]
+
+
+def test_psutil_fallback_reports_own_process():
+    """Test the portable psutil path used where /proc is unavailable."""
+    sampler = ProcessSampler(min_interval=0.01, use_procfs=False)
+    top = sampler.sample(1000)
+    assert os.getpid() in {p["pid"] for p in top["memory"]}
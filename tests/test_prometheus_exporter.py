@@ -0,0 +1,156 @@
+import threading
+import time
+from prometheus_client import CollectorRegistry
+from infrahealth.prometheus_exporter import InfrahealthCollector
+
+SERVER = {"cpu_percent": 10.0, "memory_percent": 50.0, "disk_percent": 75.0}
+
+
+def _registry(collector):
+    registry = CollectorRegistry()
+    registry.register(collector)
+    return registry
+
+
+def test_collector_serves_cached_snapshot_within_ttl():
+    """Test that scrapes within the TTL reuse one collection."""
+    calls = []
+
+    def docker_source():
+        calls.append(1)
+        return [{"name": "web", "cpu_percent": 40.0, "memory_percent": 45.0}]
+    registry = _registry(InfrahealthCollector(
+        ttl=60, server_source=lambda: SERVER, docker_source=docker_source))
+
+    assert registry.get_sample_value("infrahealth_server_cpu_percent") == 10.0
+    assert registry.get_sample_value(
+        "infrahealth_container_cpu_percent", {"container_name": "web"}) == 40.0
+    assert registry.get_sample_value("infrahealth_collection_duration_seconds") >= 0
+    assert registry.get_sample_value("infrahealth_collection_age_seconds") >= 0
+    assert len(calls) == 1
+
+
+def test_collector_registration_does_not_collect():
+    """Test that registering the collector does not trigger a collection."""
+    calls = []
+    _registry(InfrahealthCollector(
+        server_source=lambda: calls.append(1) or SERVER, docker_source=lambda: []))
+    assert calls == []
+
+
+def test_concurrent_scrapes_share_one_collection():
+    """Test that concurrent scrapes start at most one collection."""
+    calls = []
+
+    def slow_source():
+        calls.append(1)
+        time.sleep(0.2)
+        return SERVER
+    collector = InfrahealthCollector(ttl=60, server_source=slow_source, docker_source=lambda: [])
+    threads = [threading.Thread(target=lambda: list(collector.collect())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+
+
+def test_dead_container_series_disappear():
+    """Test that a container's series go away once it is no longer reported."""
+    snapshots = [
+        [{"name": "web", "cpu_percent": 1.0, "memory_percent": 2.0},
+         {"name": "job", "cpu_percent": 3.0, "memory_percent": 4.0}],
+        [{"name": "web", "cpu_percent": 1.0, "memory_percent": 2.0}],
+    ]
+    registry = _registry(InfrahealthCollector(
+        ttl=0, server_source=lambda: SERVER, docker_source=lambda: snapshots.pop(0)))
+
+    assert registry.get_sample_value(
+        "infrahealth_container_memory_percent", {"container_name": "job"}) == 4.0
+    assert registry.get_sample_value(
+        "infrahealth_container_memory_percent", {"container_name": "job"}) is None
+
+
+def test_collector_tolerates_source_errors():
+    """Test that a failing source drops only its own metrics."""
+    def broken():
+        raise RuntimeError("Docker not running")
+    registry = _registry(InfrahealthCollector(server_source=lambda: SERVER, docker_source=broken))
+    assert registry.get_sample_value("infrahealth_server_disk_percent") == 75.0
+
+
+def test_top_processes_are_exported_once():
+    """Test that a process in several rankings yields one series per metric."""
+    process = {"pid": 42, "name": "java", "cpu_percent": 90.0, "rss_bytes": 1024, "io_bytes_per_sec": 5.0}
+    server = dict(SERVER, top_processes={"cpu": [process], "memory": [process], "io": [process]})
+    registry = _registry(InfrahealthCollector(server_source=lambda: server, docker_source=lambda: []))
+    labels = {"pid": "42", "name": "java"}
+    assert registry.get_sample_value("infrahealth_process_cpu_percent", labels) == 90.0
+    assert registry.get_sample_value("infrahealth_process_resident_memory_bytes", labels) == 1024
+
+
+def test_self_metrics_are_exported_when_enabled():
+    """Test infrahealth_self_* families describe the exporter's own collection."""
+    from infrahealth import instrumentation
+    from infrahealth.instrumentation import instrumented, recorder
+
+    @instrumented("server_health")
+    def server_source():
+        return SERVER
+    registry = _registry(InfrahealthCollector(ttl=0, server_source=server_source, docker_source=lambda: []))
+    assert registry.get_sample_value("infrahealth_self_resident_memory_bytes") is None
+
+    recorder.reset()
+    instrumentation.enable()
+    try:
+        recorder.error("container_stats")
+        recorder.api_call("GET", "/v1.41/containers/json")
+        assert registry.get_sample_value("infrahealth_self_operation_duration_seconds_count",
+                                         {"operation": "server_health"}) == 1
+        assert registry.get_sample_value("infrahealth_self_errors_total", {"operation": "container_stats"}) == 1
+        assert registry.get_sample_value("infrahealth_self_docker_api_calls_total",
+                                         {"endpoint": "GET /containers/json"}) == 1
+        assert registry.get_sample_value("infrahealth_self_resident_memory_bytes") > 0
+    finally:
+        instrumentation.disable()
+        recorder.reset()
+
+
+def test_collector_exports_rolling_statistics():
+    """Test every collection feeds the detector and its statistics are exported."""
+    from infrahealth.anomaly import AnomalyDetector
+    samples = iter(range(100))
+    registry = _registry(InfrahealthCollector(
+        ttl=0, server_source=lambda: dict(SERVER, disk_percent=50.0 + next(samples)),
+        docker_source=lambda: [{"name": "web", "cpu_percent": 40.0, "memory_percent": 45.0}],
+        detector=AnomalyDetector(min_samples=2)))
+
+    for _ in range(5):
+        registry.get_sample_value("infrahealth_rolling_mean", {"container_name": "web", "metric": "cpu_percent"})
+    assert registry.get_sample_value(
+        "infrahealth_rolling_mean", {"container_name": "web", "metric": "cpu_percent"}) == 40.0
+    assert registry.get_sample_value(
+        "infrahealth_trend_per_second", {"container_name": "", "metric": "disk_percent"}) > 0
+    # A few seconds of history are too short to project a day ahead.
+    assert registry.get_sample_value(
+        "infrahealth_forecast_seconds_to_limit", {"container_name": "", "metric": "disk_percent"}) is None
+    assert registry.get_sample_value(
+        "infrahealth_rolling_zscore", {"container_name": "web", "metric": "cpu_percent"}) == 0.0
+
+
+def test_collector_exports_sampling_schedule():
+    """Test each scheduled collector's interval and cost are exported."""
+    from infrahealth.scheduler import Scheduler, ScheduledSources
+    scheduler = Scheduler()
+    for name, value in (("cpu", {"cpu_percent": 10.0}), ("memory", {"memory_percent": 50.0}),
+                        ("disk", {"disk_percent": 75.0})):
+        scheduler.add(name, lambda value=value: value, 5.0)
+    scheduler.run_pending()
+    sources = ScheduledSources(scheduler)
+    registry = _registry(InfrahealthCollector(ttl=0, server_source=sources.server_health,
+                                              docker_source=sources.containers, scheduler=scheduler))
+
+    assert registry.get_sample_value("infrahealth_server_disk_percent") == 75.0
+    assert registry.get_sample_value("infrahealth_self_sample_interval_seconds", {"collector": "cpu"}) > 0
+    assert registry.get_sample_value("infrahealth_self_sample_cost_seconds", {"collector": "disk"}) >= 0
+    assert registry.get_sample_value("infrahealth_self_sampling_cpu_load") >= 0
@@ -0,0 +1,223 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import pytest
+from infrahealth.prometheus_exporter import InfrahealthCollector
+from infrahealth.push import Pusher, PushRejected, Spool, encode_text, snappy_compress
+
+SERVER = {"cpu_percent": 10.0, "memory_percent": 50.0, "disk_percent": 75.0}
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubReceiver:
+    """Local HTTP receiver recording requests and answering with queued statuses."""
+
+    def __init__(self, statuses=()):
+        self.requests = []
+        self.connections = 0
+        self.statuses = list(statuses)
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                receiver.connections += 1
+
+            def _receive(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                receiver.requests.append((self.command, self.path, dict(self.headers), body))
+                status = receiver.statuses.pop(0) if receiver.statuses else 200
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            do_POST = do_PUT = _receive
+
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _collector(containers=1):
+    return InfrahealthCollector(ttl=0, server_source=lambda: SERVER, docker_source=lambda: [
+        {"name": f"web-{i}", "cpu_percent": 40.0 + i, "memory_percent": 45.0} for i in range(containers)])
+
+
+def _varint(data, i):
+    value = shift = 0
+    while True:
+        byte = data[i]
+        i += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, i
+
+
+def _fields(data):
+    """Decode a protobuf message into (field number, wire type, value) triples."""
+    i, fields = 0, []
+    while i < len(data):
+        key, i = _varint(data, i)
+        number, wire = key >> 3, key & 7
+        if wire == 0:
+            value, i = _varint(data, i)
+        elif wire == 1:
+            value, i = data[i:i + 8], i + 8
+        else:
+            length, i = _varint(data, i)
+            value, i = data[i:i + length], i + length
+        fields.append((number, wire, value))
+    return fields
+
+
+def snappy_decompress(data):
+    length, i = _varint(data, 0)
+    out = bytearray()
+    while i < len(data):
+        tag = data[i]
+        i += 1
+        if tag & 3 == 0:
+            n = tag >> 2
+            if n >= 60:
+                n, i = int.from_bytes(data[i:i + n - 59], "little"), i + n - 59
+            out += data[i:i + n + 1]
+            i += n + 1
+        else:
+            assert tag & 3 == 2
+            offset = data[i] | data[i + 1] << 8
+            i += 2
+            for _ in range((tag >> 2) + 1):
+                out.append(out[-offset])
+    assert len(out) == length
+    return bytes(out)
+
+
+def _decode_write_request(body):
+    """Return {labels tuple: [(timestamp, value)]} from a snappy-compressed WriteRequest."""
+    import struct
+    series = {}
+    for _, _, timeseries in _fields(snappy_decompress(body)):
+        labels, samples = [], []
+        for number, _, value in _fields(timeseries):
+            if number == 1:
+                name, label_value = [v for _, _, v in _fields(value)]
+                labels.append((name.decode(), label_value.decode()))
+            else:
+                parts = {n: v for n, _, v in _fields(value)}
+                samples.append((parts[2], struct.unpack("<d", parts[1])[0]))
+        series[tuple(labels)] = samples
+    return series
+
+
+@pytest.mark.parametrize("data", [b"", b"x", b"abcd" * 5000, os.urandom(70000), b"label=" * 20 + os.urandom(300)])
+def test_snappy_round_trip(data):
+    """Test the pure-Python snappy output decodes to the input."""
+    assert snappy_decompress(snappy_compress(data)) == data
+
+
+def test_spool_drops_oldest_over_budget_and_survives_restart(tmp_path):
+    """Test the spool keeps within its budget by dropping the oldest collections, across reopen."""
+    spool = Spool(str(tmp_path), budget_bytes=1000)
+    for i in range(50):
+        spool.append(i, [["metric", {"i": str(i)}, float(i)]])
+    assert spool.bytes <= 1000 and spool.dropped > 0
+    kept = [collection["t"] for _, collection in spool.oldest(100)]
+    assert kept == list(range(50 - len(kept), 50))
+
+    reopened = Spool(str(tmp_path), budget_bytes=1000)
+    assert len(reopened) == len(kept)
+    reopened.append(50, [])
+    assert reopened.newest()[0][1]["t"] == 50
+
+
+def test_remote_write_batches_over_one_connection(tmp_path):
+    """Test spooled collections are sent as batched remote-write requests on a kept-alive connection."""
+    clock = iter(range(1000, 100000, 15))
+    with StubReceiver() as receiver:
+        pusher = Pusher(receiver.url + "/api/v1/write", _collector(2), spool=Spool(str(tmp_path)),
+                        job="ci", instance="runner-1", batch_size=2, clock=lambda: next(clock))
+        for _ in range(5):
+            pusher.collect()
+        assert pusher.flush(timeout=5)
+        pusher.stop()
+    assert len(receiver.requests) == 3
+    assert receiver.connections == 1
+    method, path, headers, body = receiver.requests[0]
+    assert (method, path) == ("POST", "/api/v1/write")
+    assert headers["Content-Encoding"] == "snappy"
+    assert headers["Content-Type"] == "application/x-protobuf"
+    series = _decode_write_request(body)
+    key = (("__name__", "infrahealth_container_cpu_percent"), ("container_name", "web-1"),
+           ("instance", "runner-1"), ("job", "ci"))
+    assert series[key] == [(1000000, 41.0), (1015000, 41.0)]
+
+
+def test_failed_pushes_are_retried_and_rejected_batches_dropped(tmp_path):
+    """Test 5xx responses keep the batch spooled while a 400 drops it."""
+    with StubReceiver(statuses=[503, 400]) as receiver:
+        pusher = Pusher(receiver.url, _collector(), spool=Spool(str(tmp_path)))
+        pusher.collect()
+        with pytest.raises(Exception) as error:
+            pusher.send_batch()
+        assert not isinstance(error.value, PushRejected)
+        assert len(pusher.spool) == 1
+        with pytest.raises(PushRejected):
+            pusher.send_batch()
+        assert len(pusher.spool) == 0
+        pusher.collect()
+        assert pusher.send_batch() == 1
+        pusher.stop()
+
+
+def test_pushgateway_sends_only_the_newest_collection(tmp_path):
+    """Test the Pushgateway gets the latest values as text, replacing the group with PUT."""
+    values = iter([10.0, 20.0, 30.0])
+    collector = InfrahealthCollector(ttl=0, server_source=lambda: dict(SERVER, cpu_percent=next(values)),
+                                     docker_source=lambda: [])
+    with StubReceiver() as receiver:
+        pusher = Pusher(receiver.url, collector, protocol="pushgateway", spool=Spool(str(tmp_path)),
+                        job="ci", instance="runner-1")
+        for _ in range(3):
+            pusher.collect()
+        assert pusher.flush(timeout=5)
+        pusher.stop()
+    assert len(receiver.requests) == 1
+    method, path, _, body = receiver.requests[0]
+    assert (method, path) == ("PUT", "/metrics/job/ci/instance/runner-1")
+    assert b"infrahealth_server_cpu_percent 30.0\n" in body
+
+
+def test_background_pusher_delivers_and_flushes_on_stop(tmp_path):
+    """Test the collect and send loops deliver samples until stopped."""
+    with StubReceiver() as receiver:
+        pusher = Pusher(receiver.url, _collector(), spool=Spool(str(tmp_path)), interval=0.05)
+        pusher.start()
+        deadline = time.monotonic() + 5
+        while len(receiver.requests) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        pusher.stop()
+    assert len(receiver.requests) >= 2
+    assert len(pusher.spool) == 0
+
+
+def test_encode_text_escapes_labels():
+    """Test label values are escaped in the text format."""
+    assert encode_text([["m", {"b": 'say "hi"\n', "a": "x"}, 1]]) == b'm{a="x",b="say \\"hi\\"\\n"} 1.0\n'
@@ -0,0 +1,103 @@
+import json
+import fnmatch
+import pytest
+from infrahealth.alert import AlertEngine, FIRING
+from infrahealth.rules import RuleSet, load_rules, parse_rules
+
+SPEC = {
+    "defaults": {"for_seconds": 30},
+    "rules": [
+        {"metric": "cpu_percent", "threshold": 90, "scope": "server"},
+        {"metric": "cpu_percent", "threshold": 80},
+        {"name": "web_cpu", "metric": "cpu_percent", "threshold": 50, "container": "web-*"},
+        {"metric": "memory_percent", "threshold": 70, "container": "db"},
+        {"metric": "restart_count", "threshold": 3, "container": "web-?", "for_seconds": 0},
+    ]
+}
+
+
+def test_checks_follow_selectors():
+    """Test that each container only gets the rules whose glob matches its name."""
+    rules = RuleSet.from_spec(SPEC)
+    containers = [
+        {"name": "web-1", "cpu_percent": 60.0, "memory_percent": 90.0, "restart_count": 4},
+        {"name": "web-10", "cpu_percent": 60.0, "memory_percent": 90.0, "restart_count": 4},
+        {"name": "db", "cpu_percent": 10.0, "memory_percent": 75.0},
+    ]
+    keys = [c.key for c in rules.checks(containers)]
+    assert keys == [
+        "Container web-1/cpu_percent", "Container web-1/web_cpu", "Container web-1/restart_count@web-?",
+        "Container web-10/cpu_percent", "Container web-10/web_cpu",
+        "Container db/cpu_percent", "Container db/memory_percent@db",
+    ]
+    server = rules.checks({"cpu_percent": 95.0, "memory_percent": 10.0})
+    assert [(c.key, c.label, c.threshold, c.for_seconds) for c in server] == [
+        ("Server/cpu_percent", "CPU", 90, 30)]
+
+
+def test_index_matches_naive_globbing():
+    """Test that the prefix index selects the same rules as matching every glob."""
+    patterns = ["*", "api-*", "api-?", "api-1", "a*", "[ab]pi-*", "web-*-canary", "w?b-*"]
+    spec = [{"name": f"r{i}", "metric": "cpu_percent", "threshold": 0, "container": p}
+            for i, p in enumerate(patterns)]
+    rules = RuleSet.from_spec(spec)
+    for name in ["api-1", "api-12", "bpi-3", "web-1-canary", "wxb-2", "db", ""]:
+        expected = [r.id for r in rules.rules if fnmatch.fnmatchcase(name, r.container)]
+        matched = [r.id for _, group in rules.matching(name) for r in group]
+        assert sorted(matched) == sorted(expected), name
+
+
+def test_parse_rules_rejects_bad_input():
+    """Test validation of malformed rules."""
+    with pytest.raises(ValueError, match="'metric' is required"):
+        parse_rules([{"threshold": 1}])
+    with pytest.raises(ValueError, match="'threshold' must be a number"):
+        parse_rules([{"metric": "cpu_percent", "threshold": "high"}])
+    with pytest.raises(ValueError, match="unknown keys"):
+        parse_rules([{"metric": "cpu_percent", "threshold": 1, "selector": "x"}])
+    with pytest.raises(ValueError, match="not a numeric metric"):
+        parse_rules([{"metric": "app_health", "threshold": 1}])
+    with pytest.raises(ValueError, match="duplicate rule id"):
+        parse_rules([{"metric": "cpu_percent", "threshold": 1}, {"metric": "cpu_percent", "threshold": 2}])
+    # Rules on the same metric over different containers need no name.
+    rules = parse_rules([{"metric": "cpu_percent", "threshold": 1, "container": "web-*"},
+                         {"metric": "cpu_percent", "threshold": 2, "container": "db"}])
+    assert [rule.id for rule in rules] == ["cpu_percent@web-*", "cpu_percent@db"]
+
+
+def test_non_numeric_values_are_skipped():
+    """Test a rule on a field that is not a number yields no check, so evaluation cannot fail."""
+    rules = RuleSet.from_spec([{"metric": "extra", "threshold": 1}, {"metric": "cpu_percent", "threshold": 1}])
+    containers = [{"name": "a", "extra": {"eth0": {}}, "cpu_percent": 5.0},
+                  {"name": "b", "extra": "up", "cpu_percent": 5.0},
+                  {"name": "c", "extra": True, "cpu_percent": 5.0},
+                  {"name": "d", "extra": 2, "cpu_percent": 5.0}]
+    engine = AlertEngine({}, notifier=type("Notifier", (), {"notify": lambda self, line: None})(), rules=rules)
+    engine.evaluate_health(containers, now=0)
+    assert [check.key for check in rules.checks(containers)] == [
+        "Container a/cpu_percent", "Container b/cpu_percent", "Container c/cpu_percent",
+        "Container d/extra", "Container d/cpu_percent"]
+
+
+def test_load_rules_json_and_yaml(tmp_path):
+    """Test loading the same rules from JSON and YAML files."""
+    json_path = tmp_path / "rules.json"
+    json_path.write_text(json.dumps(SPEC))
+    assert len(load_rules(str(json_path)).rules) == 5
+    yaml = pytest.importorskip("yaml")
+    yaml_path = tmp_path / "rules.yaml"
+    yaml_path.write_text(yaml.safe_dump(SPEC))
+    assert load_rules(str(yaml_path)).rules == load_rules(str(json_path)).rules
+
+
+def test_engine_uses_rules():
+    """Test that the alert engine evaluates compiled rules instead of thresholds."""
+    lines = []
+    notifier = type("Notifier", (), {"notify": lambda self, line: lines.append(line),
+                                     "close": lambda self: None})()
+    rules = RuleSet.from_spec([{"metric": "cpu_percent", "threshold": 50, "container": "web-*"}])
+    engine = AlertEngine({}, notifier=notifier, rules=rules)
+    engine.evaluate_health([{"name": "web-1", "cpu_percent": 60.0, "memory_percent": 99.0},
+                            {"name": "db", "cpu_percent": 99.0, "memory_percent": 99.0}], now=0)
+    assert engine.state("Container web-1/cpu_percent@web-*") == FIRING
+    assert lines == ["FIRING Container web-1: CPU 60.0%"]
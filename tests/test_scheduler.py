@@ -0,0 +1,204 @@
+import random
+import threading
+from collections import namedtuple
+import pytest
+from infrahealth.scheduler import (ADAPT_RANGE, AdaptiveInterval, ContainerSampler, ScheduledSources, Scheduler,
+                                   container_values)
+
+Container = namedtuple("Container", ["id", "name"])
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_adaptive_interval_speeds_up_near_thresholds_and_slows_when_idle():
+    """Test intervals shrink near a threshold, grow while idle and return to base otherwise."""
+    pacing = AdaptiveInterval(10.0)
+    for _ in range(5):
+        interval = pacing.observe({"cpu_percent": 75.0})
+    assert (interval, pacing.reason) == (10.0 / ADAPT_RANGE, "near_threshold")
+    pacing.observe({"cpu_percent": 40.0})
+    assert pacing.reason == "changing"
+    for _ in range(10):
+        interval = pacing.observe({"cpu_percent": 40.2})
+    assert (interval, pacing.reason) == (10.0 * ADAPT_RANGE, "idle")
+    for value in (43.0, 46.0, 49.0, 52.0, 55.0, 58.0):
+        interval = pacing.observe({"cpu_percent": value})
+    assert (interval, pacing.reason) == (10.0, "steady")
+
+
+def test_adaptive_interval_ignores_metrics_without_thresholds():
+    """Test counters such as network bytes do not drive adaptation."""
+    pacing = AdaptiveInterval(10.0)
+    for value in range(0, 10 ** 9, 10 ** 8):
+        interval = pacing.observe({"network_bytes_sent": value, "web/restart_count": 0})
+    assert interval == 10.0
+
+
+def test_scheduler_runs_each_collector_on_its_own_interval():
+    """Test fast collectors run more often than slow ones, within their jitter."""
+    clock = FakeClock()
+    runs = {"cpu": [], "disk": []}
+    scheduler = Scheduler(cpu_budget=0, clock=clock, cpu_clock=lambda: 0.0, rng=random.Random(1))
+    scheduler.add("cpu", lambda: runs["cpu"].append(clock.now) or {"cpu_percent": 50.0}, 5.0, adaptive=False)
+    scheduler.add("disk", lambda: runs["disk"].append(clock.now) or {"disk_percent": 50.0}, 60.0, adaptive=False)
+    while clock.now < 600:
+        scheduler.run_pending()
+        clock.now += min(0.5, scheduler.seconds_until_due() or 0.5)
+    assert len(runs["cpu"]) == pytest.approx(120, rel=0.1)
+    assert len(runs["disk"]) == pytest.approx(10, rel=0.2)
+    gaps = [b - a for a, b in zip(runs["cpu"][1:], runs["cpu"][2:])]
+    assert min(gaps) >= 4.5 - 0.5 and max(gaps) <= 5.5 + 0.5
+    assert len(set(round(gap, 1) for gap in gaps)) > 1
+    assert scheduler.latest("disk") == {"disk_percent": 50.0}
+
+
+def test_first_runs_are_spread_across_a_fleet():
+    """Test schedulers started together do not keep sampling in step."""
+    second_runs = []
+    for seed in range(50):
+        clock = FakeClock()
+        scheduler = Scheduler(clock=clock, cpu_clock=lambda: 0.0, rng=random.Random(seed))
+        scheduler.add("docker", lambda: [], 10.0)
+        scheduler.run_pending()
+        second_runs.append(scheduler.seconds_until_due())
+    assert min(second_runs) < 2.0 and max(second_runs) > 8.0
+
+
+def test_scheduler_adapts_to_collected_values():
+    """Test a metric close to its threshold is sampled faster."""
+    clock = FakeClock()
+    values = {"cpu_percent": 20.0}
+    scheduler = Scheduler(jitter=0, clock=clock, cpu_clock=lambda: 0.0, rng=random.Random(1))
+    scheduler.add("cpu", lambda: dict(values), 8.0)
+    for step in range(3):
+        values["cpu_percent"] = 20.0 + 4 * (step % 2)
+        scheduler.run_pending()
+        clock.now += scheduler.seconds_until_due()
+    assert scheduler.state()[0]["interval"] == 8.0
+    values["cpu_percent"] = 95.0
+    for _ in range(3):
+        scheduler.run_pending()
+        clock.now += scheduler.seconds_until_due()
+    state = scheduler.state()[0]
+    assert (state["interval"], state["reason"]) == (2.0, "near_threshold")
+
+
+def test_scheduler_stretches_intervals_to_stay_within_cpu_budget():
+    """Test sampling that would use more CPU than budgeted is slowed down to the budget."""
+    clock, cpu = FakeClock(), FakeClock()
+
+    def expensive():
+        cpu.now += 0.5
+        return {}
+    scheduler = Scheduler(jitter=0, cpu_budget=0.05, clock=clock, cpu_clock=cpu, rng=random.Random(1))
+    scheduler.add("processes", expensive, 1.0, adaptive=False)
+    for _ in range(20):
+        scheduler.run_pending()
+        clock.now += scheduler.seconds_until_due()
+    assert scheduler.load() == pytest.approx(0.5)
+    assert scheduler.state()[0]["interval"] == pytest.approx(10.0)
+    assert cpu.now / clock.now <= 0.05 * 1.1
+
+
+def test_scheduler_keeps_the_last_result_when_a_collector_fails():
+    """Test a failing run is counted and does not clear the latest result."""
+    results = iter([{"memory_percent": 10.0}])
+
+    def sample():
+        return next(results)
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock, cpu_clock=lambda: 0.0)
+    scheduler.add("memory", sample, 1.0)
+    scheduler.run_pending()
+    clock.now += 10
+    scheduler.run_pending()
+    assert scheduler.latest("memory") == {"memory_percent": 10.0}
+    assert scheduler.state()[0]["errors"] == 1 and scheduler.state()[0]["runs"] == 2
+
+
+def test_container_sampler_samples_hot_containers_more_often():
+    """Test each container gets its own interval and removed containers are forgotten."""
+    clock = FakeClock()
+    containers = [Container("a", "hot"), Container("b", "idle")]
+    sampled = []
+
+    def collect(due):
+        sampled.extend(container.name for container in due)
+        return [{"name": c.name, "cpu_percent": 90.0 if c.name == "hot" else 5.0} for c in due]
+    sampler = ContainerSampler(lambda: list(containers), collect, interval=8.0, clock=clock, rng=random.Random(1))
+    while clock.now < 400:
+        records = sampler()
+        clock.now += sampler.tick
+    assert sampled.count("hot") > 4 * sampled.count("idle")
+    assert [record["name"] for record in records] == ["hot", "idle"]
+    containers.pop(0)
+    assert [record["name"] for record in sampler()] == ["idle"]
+    assert list(sampler.intervals()) == ["b"]
+
+
+def test_container_sampler_retries_failed_containers_after_the_base_interval():
+    """Test a container whose stats failed is not retried on every tick."""
+    clock = FakeClock()
+    calls = []
+    sampler = ContainerSampler(lambda: [Container("a", "web")], lambda due: calls.append(len(due)) or [],
+                               interval=8.0, clock=clock)
+    for _ in range(16):
+        assert sampler() == []
+        clock.now += sampler.tick
+    assert calls == [1, 1, 1, 1]
+
+
+def test_container_sampler_drops_the_record_of_a_failed_sample():
+    """Test a container whose sample failed is not reported with its previous values."""
+    clock = FakeClock()
+    failing = []
+
+    def collect(due):
+        return [{"name": c.name, "cpu_percent": 5.0} for c in due if c.name not in failing]
+    sampler = ContainerSampler(lambda: [Container("a", "web"), Container("b", "db")], collect,
+                               interval=8.0, jitter=0.0, clock=clock)
+    assert [record["name"] for record in sampler()] == ["web", "db"]
+    failing.append("web")
+    clock.now += 8.0
+    assert [record["name"] for record in sampler()] == ["db"]
+    failing.clear()
+    clock.now += 8.0
+    assert [record["name"] for record in sampler()] == ["web", "db"]
+
+
+def test_scheduled_sources_merge_the_latest_results():
+    """Test server collectors are merged once all are sampled, and probes are merged into containers."""
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock, cpu_clock=lambda: 0.0)
+    sources = ScheduledSources(scheduler)
+    scheduler.add("cpu", lambda: {"cpu_percent": 10.0}, 5.0)
+    scheduler.add("memory", lambda: {"memory_percent": 20.0}, 5.0)
+    scheduler.run_pending()
+    assert sources.server_health() is None
+    scheduler.add("disk", lambda: {"disk_percent": 30.0}, 60.0)
+    scheduler.add("docker", lambda: [{"name": "web", "cpu_percent": 1.0}, {"name": "db", "cpu_percent": 2.0}],
+                  10.0, values=container_values)
+    scheduler.add("probes", lambda: {"web": {"app_health": "healthy"}}, 30.0)
+    scheduler.run_pending()
+    assert sources.server_health() == {"cpu_percent": 10.0, "memory_percent": 20.0, "disk_percent": 30.0}
+    assert sources.containers() == [{"name": "web", "cpu_percent": 1.0, "app_health": "healthy"},
+                                    {"name": "db", "cpu_percent": 2.0}]
+
+
+def test_background_scheduler_samples_until_stopped():
+    """Test the scheduler thread keeps sampling and stops cleanly."""
+    sampled = threading.Event()
+    scheduler = Scheduler()
+    scheduler.add("cpu", lambda: sampled.set() or {"cpu_percent": 1.0}, 0.01)
+    scheduler.start()
+    assert sampled.wait(5)
+    scheduler.stop()
+    runs = scheduler.state()[0]["runs"]
+    assert runs >= 1
+    assert scheduler.state()[0]["runs"] == runs
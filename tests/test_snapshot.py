@@ -0,0 +1,70 @@
+import io
+import json
+import sys
+import pytest
+from infrahealth.snapshot import ContainerSnapshot, dumps_compact, write_ndjson
+
+RECORDS = [
+    {"name": "web", "status": "running", "cpu_percent": 12.5, "memory_percent": 40.0, "restart_count": 0,
+     "networks": {"eth0": {"bytes_sent": 10, "bytes_received": 20}}},
+    {"name": "db", "status": "running", "cpu_percent": 3.25, "memory_percent": 70.5, "restart_count": 2,
+     "networks": {}},
+]
+
+
+def test_records_round_trip():
+    """Test records come back unchanged and in order, with numbers held in arrays."""
+    snapshot = ContainerSnapshot.from_records(RECORDS)
+    assert len(snapshot) == 2
+    assert list(snapshot.records()) == RECORDS
+    assert snapshot.column("cpu_percent") == [12.5, 3.25]
+    assert snapshot._columns["restart_count"].typecode == "q"
+
+
+def test_missing_and_mixed_fields():
+    """Test fields absent from some records stay absent, and mixed types keep their values."""
+    records = [{"name": "a", "cpu_percent": 1}, {"name": "b", "cpu_percent": 2.5, "app_health": "healthy"},
+               {"name": "c", "cpu_percent": "n/a"}]
+    snapshot = ContainerSnapshot.from_records(records)
+    assert list(snapshot.records()) == records
+    assert snapshot.column("app_health") == [None, "healthy", None]
+
+
+def test_binary_round_trip():
+    """Test the compact binary encoding decodes to the same records and beats JSON on size."""
+    records = [dict(RECORDS[i % 2], name=f"c{i}") for i in range(100)] + [{"name": "sparse"}]
+    snapshot = ContainerSnapshot.from_records(records)
+    data = snapshot.to_bytes()
+    assert data.startswith(b"IHSNAP01")
+    assert list(ContainerSnapshot.from_bytes(data).records()) == records
+    assert len(data) < len(json.dumps(records).encode())
+    assert list(ContainerSnapshot.from_bytes(ContainerSnapshot().to_bytes()).records()) == []
+
+
+@pytest.mark.parametrize("data", [b"", b"not a snapshot at all", ContainerSnapshot.from_records(RECORDS).to_bytes()[:-3]])
+def test_binary_rejects_invalid_data(data):
+    """Test truncated or foreign data raises ValueError."""
+    with pytest.raises(ValueError):
+        ContainerSnapshot.from_bytes(data)
+
+
+def test_msgpack_requires_package(monkeypatch):
+    """Test msgpack output explains how to install the optional dependency."""
+    monkeypatch.setitem(sys.modules, "msgpack", None)
+    with pytest.raises(RuntimeError, match="pip install msgpack"):
+        ContainerSnapshot.from_records(RECORDS).to_msgpack()
+
+
+def test_write_ndjson_streams_each_record():
+    """Test each record is written and flushed before the next is produced."""
+    stream = io.BytesIO()
+    seen = []
+
+    def records():
+        for record in RECORDS:
+            yield record
+            seen.append(stream.getvalue().count(b"\n"))
+    assert write_ndjson(records(), stream) == 2
+    assert seen == [1, 2]
+    assert [json.loads(line) for line in stream.getvalue().splitlines()] == RECORDS
+    assert json.loads(dumps_compact(RECORDS[0])) == RECORDS[0]
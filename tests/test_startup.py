@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import pytest
+import infrahealth
+from infrahealth.agent import Agent, query_agent
+
+# Modules that make start-up slow. Commands that do not collect must not import them.
+HEAVY_MODULES = ("docker", "requests", "psutil", "smtplib", "prometheus_client")
+
+# Microseconds of imports a command may add on top of a bare interpreter.
+# Importing docker alone takes over 100 ms.
+STARTUP_BUDGET_US = 150000
+
+HELP_COMMANDS = [
+    ["--help"],
+    ["check", "--help"],
+    ["check", "server", "--help"],
+    ["check", "docker", "--help"],
+    ["history", "--help"],
+    ["agent", "--help"],
+    ["start-prometheus", "--help"],
+    ["push", "--help"],
+]
+
+_ENV = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(infrahealth.__file__))))
+
+
+def _import_times(code, args=(), cwd=None):
+    """Run code under ``-X importtime`` and return ({module: self time in us}, stdout)."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code, *args],
+                            capture_output=True, text=True, env=_ENV, cwd=cwd)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "self" not in line:
+            own, _, name = line[len("import time:"):].split("|")
+            times[name.strip()] = int(own)
+    return times, result.stdout
+
+
+def _startup_cost(args, cwd=None):
+    baseline, _ = _import_times("pass")
+    times, stdout = _import_times("from infrahealth.cli import main; main()", args, cwd)
+    added = {name: own for name, own in times.items() if name not in baseline}
+    return added, stdout
+
+
+@pytest.mark.parametrize("args", HELP_COMMANDS, ids=" ".join)
+def test_help_starts_without_collectors(args, tmp_path):
+    """Test help output imports no collector dependency and stays within the budget."""
+    added, stdout = _startup_cost(args, cwd=tmp_path)
+    assert "Usage:" in stdout
+    assert not [name for name in HEAVY_MODULES if name in added]
+    assert sum(added.values()) < STARTUP_BUDGET_US, sorted(added.items(), key=lambda item: -item[1])[:10]
+    assert not os.path.exists(tmp_path / "infrahealth.log")
+
+
+def test_check_answered_by_agent_starts_without_collectors(tmp_path):
+    """Test a check answered by the agent skips the collectors entirely."""
+    with tempfile.TemporaryDirectory(prefix="ih") as directory:
+        socket_path = os.path.join(directory, "agent.sock")
+        agent = Agent(socket_path, interval=60.0,
+                      server_source=lambda: {"cpu_percent": 12.5, "memory_percent": 40.0, "disk_percent": 50.0},
+                      docker_source=lambda: [])
+        agent.start()
+        try:
+            deadline = time.monotonic() + 5.0
+            while query_agent("latest", socket_path=socket_path, source="server") is None:
+                assert time.monotonic() < deadline, "agent did not serve a server sample within 5s"
+                time.sleep(0.01)
+            added, stdout = _startup_cost(["check", "server", "--agent-socket", socket_path], cwd=tmp_path)
+        finally:
+            agent.stop()
+    assert "CPU: 12.5%" in stdout
+    assert not [name for name in HEAVY_MODULES if name in added]
+    assert sum(added.values()) < STARTUP_BUDGET_US
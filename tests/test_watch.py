@@ -0,0 +1,64 @@
+from infrahealth.watch import compute_rates, watch
+
+
+class _FakeClock:
+    """Clock advanced by sampling work and by sleeps."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+
+def test_compute_rates():
+    """Test per-second rates and CPU delta between two samples."""
+    previous = {"cpu_percent": 10.0, "network_bytes_sent": 1000, "network_bytes_received": 500}
+    current = {"cpu_percent": 25.0, "network_bytes_sent": 3000, "network_bytes_received": 300}
+    rates = compute_rates(previous, current, 2.0)
+    assert rates == {
+        "network_bytes_sent_per_sec": 1000.0,
+        "network_bytes_received_per_sec": 0.0,  # Counter reset
+        "cpu_percent_delta": 15.0
+    }
+
+
+def test_compute_rates_first_sample():
+    """Test that the first interval has no rates."""
+    assert compute_rates(None, {"cpu_percent": 1.0}, 0.0) == {}
+
+
+def test_watch_schedule_does_not_drift():
+    """Test that sampling time is absorbed into the fixed schedule."""
+    clock = _FakeClock()
+    sample_times = []
+
+    def sample():
+        sample_times.append(clock.now)
+        clock.now += 0.3  # Each sample takes 300 ms
+        return len(sample_times)
+
+    results = list(watch(sample, 1.0, count=4, clock=clock, sleep=clock.sleep))
+    assert sample_times == [100.0, 101.0, 102.0, 103.0]
+    assert clock.sleeps == [0.7, 0.7, 0.7]
+    assert results[0] == (1, None, 0.0)
+    assert results[1] == (2, 1, 1.0)
+
+
+def test_watch_skips_missed_ticks():
+    """Test that a sample overrunning several intervals skips missed ticks."""
+    clock = _FakeClock()
+    durations = [2.5, 0.1, 0.1]
+    sample_times = []
+
+    def sample():
+        sample_times.append(clock.now)
+        clock.now += durations[len(sample_times) - 1]
+
+    list(watch(sample, 1.0, count=3, clock=clock, sleep=clock.sleep))
+    assert sample_times == [100.0, 103.0, 104.0]